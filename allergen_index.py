@@ -0,0 +1,50 @@
+import threading
+from typing import Dict, Iterable, List
+
+class AllergenRegistry:
+    """
+    Interns allergen names to bit positions.
+    
+    Any set of allergens then becomes a single int bitmask, so "does this dish
+    contain anything this diner is allergic to" is one bitwise AND instead of
+    a nested scan over two lists. Python ints grow as needed, so there is no
+    limit on the number of distinct allergens.
+    """
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+    
+    def bit(self, allergen: str) -> int:
+        """The single-bit mask for an allergen, assigning a new bit on first sight"""
+        bit = self._bits.get(allergen)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.get(allergen)
+                if bit is None:
+                    bit = 1 << len(self._names)
+                    self._names.append(allergen)
+                    self._bits[allergen] = bit
+        return bit
+    
+    def mask(self, allergens: Iterable[str]) -> int:
+        """Bitmask of a collection of allergens"""
+        mask = 0
+        for allergen in allergens:
+            mask |= self.bit(allergen)
+        return mask
+    
+    def names(self, mask: int) -> List[str]:
+        """Allergen names whose bits are set in ``mask``, in registration order"""
+        names = []
+        while mask:
+            lowest = mask & -mask
+            names.append(self._names[lowest.bit_length() - 1])
+            mask ^= lowest
+        return names
+    
+    def __len__(self) -> int:
+        return len(self._names)
+
+# Shared by every MenuItem and Member in the process so their masks are comparable
+allergen_registry = AllergenRegistry()
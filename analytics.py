@@ -0,0 +1,193 @@
+"""
+Sales analytics over completed orders.
+
+Reports never scan ``orders`` directly. ``refresh_sales_summary`` rolls orders
+up into the ``sales_hourly`` table with set-based INSERT ... SELECTs,
+re-aggregating only the hours of the orders written since the last refresh,
+and the report functions read the (small) summary for a date range and
+derive averages and splits with vectorized pandas operations. Run a refresh
+before reading, or periodically:
+
+    python analytics.py refresh [--rebuild]
+    python analytics.py report --days 7 [--hourly]
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import pandas as pd
+from db_utils import pooled_connection, transaction
+from storage import get_backend
+
+# customer_id Order stores for walk-in customers
+NON_MEMBER_ID = 'NON-MEMBER'
+
+# A row becomes visible when its transaction commits, a moment after its
+# completed_at (and terminals' clocks may differ slightly), so orders written
+# this long before the previous refresh are looked at again
+COMMIT_LAG = timedelta(minutes=5)
+
+# When an order row was written; orders from before completed_at existed count as written when placed
+WRITTEN_AT = "COALESCE(o.completed_at, o.timestamp)"
+
+SUMMARY_COLUMNS = ['order_count', 'revenue', 'items_sold', 'member_order_count', 'member_revenue']
+
+def _as_datetime(value) -> Optional[datetime]:
+    # SQLite returns computed timestamps (truncated hours, MAX) as text
+    return value if isinstance(value, datetime) or value is None else datetime.fromisoformat(value)
+
+def _hour_ranges(hours: List[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Runs of consecutive hours as [start, end) ranges"""
+    ranges = []
+    for hour in sorted(hours):
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1] = (ranges[-1][0], hour + timedelta(hours=1))
+        else:
+            ranges.append((hour, hour + timedelta(hours=1)))
+    return ranges
+
+def refresh_sales_summary(since: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Bring sales_hourly up to date and return the first hour recomputed (None if none was).
+    
+    An order counts toward the hour it was placed in but is written when it
+    completes, which can be hours later. So the refresh is driven by the
+    orders' write times (WRITTEN_AT): it recomputes exactly the hours of
+    the orders written since the previous refresh (less COMMIT_LAG), however
+    old those hours are, and costs the same however long the order history
+    grows. Pass ``since`` to recompute every hour from then on as well;
+    ``datetime.min`` rebuilds the whole summary.
+    """
+    hour = get_backend().truncate_to_hour('o.timestamp')
+    with transaction() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT refreshed_through FROM sales_summary_state WHERE id = 1")
+        row = cursor.fetchone()
+        refreshed_through = row[0] if row else None
+        # Read before the orders, so one written meanwhile is looked at again next time
+        cursor.execute(f"SELECT MAX({WRITTEN_AT}) FROM orders o")
+        written_through = _as_datetime(cursor.fetchone()[0])
+        
+        if refreshed_through is None:
+            since = datetime.min
+        if since is not None:
+            since = since.replace(minute=0, second=0, microsecond=0)
+        
+        ranges = []
+        if refreshed_through is not None:
+            cursor.execute(
+                f"SELECT DISTINCT {hour} FROM orders o WHERE {WRITTEN_AT} > %s",
+                (refreshed_through - COMMIT_LAG,)
+            )
+            hours = [_as_datetime(row[0]) for row in cursor.fetchall()]
+            ranges = _hour_ranges([hour_start for hour_start in hours if since is None or hour_start < since])
+        if since is not None:
+            ranges.append((since, datetime.max))
+        
+        for start, end in ranges:
+            # Hours left with no completed orders must not keep their old totals. The
+            # upsert lets a concurrent refresh of the same hours overwrite rather than collide
+            cursor.execute("DELETE FROM sales_hourly WHERE hour >= %s AND hour < %s", (start, end))
+            cursor.execute(
+                f"""
+                INSERT INTO sales_hourly (hour, {', '.join(SUMMARY_COLUMNS)})
+                SELECT {hour}, COUNT(*), SUM(o.total_amount), SUM(COALESCE(i.item_count, 0)),
+                       SUM(CASE WHEN o.customer_id <> %s THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN o.customer_id <> %s THEN o.total_amount ELSE 0 END)
+                FROM orders o
+                LEFT JOIN (
+                    SELECT oi.order_id, COUNT(*) AS item_count
+                    FROM order_items oi JOIN orders io ON io.order_id = oi.order_id
+                    WHERE io.status = 'Completed' AND io.timestamp >= %s AND io.timestamp < %s
+                    GROUP BY oi.order_id
+                ) i ON i.order_id = o.order_id
+                WHERE o.status = 'Completed' AND o.timestamp >= %s AND o.timestamp < %s
+                GROUP BY {hour}
+                ON CONFLICT (hour) DO UPDATE SET
+                {', '.join(f'{column} = EXCLUDED.{column}' for column in SUMMARY_COLUMNS)}
+                """,
+                (NON_MEMBER_ID, NON_MEMBER_ID, start, end, start, end)
+            )
+        
+        if written_through is not None and (refreshed_through is None or written_through > refreshed_through):
+            cursor.execute("UPDATE sales_summary_state SET refreshed_through = %s WHERE id = 1", (written_through,))
+        
+        cursor.close()
+    return ranges[0][0] if ranges else None
+
+def load_hourly_sales(start: datetime, end: datetime) -> pd.DataFrame:
+    """Summary rows for the hours in [start, end), indexed by hour"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT hour, {', '.join(SUMMARY_COLUMNS)} FROM sales_hourly "
+            "WHERE hour >= %s AND hour < %s ORDER BY hour",
+            (start, end)
+        )
+        rows = [tuple(row) for row in cursor.fetchall()]
+        cursor.close()
+    
+    frame = pd.DataFrame(rows, columns=['hour'] + SUMMARY_COLUMNS)
+    frame['hour'] = pd.to_datetime(frame['hour'])
+    return frame.set_index('hour').astype({
+        'order_count': 'int64', 'revenue': 'float64', 'items_sold': 'int64',
+        'member_order_count': 'int64', 'member_revenue': 'float64',
+    })
+
+def with_derived_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add average ticket, items per order and the member/non-member split to summary rows"""
+    frame = frame.copy()
+    orders = frame['order_count'].where(frame['order_count'] > 0)
+    revenue = frame['revenue'].where(frame['revenue'] > 0)
+    frame['average_ticket'] = frame['revenue'] / orders
+    frame['items_per_order'] = frame['items_sold'] / orders
+    frame['non_member_order_count'] = frame['order_count'] - frame['member_order_count']
+    frame['non_member_revenue'] = frame['revenue'] - frame['member_revenue']
+    frame['member_revenue_share'] = frame['member_revenue'] / revenue
+    return frame
+
+def sales_report(start: datetime, end: datetime, freq: str = 'D') -> pd.DataFrame:
+    """Sales per ``freq`` period ('h', 'D', 'W', ...) between start and end, empty periods included"""
+    hourly = load_hourly_sales(start, end)
+    if freq.lower() != 'h':
+        hourly = hourly.resample(freq).sum()
+    return with_derived_columns(hourly)
+
+def sales_totals(start: datetime, end: datetime) -> pd.Series:
+    """Totals and averages for the whole range"""
+    totals = load_hourly_sales(start, end).sum().to_frame().T
+    return with_derived_columns(totals).iloc[0]
+
+def hour_of_day_profile(start: datetime, end: datetime) -> pd.DataFrame:
+    """Sales by hour of the day (0-23) over the range, to show the busy hours"""
+    hourly = load_hourly_sales(start, end)
+    profile = hourly.groupby(hourly.index.hour).sum().reindex(range(24), fill_value=0)
+    profile.index.name = 'hour_of_day'
+    return with_derived_columns(profile)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Sales summary maintenance and reports")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    refresh = subcommands.add_parser('refresh', help="roll new orders up into sales_hourly")
+    refresh.add_argument('--rebuild', action='store_true', help="recompute the whole summary")
+    report = subcommands.add_parser('report', help="print recent sales")
+    report.add_argument('--days', type=int, default=7)
+    report.add_argument('--hourly', action='store_true', help="one row per hour instead of per day")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'refresh':
+        since = refresh_sales_summary(datetime.min if args.rebuild else None)
+        if args.rebuild:
+            print("rebuilt sales_hourly")
+        else:
+            print(f"refreshed sales_hourly from {since}" if since else "sales_hourly is up to date")
+    elif args.command == 'report':
+        end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        start = (end - timedelta(days=args.days)).replace(hour=0)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(sales_report(start, end, 'h' if args.hourly else 'D').round(2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
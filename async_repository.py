@@ -0,0 +1,148 @@
+"""
+Asyncio access to the model classes.
+
+psycopg2 is blocking, so every coroutine here runs the existing sync model
+code on a worker thread with its own pooled connection. Awaiting one call is
+no faster than the sync version; the gain comes from gathering independent
+reads (member profile, favorites, allergies, menu) so their round trips
+overlap instead of queueing up:
+
+    repository = AsyncRepository()
+    member, menu_items = await asyncio.gather(
+        repository.load_member(member_id), repository.load_menu()
+    )
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+from allergic import Allergy
+from customer import Member
+from db_utils import get_pool
+from menu_item import MenuItem
+from order import Order
+from restaurant import Restaurant
+
+class DinerSession(NamedTuple):
+    """Everything the app shows right after a member logs in"""
+    member: Member
+    recommendations: List[MenuItem]
+    allergen_warnings: Dict[int, List[str]]
+
+class AsyncRepository:
+    """
+    Awaitable load/save methods for Member, MenuItem, Allergy and Order.
+    
+    Calls run on a dedicated thread pool no larger than the connection pool,
+    so a burst of gathered queries waits for a thread rather than timing out
+    on a connection checkout.
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or get_pool().max_size,
+            thread_name_prefix='async-repository'
+        )
+    
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run any blocking database call on the repository's threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def close(self):
+        self._executor.shutdown(wait=True)
+    
+    # Members
+    
+    async def load_member(self, member_id: str) -> Optional[Member]:
+        """Load a member, reading profile, favorites and allergies concurrently"""
+        profile, favorites, allergies = await asyncio.gather(
+            self.run(Member._fetch_profile, member_id),
+            self.run(Member._fetch_favorites, member_id),
+            self.run(Member._fetch_allergies, member_id),
+        )
+        if not profile:
+            return None
+        return Member._from_rows(profile, favorites, allergies)
+    
+    async def load_members(self, member_ids: List[str]) -> Dict[str, Member]:
+        """Load several members concurrently; unknown ids are left out"""
+        members = await asyncio.gather(*(self.load_member(member_id) for member_id in member_ids))
+        return {member.member_id: member for member in members if member is not None}
+    
+    async def add_points(self, member: Member, points: int):
+        await self.run(member.add_points, points)
+    
+    async def use_points(self, member: Member, points: int) -> bool:
+        return await self.run(member.use_points, points)
+    
+    async def update_favorites(self, member: Member, menu_item_ids: List[int]):
+        await self.run(member.update_favorites_many, menu_item_ids)
+    
+    async def add_allergy(self, member: Member, allergen: str, severity: str = "Moderate") -> Allergy:
+        return await self.run(member.add_allergy, allergen, severity)
+    
+    async def remove_allergy(self, member: Member, allergy_id: int) -> bool:
+        return await self.run(member.remove_allergy, allergy_id)
+    
+    # Allergies
+    
+    async def load_allergy(self, allergy_id: int) -> Optional[Allergy]:
+        return await self.run(Allergy.load_from_db, allergy_id)
+    
+    async def save_allergy(self, allergy: Allergy):
+        await self.run(allergy.save_to_db)
+    
+    # Menu
+    
+    async def load_menu_item(self, menu_id: int) -> Optional[MenuItem]:
+        return await self.run(MenuItem.load_from_db, menu_id)
+    
+    async def load_menu(self) -> Dict[int, MenuItem]:
+        return await self.run(MenuItem.load_all_from_db)
+    
+    async def save_menu_item(self, item: MenuItem):
+        await self.run(item.save_to_db)
+    
+    async def bulk_save_menu_items(self, items: List[MenuItem]) -> List[MenuItem]:
+        return await self.run(MenuItem.bulk_save_to_db, items)
+    
+    # Orders
+    
+    async def complete_order(self, order: Order, restaurant: Optional[Restaurant] = None):
+        """Complete an order; through ``restaurant`` if given, so its recommender sees the new favorites"""
+        if restaurant is not None:
+            await self.run(restaurant.complete_order, order)
+        else:
+            await self.run(order.complete_order)
+    
+    # Restaurant
+    
+    async def get_member(self, restaurant: Restaurant, member_id: str) -> Optional[Member]:
+        """Like Restaurant.get_member, loading a cache miss without blocking the event loop"""
+        member = restaurant.members.peek(member_id)
+        if member is None:
+            member = await self.load_member(member_id)
+            if member is not None:
+                restaurant.members.put(member)
+        return member
+    
+    async def refresh_menu(self, restaurant: Restaurant):
+        restaurant.replace_menu(await self.load_menu())
+    
+    async def login(self, restaurant: Restaurant, member_id: str, refresh_menu: bool = True) -> Optional[DinerSession]:
+        """
+        The "diner logs in" flow: load the member and (optionally) a fresh
+        menu at the same time, then work out recommendations and allergen
+        warnings in memory.
+        """
+        if refresh_menu:
+            member, _ = await asyncio.gather(self.get_member(restaurant, member_id), self.refresh_menu(restaurant))
+        else:
+            member = await self.get_member(restaurant, member_id)
+        if member is None:
+            return None
+        return DinerSession(
+            member=member,
+            recommendations=restaurant.get_recommendations(member),
+            allergen_warnings=restaurant.check_menu_allergens(member),
+        )
@@ -0,0 +1,12 @@
+"""
+Performance benchmarks for the restaurant models.
+
+Run the modules from the repository root, e.g. ``python -m benchmarks.startup``.
+They write synthetic rows into the database configured by the usual DB_*
+environment variables, so point them at a scratch database and bring its
+schema up to date first with ``python migrations.py upgrade``.
+
+``python -m benchmarks.suite`` times the main operations on a configurable
+synthetic dataset and saves the results under benchmarks/results/, keyed by
+commit, for comparison with later runs.
+"""
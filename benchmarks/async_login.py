@@ -0,0 +1,124 @@
+"""
+Wall-clock time of the "diner logs in" flow, sync vs. async.
+
+Each login loads the member (profile, favorites, allergies) from the
+database, reloads the menu, and computes recommendations and allergen
+warnings. The sync flow does this one query after another; the async flow
+overlaps the independent reads. The member cache is cleared before every
+login so each one really goes to the database. Also runs a burst of
+concurrent logins, as when a table of diners signs in at once.
+
+Against a database on the same host round trips are nearly free and the
+thread hop can make async slightly slower; ``--rtt-ms`` adds a simulated
+network delay to every query to show the effect of a remote database:
+
+    python -m benchmarks.async_login --members 5000 --menu-items 200 --logins 200 --burst 8 --rtt-ms 2
+"""
+import argparse
+import asyncio
+import random
+import time
+from functools import lru_cache
+from typing import List
+from psycopg2 import extensions
+from async_repository import AsyncRepository
+from db_utils import ConnectionPool, get_db_connection, set_pool
+from restaurant import Restaurant
+from benchmarks.seed import seed_menu, seed_members, clear_seeded_data
+from benchmarks.timing import percentiles
+
+def delayed_connection_factory(rtt: float):
+    """A psycopg2 connection class whose cursors sleep ``rtt`` seconds before every execute"""
+    @lru_cache(maxsize=None)
+    def delayed(cursor_class):
+        class DelayedCursor(cursor_class):
+            def execute(self, *args, **kwargs):
+                time.sleep(rtt)
+                return super().execute(*args, **kwargs)
+        return DelayedCursor
+    
+    class DelayedConnection(extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs['cursor_factory'] = delayed(kwargs.get('cursor_factory') or extensions.cursor)
+            return super().cursor(*args, **kwargs)
+    return DelayedConnection
+
+def sync_login(restaurant: Restaurant, member_id: str):
+    restaurant.invalidate_member(member_id)
+    member = restaurant.get_member(member_id)
+    restaurant.refresh_menu()
+    restaurant.get_recommendations(member)
+    restaurant.check_menu_allergens(member)
+
+async def async_login(repository: AsyncRepository, restaurant: Restaurant, member_id: str):
+    restaurant.invalidate_member(member_id)
+    await repository.login(restaurant, member_id)
+
+async def timed(coroutine_factory, samples: List[float]):
+    started = time.perf_counter()
+    await coroutine_factory()
+    samples.append(time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--menu-items', type=int, default=200)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--burst', type=int, default=8, help="diners logging in at the same moment")
+    parser.add_argument('--rtt-ms', type=float, default=0, help="simulated network round trip per query")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.rtt_ms:
+        connection_factory = delayed_connection_factory(args.rtt_ms / 1000)
+        set_pool(ConnectionPool(max_size=16, connect=lambda: get_db_connection(connection_factory=connection_factory)))
+    
+    rng = random.Random(args.seed)
+    try:
+        clear_seeded_data()
+        menu_ids = seed_menu(args.menu_items)
+        member_ids = seed_members(args.members, menu_ids)
+        restaurant = Restaurant("Benchmark")
+        repository = AsyncRepository()
+        sample = [rng.choice(member_ids) for _ in range(args.logins)]
+        
+        # Single diner: sequential reads vs. overlapped reads
+        sync_samples = []
+        for member_id in sample:
+            started = time.perf_counter()
+            sync_login(restaurant, member_id)
+            sync_samples.append(time.perf_counter() - started)
+        
+        async_samples: List[float] = []
+        
+        async def single_logins():
+            for member_id in sample:
+                await timed(lambda: async_login(repository, restaurant, member_id), async_samples)
+        
+        asyncio.run(single_logins())
+        print(f"one login   sync:  {percentiles(sync_samples)}")
+        print(f"one login   async: {percentiles(async_samples)}")
+        
+        # Bursts: the sync app serves them one after another
+        bursts = [sample[start:start + args.burst] for start in range(0, len(sample), args.burst)]
+        started = time.perf_counter()
+        for burst in bursts:
+            for member_id in burst:
+                sync_login(restaurant, member_id)
+        sync_total = time.perf_counter() - started
+        
+        async def burst_logins():
+            for burst in bursts:
+                await asyncio.gather(*(async_login(repository, restaurant, member_id) for member_id in burst))
+        
+        started = time.perf_counter()
+        asyncio.run(burst_logins())
+        async_total = time.perf_counter() - started
+        print(f"{len(sample)} logins in bursts of {args.burst}: sync {sync_total:.2f} s  "
+              f"async {async_total:.2f} s  ({sync_total / async_total:.1f}x)")
+        repository.close()
+    finally:
+        clear_seeded_data()
+
+if __name__ == '__main__':
+    main()
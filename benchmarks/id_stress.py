@@ -0,0 +1,93 @@
+"""
+Concurrency stress check for the id generators.
+
+Many threads in several processes draw ids at once; the run fails (exit
+status 1) if any id is handed out twice, and reports the aggregate rate.
+The sequence-backed generator uses a scratch sequence, not the real ones.
+An in-memory database lives in one process, so with the memory backend
+every thread runs in this process instead.
+
+    python -m benchmarks.id_stress --processes 4 --threads 8 --ids 2000
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from db_utils import create_sequence, drop_sequence, pooled_connection
+from id_generator import KSortableIdGenerator, SequenceIdGenerator
+from storage import get_backend
+
+SCRATCH_SEQUENCE = 'bench_id_stress_seq'
+
+def _make_generator(kind: str, block_size: int):
+    if kind == 'ksortable':
+        return KSortableIdGenerator()
+    return SequenceIdGenerator(SCRATCH_SEQUENCE, block_size=block_size)
+
+def _worker(args):
+    """Run in a child process: ``threads`` threads each draw ``ids`` ids from one shared generator"""
+    kind, threads, ids, block_size = args
+    generator = _make_generator(kind, block_size)
+    results = [[] for _ in range(threads)]
+    
+    def draw(out):
+        for _ in range(ids):
+            out.append(generator.next_id())
+    
+    workers = [threading.Thread(target=draw, args=(out,)) for out in results]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    # Every thread's ids must also come out in increasing order for k-sortable ids
+    ordered = all(out == sorted(out) for out in results) if kind == 'ksortable' else True
+    return [value for out in results for value in out], ordered
+
+def run(kind: str, processes: int, threads: int, ids: int, block_size: int) -> bool:
+    started = time.perf_counter()
+    if processes == 1:
+        results = [_worker((kind, threads, ids, block_size))]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_worker, [(kind, threads, ids, block_size)] * processes)
+    elapsed = time.perf_counter() - started
+    
+    all_ids = [value for values, _ in results for value in values]
+    duplicates = len(all_ids) - len(set(all_ids))
+    ordered = all(ok for _, ok in results)
+    print(f"{kind:<10} {len(all_ids):>9} ids  {len(all_ids) / elapsed:>11,.0f} ids/s  "
+          f"duplicates={duplicates}  per-thread ordered={ordered}")
+    return duplicates == 0 and ordered
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ids', type=int, default=2000, help="ids drawn per thread")
+    parser.add_argument('--block-size', type=int, default=100, help="values reserved per sequence round trip")
+    parser.add_argument('--kinds', nargs='+', default=['ksortable', 'sequence'], choices=['ksortable', 'sequence'])
+    args = parser.parse_args()
+    if get_backend().name == 'memory':
+        args.processes = 1
+    
+    if 'sequence' in args.kinds:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            create_sequence(cursor, SCRATCH_SEQUENCE)
+            cursor.close()
+    
+    try:
+        ok = all([run(kind, args.processes, args.threads, args.ids, args.block_size) for kind in args.kinds])
+    finally:
+        if 'sequence' in args.kinds:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                drop_sequence(cursor, SCRATCH_SEQUENCE)
+                cursor.close()
+    
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
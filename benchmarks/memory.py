@@ -0,0 +1,142 @@
+"""
+Memory footprint of members and menu items, and the cost of whole-menu scans.
+
+Needs no database: members and menu items are generated in memory. Each
+model class is measured as it is (with ``__slots__``) and as a copy that
+keeps its attributes in a per-instance ``__dict__``, the way the classes
+stored them before; the menu is also measured as MenuColumns arrays.
+
+    python -m benchmarks.memory --members 100000 --menu-items 2000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+import types
+from typing import Callable, Dict, List
+from allergic import Allergy
+from customer import Customer, Member
+from menu_columns import MenuColumns
+from menu_item import MenuItem
+from benchmarks.seed import ALLERGENS, CATEGORIES, SEVERITIES
+
+_unslotted: Dict[type, type] = {}
+
+def _rebind(value, cls: type):
+    """A function (or property) whose zero-argument super() refers to ``cls``"""
+    if isinstance(value, property):
+        return property(*(_rebind(func, cls) if func else None for func in (value.fget, value.fset, value.fdel)),
+                        value.__doc__)
+    if isinstance(value, (staticmethod, classmethod)):
+        return type(value)(_rebind(value.__func__, cls))
+    if isinstance(value, types.FunctionType) and '__class__' in value.__code__.co_freevars:
+        closure = tuple(types.CellType(cls) if name == '__class__' else cell
+                        for name, cell in zip(value.__code__.co_freevars, value.__closure__))
+        return types.FunctionType(value.__code__, value.__globals__, value.__name__, value.__defaults__, closure)
+    return value
+
+def unslotted(cls: type) -> type:
+    """A copy of a model class (and its model bases) whose instances keep attributes in a __dict__"""
+    if cls is object:
+        return object
+    if cls not in _unslotted:
+        slots = set(getattr(cls, '__slots__', ()))
+        namespace = {name: value for name, value in vars(cls).items()
+                     if name not in slots and name not in ('__slots__', '__dict__', '__weakref__')}
+        copy = type(cls.__name__, tuple(unslotted(base) for base in cls.__bases__), namespace)
+        for name, value in namespace.items():
+            setattr(copy, name, _rebind(value, copy))
+        _unslotted[cls] = copy
+    return _unslotted[cls]
+
+def allocated(build: Callable[[], object]) -> int:
+    """Bytes still allocated by what ``build`` returns"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+def build_members(count: int, menu_ids: List[int], favorites_per_member: int, allergy_rate: float,
+                  member_cls: type, allergy_cls: type, seed: int) -> List[Member]:
+    rng = random.Random(seed)
+    members = []
+    for n in range(count):
+        member = member_cls(f"Member {n}", f"08{n:08d}", f"M{n:07d}", rng.randint(0, 500))
+        for menu_id in rng.sample(menu_ids, favorites_per_member):
+            member.favorite_items[menu_id] = rng.randint(1, 20)
+        if rng.random() < allergy_rate:
+            member.allergies = [allergy_cls(n, member.member_id, rng.choice(ALLERGENS), rng.choice(SEVERITIES))]
+        members.append(member)
+    return members
+
+def build_menu(count: int, allergens_per_item: int, menu_item_cls: type, seed: int) -> List[MenuItem]:
+    rng = random.Random(seed)
+    return [
+        menu_item_cls(menu_id, f"Dish {menu_id}", float(rng.randint(40, 400)), rng.choice(CATEGORIES),
+                      rng.sample(ALLERGENS, rng.randint(0, allergens_per_item)))
+        for menu_id in range(1, count + 1)
+    ]
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--menu-items', type=int, default=2000)
+    parser.add_argument('--favorites-per-member', type=int, default=5)
+    parser.add_argument('--allergy-rate', type=float, default=0.3)
+    parser.add_argument('--allergens-per-item', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    menu_ids = list(range(1, args.menu_items + 1))
+    favorites = min(args.favorites_per_member, len(menu_ids))
+    
+    print(f"{'per object (bytes)':<34} {'__dict__':>10} {'__slots__':>10} {'saved':>7}")
+    rows = [
+        ("Customer", lambda cls: [cls(f"Guest {n}", "0800000000") for n in range(args.members)],
+         Customer, args.members),
+        ("Allergy", lambda cls: [cls(n, f"M{n:07d}", "Peanut", "Mild") for n in range(args.members)],
+         Allergy, args.members),
+        ("Member (with favorites, allergies)",
+         lambda cls: build_members(args.members, menu_ids, favorites, args.allergy_rate,
+                                   cls, cls is Member and Allergy or unslotted(Allergy), args.seed),
+         Member, args.members),
+        ("MenuItem (with allergens)",
+         lambda cls: build_menu(args.menu_items, args.allergens_per_item, cls, args.seed),
+         MenuItem, args.menu_items),
+    ]
+    for label, build, cls, count in rows:
+        before = allocated(lambda: build(unslotted(cls))) / count
+        after = allocated(lambda: build(cls)) / count
+        print(f"{label:<34} {before:>10.0f} {after:>10.0f} {1 - after / before:>6.0%}")
+    
+    menu = build_menu(args.menu_items, args.allergens_per_item, MenuItem, args.seed)
+    columns = MenuColumns(menu)
+    print(f"{'MenuColumns arrays':<34} {'':>10} {columns.nbytes / len(columns):>10.0f}")
+    
+    # The scans Restaurant.safe_menu_items / check_menu_allergens run per diner
+    member_mask = Member("Diner", "0800000000", "M0000000", 0)
+    member_mask.allergies = [Allergy(0, "M0000000", allergen, "Mild") for allergen in ALLERGENS[:2]]
+    mask = member_mask.allergen_mask
+    loop = best_time(lambda: [item for item in menu if not item.allergen_mask & mask], args.repeat)
+    vectorized = best_time(lambda: columns.safe_ids(mask), args.repeat)
+    print(f"\nsafe dishes for one diner over {len(menu)} items: "
+          f"objects {loop * 1000:.3f} ms, columns {vectorized * 1000:.3f} ms ({loop / vectorized:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Latency of fuzzy menu search on a synthetic Thai and English menu.
+
+Needs no database: dish names are generated from common syllables in both
+scripts, and queries are partial, run-together or misspelled versions of them.
+
+    python -m benchmarks.menu_search --items 10000
+"""
+import argparse
+import random
+import time
+from menu_item import MenuItem
+from menu_search import MenuSearchIndex
+from benchmarks.seed import CATEGORIES
+from benchmarks.timing import percentiles
+
+SYLLABLES = [
+    'tom', 'yum', 'kung', 'pad', 'thai', 'kra', 'pao', 'gai', 'moo', 'som', 'tam', 'khao', 'man', 'nam',
+    'prik', 'pla', 'kaeng', 'khiao', 'wan', 'ped', 'see', 'ew', 'larb', 'satay',
+    'ต้ม', 'ยำ', 'กุ้ง', 'ผัด', 'ไทย', 'กะเพรา', 'ไก่', 'หมู', 'ส้ม', 'ตำ', 'ข้าว', 'มัน', 'แกง', 'เขียว', 'หวาน',
+]
+
+QUERIES = ['tomyum', 'pad tai', 'ส้มตำ', 'สมตำ', 'kaeng khiew', 'kra pow moo', 'ผัดไท', 'khao man gai', 'sat', 'soup']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    items = [
+        MenuItem(menu_id, ' '.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))), 100.0,
+                 rng.choice(CATEGORIES))
+        for menu_id in range(1, args.items + 1)
+    ]
+    
+    started = time.perf_counter()
+    index = MenuSearchIndex(items)
+    print(f"index build: {time.perf_counter() - started:.2f} s for {len(items)} items")
+    
+    for query in QUERIES:
+        index.search(query)
+    latencies = []
+    for _ in range(args.requests):
+        query = rng.choice(QUERIES)
+        started = time.perf_counter()
+        index.search(query, 10)
+        latencies.append(time.perf_counter() - started)
+    print(f"search:      {percentiles(latencies)}")
+    
+    latencies = []
+    for menu_id in range(args.items + 1, args.items + 1 + min(args.requests, 1000)):
+        item = MenuItem(menu_id, ' '.join(rng.choice(SYLLABLES) for _ in range(3)), 100.0, rng.choice(CATEGORIES))
+        started = time.perf_counter()
+        index.add(item)
+        latencies.append(time.perf_counter() - started)
+    print(f"add item:    {percentiles(latencies)}")
+    
+    for query in QUERIES[:3]:
+        print(f"  {query!r}: {[items[menu_id - 1].name for menu_id, _ in index.search(query, 3) if menu_id <= len(items)]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Query-plan regression check.
+
+Seeds a dataset, runs the model classes through their usual work (restaurant
+startup, member lookups, allergy edits, menu edits, completing orders, paging
+order history, refreshing the sales summary) while recording every statement
+they send, then runs EXPLAIN on each one. The check fails (exit status 1) if a
+plan contains a filtered sequential scan on a large table, which almost always
+means a missing index. Unfiltered scans are allowed: the bulk loaders read
+whole tables on purpose. tests/test_query_plans.py runs the same check on a
+smaller dataset.
+
+Lookups that no model issues yet but the schema is indexed for (dishes by
+allergen, favorites and order lines by dish) are checked too.
+
+    python -m benchmarks.query_plans --members 20000 --orders 50000
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Set
+from psycopg2 import extensions
+import analytics
+from db_utils import ConnectionPool, get_db_connection, set_pool, pooled_connection
+from menu_item import MenuItem
+from restaurant import Restaurant
+from benchmarks.seed import seed_dataset, clear_seeded_data, FIRST_MENU_ID
+
+EXTRA_QUERIES = [
+    ("SELECT menu_item_id FROM menu_allergens WHERE allergen = %s", ('Peanut',)),
+    ("SELECT member_id, count FROM favorite_items WHERE menu_item_id = %s", ('{menu_id}',)),
+    ("SELECT order_id FROM order_items WHERE menu_item_id = %s", ('{menu_id}',)),
+]
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+def recording_connection_factory(statements: List[str]):
+    """A psycopg2 connection class that appends every statement it executes to ``statements``"""
+    recording_classes: Dict[type, type] = {}
+    
+    def recording(cursor_class):
+        if cursor_class not in recording_classes:
+            class RecordingCursor(cursor_class):
+                def execute(self, query, vars=None):
+                    text = self.mogrify(query, vars) if vars is not None else query
+                    statements.append(text.decode() if isinstance(text, bytes) else text)
+                    return super().execute(query, vars)
+            recording_classes[cursor_class] = RecordingCursor
+        return recording_classes[cursor_class]
+    
+    class RecordingConnection(extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs['cursor_factory'] = recording(kwargs.get('cursor_factory') or extensions.cursor)
+            return super().cursor(*args, **kwargs)
+    return RecordingConnection
+
+def run_workload(member_ids: List[str], menu_ids: List[int]):
+    """Exercise the model classes the way the app does"""
+    restaurant = Restaurant("Plan check")
+    for member_id in member_ids:
+        member = restaurant.get_member(member_id)
+        restaurant.check_menu_allergens(member)
+        restaurant.get_recommendations(member)
+        allergy = member.add_allergy('Sesame', 'Mild')
+        member.get_allergies()
+        member.remove_allergy(allergy.allergy_id)
+        
+        order = restaurant.create_order(member)
+        order.add_item(restaurant.menu_items[menu_ids[0]])
+        order.add_item(restaurant.menu_items[menu_ids[1]])
+        restaurant.complete_order(order)
+        
+        # First page, then one seeking past it
+        history = member.order_history
+        page = history.page(page_size=1)
+        if page.next_cursor:
+            history.page(page.next_cursor, page_size=1)
+    
+    # Incremental: main() refreshed once before recording, so only this run's hours are recomputed
+    analytics.refresh_sales_summary()
+    
+    item = restaurant.refresh_menu_item(menu_ids[0])
+    item.add_allergen('Sesame')
+    item.remove_allergen('Sesame')
+    restaurant.import_menu_items([MenuItem(menu_ids[1], "Renamed dish", 99.0, "Main", ['Egg'])])
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+def filtered_seq_scans(plan: dict, tables: Set[str]) -> List[dict]:
+    """Plan nodes that scan one of ``tables`` sequentially to filter it"""
+    return [
+        node for node in plan_nodes(plan)
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables and 'Filter' in node
+    ]
+
+def large_tables(min_rows: int) -> Set[str]:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace "
+            "AND reltuples >= %s",
+            (min_rows,)
+        )
+        tables = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+    return tables
+
+def explain(statement: str) -> dict:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement)
+        plan = cursor.fetchone()[0]
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+def query_shape(statement: str) -> str:
+    """The statement with its literal values blanked out, so each query is explained once"""
+    return re.sub(r"'[^']*'|\b\d+(\.\d+)?\b", '?', ' '.join(statement.split()))[:200]
+
+class PlanReport:
+    """EXPLAIN output of every distinct statement the workload sent, and which tables counted as large"""
+    def __init__(self, plans: Dict[str, dict], large: Set[str]):
+        self.plans = plans
+        self.large_tables = large
+    
+    @property
+    def failures(self) -> Dict[str, List[dict]]:
+        """Offending plan nodes by query shape"""
+        failures = {}
+        for shape, plan in self.plans.items():
+            bad = filtered_seq_scans(plan, self.large_tables)
+            if bad:
+                failures[shape] = bad
+        return failures
+
+def check_query_plans(members: int = 20000, menu_items: int = 500, orders: int = 50000, sample: int = 3,
+                      min_rows: int = 5000) -> PlanReport:
+    """
+    Seed a dataset into the configured PostgreSQL database, run the workload
+    and EXPLAIN what it sent; the seeded rows are removed again afterwards
+    """
+    statements: List[str] = []
+    workload_started = None
+    try:
+        menu_ids, member_ids, _ = seed_dataset(menu_items, members, orders_per_member=orders / members)
+        # Not recorded: on a database never summarized this is the full rebuild
+        analytics.refresh_sales_summary()
+        
+        connection_factory = recording_connection_factory(statements)
+        set_pool(ConnectionPool(connect=lambda: get_db_connection(connection_factory=connection_factory)))
+        try:
+            workload_started = datetime.now()
+            run_workload(member_ids[:sample], menu_ids)
+        finally:
+            set_pool(ConnectionPool())
+        
+        params = {'menu_id': FIRST_MENU_ID}
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            for query, values in EXTRA_QUERIES:
+                values = tuple(params[value[1:-1]] if isinstance(value, str) and value.startswith('{') else value
+                               for value in values)
+                statements.append(cursor.mogrify(query, values).decode())
+            cursor.close()
+        
+        plans: Dict[str, dict] = {}
+        for statement in statements:
+            shape = query_shape(statement)
+            if shape not in plans and statement.lstrip().upper().startswith(EXPLAINABLE):
+                plans[shape] = explain(statement)
+        return PlanReport(plans, large_tables(min_rows))
+    finally:
+        clear_seeded_data()
+        if workload_started is not None:
+            # Take the deleted workload orders back out of the summary
+            analytics.refresh_sales_summary(since=workload_started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=20000)
+    parser.add_argument('--menu-items', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--sample', type=int, default=3, help="members taken through the workload")
+    parser.add_argument('--min-rows', type=int, default=5000, help="tables at least this big count as large")
+    args = parser.parse_args()
+    
+    report = check_query_plans(args.members, args.menu_items, args.orders, args.sample, args.min_rows)
+    failures = report.failures
+    for shape in report.plans:
+        print(f"{'SEQ SCAN' if shape in failures else 'ok':<8} {shape[:100]}")
+        for node in failures.get(shape, []):
+            print(f"         -> {node['Relation Name']}: Filter {node['Filter']}")
+    print(f"{len(report.plans)} distinct statements, {len(failures)} with sequential scans on large tables "
+          f"({', '.join(sorted(report.large_tables))})")
+    
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Latency of item-to-item recommendations on synthetic in-memory data.
+
+Needs no database: the model is fed generated (member, item, count) rows.
+
+    python -m benchmarks.recommendations --items 10000 --members 50000
+"""
+import argparse
+import random
+import time
+from customer import Member
+from menu_item import MenuItem
+from recommendation_system import RecommendationSystem
+from benchmarks.timing import percentiles
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--members', type=int, default=50000)
+    parser.add_argument('--favorites-per-member', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    # Zipf-like popularity so some dishes are ordered far more than others
+    item_weights = [1.0 / (rank + 1) for rank in range(args.items)]
+    menu_ids = list(range(1, args.items + 1))
+    
+    members = []
+    rows = []
+    for n in range(args.members):
+        member = Member(f"Member {n}", "0800000000", f"M{n:07d}")
+        for menu_id in set(rng.choices(menu_ids, item_weights, k=args.favorites_per_member)):
+            member.favorite_items[menu_id] = rng.randint(1, 10)
+            rows.append((member.member_id, menu_id, member.favorite_items[menu_id]))
+        members.append(member)
+    
+    system = RecommendationSystem()
+    system.set_menu_items(MenuItem(menu_id, f"Dish {menu_id}", 100.0, "Main") for menu_id in menu_ids)
+    
+    started = time.perf_counter()
+    system.load_interactions(rows)
+    print(f"model build: {time.perf_counter() - started:.2f} s for {len(rows)} interactions")
+    
+    latencies = []
+    for member in rng.sample(members, min(args.requests, len(members))):
+        started = time.perf_counter()
+        system.get_personal_recommendations(member, 10)
+        latencies.append(time.perf_counter() - started)
+    print(f"recommend:   {percentiles(latencies)}")
+    
+    started = time.perf_counter()
+    system.compute_batch_recommendations(10)
+    print(f"batch:       {time.perf_counter() - started:.2f} s for {len(members)} members")
+    
+    latencies = []
+    for member in rng.sample(members, min(args.requests, len(members))):
+        started = time.perf_counter()
+        system.get_recommendations(member, 10)
+        latencies.append(time.perf_counter() - started)
+    print(f"precomputed: {percentiles(latencies)}")
+    
+    latencies = []
+    for member in rng.sample(members, min(args.requests, len(members))):
+        before = dict(member.favorite_items)
+        for menu_id in rng.choices(menu_ids, item_weights, k=3):
+            member.favorite_items[menu_id] = member.favorite_items.get(menu_id, 0) + 1
+        started = time.perf_counter()
+        system.update_member(before, member.favorite_items, member.member_id)
+        latencies.append(time.perf_counter() - started)
+    print(f"order update: {percentiles(latencies)}")
+
+if __name__ == '__main__':
+    main()
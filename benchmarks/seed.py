@@ -0,0 +1,145 @@
+"""Synthetic data generator shared by the benchmarks"""
+import random
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from db_utils import execute_values, pooled_connection
+from menu_item import record_menu_changes
+
+# Seeded rows are tagged so they can be removed without touching real data
+MEMBER_PREFIX = 'BENCH'
+FIRST_MENU_ID = 900000
+FIRST_ALLERGY_ID = 900000000
+
+ALLERGENS = ['Peanut', 'Shellfish', 'Egg', 'Milk', 'Soy', 'Wheat', 'Fish', 'Sesame', 'Chili', 'Cilantro']
+SEVERITIES = ['Mild', 'Moderate', 'Severe']
+CATEGORIES = ['Soup', 'Noodle', 'Side', 'Drink', 'Main', 'Salad', 'Appetizer', 'Dessert']
+
+def seed_menu(num_items: int, allergens_per_item: int = 2, seed: int = 0) -> List[int]:
+    """Insert ``num_items`` menu items with random allergens, returning their ids"""
+    rng = random.Random(seed)
+    menu_ids = list(range(FIRST_MENU_ID, FIRST_MENU_ID + num_items))
+    
+    items = [
+        (menu_id, f"Bench dish {menu_id}", round(rng.uniform(40, 400), 2), rng.choice(CATEGORIES))
+        for menu_id in menu_ids
+    ]
+    allergens = [
+        (menu_id, allergen)
+        for menu_id in menu_ids
+        for allergen in rng.sample(ALLERGENS, rng.randint(0, allergens_per_item))
+    ]
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        execute_values(cursor, "INSERT INTO menu_items (id, name, price, category) VALUES %s", items, page_size=1000)
+        execute_values(cursor, "INSERT INTO menu_allergens (menu_item_id, allergen) VALUES %s", allergens, page_size=1000)
+        record_menu_changes(cursor, menu_ids)
+        cursor.close()
+    
+    return menu_ids
+
+def seed_members(num_members: int, menu_ids: List[int], favorites_per_member: int = 5,
+                 allergy_rate: float = 0.3, max_allergies: int = 1, seed: int = 0, batch_size: int = 5000) -> List[str]:
+    """
+    Insert ``num_members`` members with favorite items and allergies.
+    
+    A fraction ``allergy_rate`` of members is allergic, each to between 1 and
+    ``max_allergies`` distinct allergens.
+    """
+    rng = random.Random(seed)
+    member_ids = [f"{MEMBER_PREFIX}{n:07d}" for n in range(num_members)]
+    next_allergy_id = FIRST_ALLERGY_ID
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, num_members, batch_size):
+            batch = member_ids[start:start + batch_size]
+            members = [(member_id, f"Member {member_id}", f"08{rng.randint(0, 99999999):08d}", rng.randint(0, 500))
+                       for member_id in batch]
+            favorites = [
+                (member_id, menu_id, rng.randint(1, 20))
+                for member_id in batch
+                for menu_id in rng.sample(menu_ids, min(favorites_per_member, len(menu_ids)))
+            ]
+            allergies = []
+            for member_id in batch:
+                if rng.random() < allergy_rate:
+                    for allergen in rng.sample(ALLERGENS, rng.randint(1, max_allergies)):
+                        allergies.append((next_allergy_id, member_id, allergen, rng.choice(SEVERITIES)))
+                        next_allergy_id += 1
+            
+            execute_values(cursor, "INSERT INTO members (member_id, name, phone, points) VALUES %s", members, page_size=1000)
+            execute_values(cursor, "INSERT INTO favorite_items (member_id, menu_item_id, count) VALUES %s", favorites, page_size=1000)
+            execute_values(cursor, "INSERT INTO member_allergies (allergy_id, member_id, allergen, severity) VALUES %s", allergies, page_size=1000)
+        cursor.close()
+    
+    return member_ids
+
+def seed_orders(num_orders: int, member_ids: List[str], menu_ids: List[int], max_items: int = 4,
+                days: int = 180, non_member_rate: float = 0.2, seed: int = 0, batch_size: int = 5000) -> List[str]:
+    """Insert ``num_orders`` completed orders spread over the last ``days`` days"""
+    rng = random.Random(seed)
+    order_ids = [f"{MEMBER_PREFIX}-O{n:09d}" for n in range(num_orders)]
+    now = datetime.now()
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, price FROM menu_items WHERE id IN %s", (tuple(menu_ids),))
+        prices = dict(cursor.fetchall())
+        
+        for start in range(0, num_orders, batch_size):
+            orders = []
+            order_items = []
+            for order_id in order_ids[start:start + batch_size]:
+                items = rng.sample(menu_ids, rng.randint(1, min(max_items, len(menu_ids))))
+                customer_id = 'NON-MEMBER' if rng.random() < non_member_rate else rng.choice(member_ids)
+                timestamp = now - timedelta(seconds=rng.randint(0, days * 86400))
+                orders.append((order_id, customer_id, sum(prices[item] for item in items), 'Completed', timestamp, timestamp))
+                order_items.extend((order_id, item) for item in items)
+            
+            execute_values(cursor, "INSERT INTO orders (order_id, customer_id, total_amount, status, timestamp, completed_at) VALUES %s", orders, page_size=1000)
+            execute_values(cursor, "INSERT INTO order_items (order_id, menu_item_id) VALUES %s", order_items, page_size=1000)
+        cursor.close()
+    
+    return order_ids
+
+def seed_dataset(menu_items: int, members: int, orders_per_member: float = 0, favorites_per_member: int = 5,
+                 allergens_per_item: int = 2, allergy_rate: float = 0.3, max_allergies: int = 1,
+                 seed: int = 0) -> Tuple[List[int], List[str], List[str]]:
+    """Replace any seeded rows with a fresh dataset, returning (menu ids, member ids, order ids)"""
+    clear_seeded_data()
+    menu_ids = seed_menu(menu_items, allergens_per_item=allergens_per_item, seed=seed)
+    member_ids = seed_members(members, menu_ids, favorites_per_member=favorites_per_member,
+                              allergy_rate=allergy_rate, max_allergies=max_allergies, seed=seed)
+    order_ids = seed_orders(int(members * orders_per_member), member_ids, menu_ids, seed=seed)
+    
+    # Fresh statistics, so plans match what a long-running database would use
+    with pooled_connection() as conn:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE")
+        cursor.close()
+        conn.autocommit = False
+    return menu_ids, member_ids, order_ids
+
+def clear_seeded_data():
+    """Delete every row created by the seed functions"""
+    pattern = MEMBER_PREFIX + '%'
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        # Orders placed by seeded members (or for seeded dishes) during a benchmark go too
+        cursor.execute(
+            "DELETE FROM order_items WHERE order_id LIKE %s OR menu_item_id >= %s "
+            "OR order_id IN (SELECT order_id FROM orders WHERE customer_id LIKE %s)",
+            (pattern, FIRST_MENU_ID, pattern)
+        )
+        cursor.execute("DELETE FROM orders WHERE order_id LIKE %s OR customer_id LIKE %s", (pattern, pattern))
+        cursor.execute("DELETE FROM favorite_items WHERE member_id LIKE %s OR menu_item_id >= %s", (pattern, FIRST_MENU_ID))
+        cursor.execute("DELETE FROM member_allergies WHERE member_id LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM members WHERE member_id LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM menu_allergens WHERE menu_item_id >= %s", (FIRST_MENU_ID,))
+        cursor.execute("DELETE FROM menu_items WHERE id >= %s RETURNING id", (FIRST_MENU_ID,))
+        deleted = [row[0] for row in cursor.fetchall()]
+        if deleted:
+            record_menu_changes(cursor, deleted)
+        cursor.close()
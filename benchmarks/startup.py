@@ -0,0 +1,92 @@
+"""
+Restaurant startup time vs. member count.
+
+Compares the old per-row loading (one allergen query per menu item, two
+extra queries per member) with the set-based bulk loaders, and reports how
+long Restaurant construction takes now that members are loaded lazily:
+    
+    python -m benchmarks.startup --members 1000 10000 50000
+"""
+import argparse
+import time
+from allergic import Allergy
+from customer import Member
+from db_utils import DictCursor, pooled_connection
+from menu_item import MenuItem
+from restaurant import Restaurant
+from benchmarks.seed import seed_menu, seed_members, clear_seeded_data
+
+def legacy_load():
+    """The N+1 loading Restaurant used before the bulk loaders, kept for comparison"""
+    menu_items = {}
+    members = {}
+    with pooled_connection() as conn:
+        cursor = conn.cursor(cursor_factory=DictCursor)
+        
+        cursor.execute("SELECT * FROM menu_items")
+        for item in cursor.fetchall():
+            menu_item = MenuItem(item['id'], item['name'], float(item['price']), item['category'])
+            cursor.execute("SELECT allergen FROM menu_allergens WHERE menu_item_id = %s", (menu_item.id,))
+            menu_item.allergens = [data['allergen'] for data in cursor.fetchall()]
+            menu_items[menu_item.id] = menu_item
+        
+        cursor.execute("SELECT * FROM members")
+        for data in cursor.fetchall():
+            member = Member(data['name'], data['phone'], data['member_id'], data['points'])
+            cursor.execute("SELECT menu_item_id, count FROM favorite_items WHERE member_id = %s", (member.member_id,))
+            for item in cursor.fetchall():
+                member.favorite_items[item['menu_item_id']] = item['count']
+            cursor.execute("SELECT * FROM member_allergies WHERE member_id = %s", (member.member_id,))
+            member.allergies = [
+                Allergy(allergy['allergy_id'], allergy['member_id'], allergy['allergen'], allergy['severity'])
+                for allergy in cursor.fetchall()
+            ]
+            members[member.member_id] = member
+        
+        cursor.close()
+    return menu_items, members
+
+def bulk_load():
+    """Everything legacy_load reads, through the set-based loaders"""
+    menu_items = MenuItem.load_all_from_db()
+    members = {member.member_id: member for member in Member.load_all_from_db()}
+    return menu_items, members
+
+def time_call(func, repeat: int) -> float:
+    """Best wall-clock time of ``repeat`` calls, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--menu-items', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-limit', type=int, default=20000,
+                        help="skip the legacy loader above this many members (it is very slow)")
+    args = parser.parse_args()
+    
+    try:
+        print(f"{'members':>10} {'legacy (s)':>12} {'bulk (s)':>10} {'speedup':>9} {'Restaurant() (s)':>17}")
+        for count in sorted(args.members):
+            # Re-seed from scratch so every size is measured on the same shape of data
+            clear_seeded_data()
+            menu_ids = seed_menu(args.menu_items)
+            seed_members(count, menu_ids)
+            
+            bulk = time_call(bulk_load, args.repeat)
+            startup = time_call(lambda: Restaurant("Benchmark"), args.repeat)
+            if count <= args.legacy_limit:
+                legacy = time_call(legacy_load, args.repeat)
+                print(f"{count:>10} {legacy:>12.3f} {bulk:>10.3f} {legacy / bulk:>8.1f}x {startup:>17.3f}")
+            else:
+                print(f"{count:>10} {'-':>12} {bulk:>10.3f} {'-':>9} {startup:>17.3f}")
+    finally:
+        clear_seeded_data()
+
+if __name__ == '__main__':
+    main()
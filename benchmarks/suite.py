@@ -0,0 +1,124 @@
+"""
+Benchmark suite for the key restaurant operations.
+
+Seeds the database with a synthetic dataset of the requested shape, times
+each operation and prints latency percentiles and throughput. Results are
+saved as JSON named after the current commit so runs can be compared:
+
+    python -m benchmarks.suite --members 5000 --menu-items 200 --orders-per-member 3
+    python -m benchmarks.suite --baseline benchmarks/results/<earlier run>.json
+    python -m benchmarks.suite compare OLD.json NEW.json
+
+Completing orders writes real rows; like every seeded row they are removed
+when the run ends.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+from customer import Member
+from restaurant import Restaurant
+from benchmarks.seed import seed_dataset, clear_seeded_data
+from benchmarks.timing import git_commit, load_results, measure, print_table, save_results, summarize
+
+def build_operations(restaurant: Restaurant, member_ids: List[str], menu_ids: List[int],
+                     rng: random.Random) -> Dict[str, Callable[[], object]]:
+    """One zero-argument callable per operation; each call picks fresh random inputs"""
+    members = [restaurant.get_member(member_id) for member_id in rng.sample(member_ids, min(500, len(member_ids)))]
+    allergic = [member for member in members if member.allergies] or members
+    
+    def complete_order():
+        order = restaurant.create_order(rng.choice(members))
+        for menu_id in rng.sample(menu_ids, rng.randint(1, 3)):
+            order.add_item(restaurant.menu_items[menu_id])
+        restaurant.complete_order(order)
+    
+    return {
+        'Member.load_from_db': lambda: Member.load_from_db(rng.choice(member_ids)),
+        'Order.complete_order': complete_order,
+        'get_personal_recommendations':
+            lambda: restaurant.recommendation_system.get_personal_recommendations(rng.choice(members), 10),
+        'get_recommendations': lambda: restaurant.get_recommendations(rng.choice(members)),
+        'check_menu_item_allergens':
+            lambda: restaurant.check_menu_item_allergens(rng.choice(menu_ids), rng.choice(allergic)),
+        'check_menu_allergens': lambda: restaurant.check_menu_allergens(rng.choice(allergic)),
+    }
+
+def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    config = {
+        'menu_items': args.menu_items,
+        'members': args.members,
+        'orders_per_member': args.orders_per_member,
+        'favorites_per_member': args.favorites_per_member,
+        'allergens_per_item': args.allergens_per_item,
+        'allergy_rate': args.allergy_rate,
+        'max_allergies': args.max_allergies,
+        'iterations': args.iterations,
+        'seed': args.seed,
+    }
+    operations = {}
+    try:
+        started = time.perf_counter()
+        menu_ids, member_ids, _ = seed_dataset(
+            args.menu_items, args.members, orders_per_member=args.orders_per_member,
+            favorites_per_member=args.favorites_per_member, allergens_per_item=args.allergens_per_item,
+            allergy_rate=args.allergy_rate, max_allergies=args.max_allergies, seed=args.seed
+        )
+        print(f"seeded in {time.perf_counter() - started:.1f} s")
+        
+        operations['Restaurant()'] = summarize(measure(lambda: Restaurant("Benchmark"), args.startup_iterations))
+        restaurant = Restaurant("Benchmark")
+        for name, func in build_operations(restaurant, member_ids, menu_ids, rng).items():
+            if args.only and name not in args.only:
+                continue
+            operations[name] = summarize(measure(func, args.iterations, warmup=min(10, args.iterations)))
+    finally:
+        clear_seeded_data()
+    
+    return {
+        'commit': git_commit(),
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'config': config,
+        'operations': operations,
+    }
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(prog='benchmarks.suite compare', description="Compare two saved runs")
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        args = parser.parse_args(argv[1:])
+        baseline, current = load_results(args.baseline), load_results(args.current)
+        print(f"{baseline['commit']} -> {current['commit']}")
+        if baseline['config'] != current['config']:
+            print("warning: the runs used different configurations")
+        print_table(current['operations'], baseline['operations'])
+        return
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--menu-items', type=int, default=200)
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--orders-per-member', type=float, default=3)
+    parser.add_argument('--favorites-per-member', type=int, default=5)
+    parser.add_argument('--allergens-per-item', type=int, default=2, help="each dish gets 0..N allergens")
+    parser.add_argument('--allergy-rate', type=float, default=0.3, help="fraction of members with allergies")
+    parser.add_argument('--max-allergies', type=int, default=2, help="allergic members have 1..N allergies")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--startup-iterations', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help="run only these operations")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmarks/results', help="directory for the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    
+    results = run(args)
+    baseline = load_results(args.baseline)['operations'] if args.baseline else None
+    print_table(results['operations'], baseline)
+    print(f"saved {save_results(results, args.output)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Latency statistics and result files shared by the benchmarks"""
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+def percentiles(samples: List[float]) -> str:
+    """p50/p95/p99 of ``samples`` (seconds) as a one-line summary in milliseconds"""
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return f"p50 {p50:.3f} ms  p95 {p95:.3f} ms  p99 {p99:.3f} ms"
+
+def measure(func: Callable[[], object], iterations: int, warmup: int = 0) -> List[float]:
+    """Wall-clock seconds of each of ``iterations`` calls, after ``warmup`` untimed ones"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles (ms) and single-threaded throughput (ops/s) of ``samples``"""
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max()),
+        'ops_per_s': float(len(samples) / values.sum() * 1000) if values.sum() else float('inf'),
+    }
+
+def git_commit() -> str:
+    """Short hash of the checked-out commit, with ``-dirty`` if the tree has changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+def save_results(results: Dict, directory: str) -> str:
+    """Write a results document to ``directory`` as <commit>-<time>.json and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(directory, f"{results['commit']}-{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return path
+
+def load_results(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def print_table(operations: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    """Print per-operation stats, with the p50/p95 change against ``baseline`` if given"""
+    header = f"{'operation':<28} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>11}"
+    if baseline:
+        header += f" {'p50 vs base':>12} {'p95 vs base':>12}"
+    print(header)
+    for name, stats in operations.items():
+        line = (f"{name:<28} {stats['count']:>6} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                f"{stats['p99_ms']:>10.3f} {stats['ops_per_s']:>11,.1f}")
+        base = (baseline or {}).get(name)
+        if base:
+            for key in ('p50_ms', 'p95_ms'):
+                change = (stats[key] / base[key] - 1) * 100 if base[key] else 0.0
+                line += f" {change:>+11.1f}%"
+        print(line)
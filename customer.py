@@ -1,93 +1,114 @@
-from typing import List, Dict, Optional
-from psycopg2.extras import DictCursor
-from db_utils import get_db_connection
+from collections import Counter
+from typing import List, Dict, Optional, Iterator, Iterable, Tuple
+from db_utils import DictCursor, after_commit, pooled_connection, transaction
+from id_generator import get_id_generator
 from allergic import Allergy
+from allergen_index import allergen_registry
+from order_history import OrderHistory
+from write_behind import get_write_behind, increment_favorites_in_db, increment_points_in_db
 
 class Customer:
+    # Slotted (here and in Member): the member cache holds many of them
+    __slots__ = ('name', 'phone')
+    
     def __init__(self, name: str, phone: str):
         self.name = name
         self.phone = phone
-        self.order_history: List['Order'] = []
+    
+    @property
+    def order_history(self) -> OrderHistory:
+        """Past orders, newest first, read a page at a time as they are used"""
+        # Walk-in orders are stored as NON-MEMBER, not under the customer
+        return OrderHistory(None)
 
 class Member(Customer):
+    __slots__ = ('member_id', 'points', 'favorite_items', '_allergies', 'allergen_mask')
+    
     def __init__(self, name: str, phone: str, member_id: str, points: int = 0):
         super().__init__(name, phone)
         self.member_id = member_id
         self.points = points
         self.favorite_items: Dict[int, int] = {}  # menu_id: order_count
-        self.allergies: List[Allergy] = []  # List of allergies
+        self.allergies = ()  # Allergy objects
+    
+    @property
+    def order_history(self) -> OrderHistory:
+        return OrderHistory(self.member_id)
+    
+    @property
+    def allergies(self) -> Tuple[Allergy, ...]:
+        return self._allergies
+    
+    @allergies.setter
+    def allergies(self, allergies: Iterable[Allergy]):
+        # A tuple rather than a list: most members have none, and every empty tuple is the same object
+        self._allergies = tuple(allergies)
+        self._refresh_allergen_mask()
+    
+    def _refresh_allergen_mask(self):
+        """Recompute the allergen bitmask from the allergies"""
+        self.allergen_mask = allergen_registry.mask(allergy.allergen for allergy in self._allergies)
+    
+    def allergy_conflicts(self, item: 'MenuItem') -> List[Allergy]:
+        """Allergies of this member triggered by a menu item, via one bitmask AND"""
+        conflict = self.allergen_mask & item.allergen_mask
+        if not conflict:
+            return []
+        return [allergy for allergy in self._allergies if allergen_registry.bit(allergy.allergen) & conflict]
     
     def add_points(self, points: int):
         self.points += points
-        self._save_to_db()
+        self._increment_points_in_db(points)
     
     def use_points(self, points: int) -> bool:
         if self.points >= points:
             self.points -= points
-            self._save_to_db()
+            self._increment_points_in_db(-points)
             return True
         return False
     
     def update_favorites(self, menu_item_id: int):
-        if menu_item_id in self.favorite_items:
-            self.favorite_items[menu_item_id] += 1
-        else:
-            self.favorite_items[menu_item_id] = 1
-        self._update_favorite_in_db(menu_item_id, self.favorite_items[menu_item_id])
+        self.update_favorites_many([menu_item_id])
+    
+    def update_favorites_many(self, menu_item_ids: Iterable[int]):
+        """Count one order of each given item (repeats included) with a single statement"""
+        deltas = Counter(menu_item_ids)
+        if not deltas:
+            return
+        for menu_item_id, delta in deltas.items():
+            self.favorite_items[menu_item_id] = self.favorite_items.get(menu_item_id, 0) + delta
+        self._increment_favorites_in_db(deltas)
     
     def add_allergy(self, allergen: str, severity: str = "Moderate") -> Allergy:
         """Add an allergy for the member"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get next allergy ID
-        cursor.execute("SELECT MAX(allergy_id) FROM member_allergies")
-        result = cursor.fetchone()
-        next_id = 1 if result[0] is None else result[0] + 1
-        
         # Create and save new allergy
-        allergy = Allergy(next_id, self.member_id, allergen, severity)
+        allergy = Allergy(get_id_generator('allergy').next_id(), self.member_id, allergen, severity)
         allergy.save_to_db()
         
-        conn.close()
-        
-        # Add to member's allergies list
-        self.allergies.append(allergy)
+        # Add to member's allergies
+        self.allergies = (*self.allergies, allergy)
         return allergy
     
     def remove_allergy(self, allergy_id: int) -> bool:
         """Remove an allergy for the member"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "DELETE FROM member_allergies WHERE allergy_id = %s AND member_id = %s",
-            (allergy_id, self.member_id)
-        )
-        
-        rows_deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "DELETE FROM member_allergies WHERE allergy_id = %s AND member_id = %s",
+                (allergy_id, self.member_id)
+            )
+            
+            rows_deleted = cursor.rowcount
+            cursor.close()
         
         # Remove from member's allergies list if found
         self.allergies = [a for a in self.allergies if a.allergy_id != allergy_id]
         
         return rows_deleted > 0
     
-    def get_allergies(self) -> List[Allergy]:
+    def get_allergies(self) -> Tuple[Allergy, ...]:
         """Get all allergies for the member"""
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        
-        cursor.execute(
-            "SELECT * FROM member_allergies WHERE member_id = %s",
-            (self.member_id,)
-        )
-        allergy_data = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
         # Update member's allergies list
         self.allergies = [
             Allergy(
@@ -96,93 +117,171 @@ class Member(Customer):
                 allergen=data['allergen'],
                 severity=data['severity']
             )
-            for data in allergy_data
+            for data in self._fetch_allergies(self.member_id)
         ]
         
         return self.allergies
     
-    def _save_to_db(self):
-        """Update member data in the database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE members SET points = %s WHERE member_id = %s",
-            (self.points, self.member_id)
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-    
-    def _update_favorite_in_db(self, menu_item_id: int, count: int):
-        """Update favorite item in the database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO favorite_items (member_id, menu_item_id, count) VALUES (%s, %s, %s) "
-            "ON CONFLICT (member_id, menu_item_id) DO UPDATE SET count = %s",
-            (self.member_id, menu_item_id, count, count)
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+    def _increment_points_in_db(self, delta: int):
+        """Add a point change to the stored balance, now or through the write-behind queue"""
+        queue = get_write_behind()
+        if queue is None:
+            increment_points_in_db({self.member_id: delta})
+        else:
+            after_commit(lambda: queue.add_points(self.member_id, delta))
+    
+    def _increment_favorites_in_db(self, deltas: Dict[int, int]):
+        """Add per-item order counts to favorite_items, now or through the write-behind queue"""
+        queue = get_write_behind()
+        if queue is None:
+            increment_favorites_in_db({(self.member_id, menu_item_id): delta for menu_item_id, delta in deltas.items()})
+        else:
+            after_commit(lambda: queue.add_favorites(self.member_id, deltas))
     
     @classmethod
     def load_from_db(cls, member_id: str) -> Optional['Member']:
         """Load a member from the database"""
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        
-        # Get member info
-        cursor.execute(
-            "SELECT * FROM members WHERE member_id = %s",
-            (member_id,)
-        )
-        member_data = cursor.fetchone()
-        
-        if not member_data:
+        # The three reads share one connection here; AsyncRepository runs them concurrently
+        with transaction():
+            profile = cls._fetch_profile(member_id)
+            if not profile:
+                return None
+            return cls._from_rows(profile, cls._fetch_favorites(member_id), cls._fetch_allergies(member_id))
+    
+    @staticmethod
+    def _fetch_profile(member_id: str):
+        """The member's row, or None"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor.execute(
+                "SELECT * FROM members WHERE member_id = %s",
+                (member_id,)
+            )
+            member_data = cursor.fetchone()
             cursor.close()
-            conn.close()
-            return None
-        
+        return member_data
+    
+    @staticmethod
+    def _fetch_favorites(member_id: str):
+        """The member's (menu_item_id, count) rows"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor.execute(
+                "SELECT menu_item_id, count FROM favorite_items WHERE member_id = %s",
+                (member_id,)
+            )
+            favorite_items = cursor.fetchall()
+            cursor.close()
+        return favorite_items
+    
+    @staticmethod
+    def _fetch_allergies(member_id: str):
+        """The member's member_allergies rows"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor.execute(
+                "SELECT * FROM member_allergies WHERE member_id = %s",
+                (member_id,)
+            )
+            allergy_data = cursor.fetchall()
+            cursor.close()
+        return allergy_data
+    
+    @classmethod
+    def _from_rows(cls, member_data, favorite_items, allergy_data) -> 'Member':
+        """Build a member from its profile, favorites and allergy rows"""
         member = cls(
             member_data['name'],
             member_data['phone'],
             member_data['member_id'],
             member_data['points']
         )
-        
-        # Get favorite items
-        cursor.execute(
-            "SELECT menu_item_id, count FROM favorite_items WHERE member_id = %s",
-            (member_id,)
-        )
-        favorite_items = cursor.fetchall()
-        
         for item in favorite_items:
             member.favorite_items[item['menu_item_id']] = item['count']
+        member.allergies = [
+            Allergy(
+                allergy_id=data['allergy_id'],
+                member_id=data['member_id'],
+                allergen=data['allergen'],
+                severity=data['severity']
+            )
+            for data in allergy_data
+        ]
+        return member
+    
+    @classmethod
+    def load_all_from_db(cls, batch_size: int = 2000) -> Iterator['Member']:
+        """
+        Stream every member with favorites and allergies using three set-based queries.
         
-        # Get member allergies
-        cursor.execute(
-            "SELECT * FROM member_allergies WHERE member_id = %s",
-            (member_id,)
-        )
-        allergy_data = cursor.fetchall()
-        
-        for data in allergy_data:
-            member.allergies.append(
-                Allergy(
-                    allergy_id=data['allergy_id'],
+        Members, favorites and allergies are read through server-side cursors sorted
+        by member_id and merged as they arrive, so memory stays bounded by
+        ``batch_size`` rows per cursor no matter how many members exist.
+        """
+        with pooled_connection() as conn:
+            member_cursor = conn.cursor(name='members_stream', cursor_factory=DictCursor)
+            favorite_cursor = conn.cursor(name='favorites_stream', cursor_factory=DictCursor)
+            allergy_cursor = conn.cursor(name='allergies_stream', cursor_factory=DictCursor)
+            for cursor in (member_cursor, favorite_cursor, allergy_cursor):
+                cursor.itersize = batch_size
+            
+            member_cursor.execute("SELECT * FROM members ORDER BY member_id")
+            favorite_cursor.execute(
+                "SELECT member_id, menu_item_id, count FROM favorite_items ORDER BY member_id"
+            )
+            allergy_cursor.execute(
+                "SELECT * FROM member_allergies WHERE member_id IS NOT NULL ORDER BY member_id"
+            )
+            
+            # Every favorite/allergy row references an existing member and all three
+            # streams share one sort order, so each child stream only ever needs to be
+            # advanced while its head belongs to the current member.
+            favorites = iter(favorite_cursor)
+            allergies = iter(allergy_cursor)
+            next_favorite = next(favorites, None)
+            next_allergy = next(allergies, None)
+            
+            for data in member_cursor:
+                member = cls(
+                    name=data['name'],
+                    phone=data['phone'],
                     member_id=data['member_id'],
-                    allergen=data['allergen'],
-                    severity=data['severity']
+                    points=data['points']
                 )
-            )
-        
-        cursor.close()
-        conn.close()
-        
-        return member
\ No newline at end of file
+                
+                while next_favorite is not None and next_favorite['member_id'] == member.member_id:
+                    member.favorite_items[next_favorite['menu_item_id']] = next_favorite['count']
+                    next_favorite = next(favorites, None)
+                
+                member_allergies = []
+                while next_allergy is not None and next_allergy['member_id'] == member.member_id:
+                    member_allergies.append(
+                        Allergy(
+                            allergy_id=next_allergy['allergy_id'],
+                            member_id=next_allergy['member_id'],
+                            allergen=next_allergy['allergen'],
+                            severity=next_allergy['severity']
+                        )
+                    )
+                    next_allergy = next(allergies, None)
+                if member_allergies:
+                    member.allergies = member_allergies
+                
+                yield member
+            
+            member_cursor.close()
+            favorite_cursor.close()
+            allergy_cursor.close()
+    
+    @staticmethod
+    def load_favorite_counts_from_db(batch_size: int = 10000) -> Iterator[Tuple[str, int, int]]:
+        """Stream (member_id, menu_item_id, count) for every member's favorite items"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor(name='favorite_counts_stream')
+            cursor.itersize = batch_size
+            
+            cursor.execute("SELECT member_id, menu_item_id, count FROM favorite_items")
+            for member_id, menu_item_id, count in cursor:
+                yield member_id, menu_item_id, count
+            
+            cursor.close()
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+Streaming export and import of members and orders.
+
+Exports read through server-side cursors and write one record at a time, so
+memory stays flat however many rows there are. Imports read the file lazily
+and load it in batches of ``batch_size`` records, one transaction per batch,
+through db_utils.bulk_upsert (COPY into a staging table on PostgreSQL).
+
+Files are CSV or JSON Lines, chosen by extension (``.csv``, ``.jsonl``), and
+gzip-compressed when the name ends in ``.gz``. Nested fields (a member's
+favorites and allergies, an order's items) are JSON-encoded CSV cells.
+
+    python data_transfer.py export members members.jsonl.gz
+    python data_transfer.py export orders orders.csv --since 2024-01-01
+    python data_transfer.py import members members.jsonl.gz --batch-size 5000
+
+Imports are upserts that never delete. Members, favorite counts and allergy
+severities take the file's values; allergies are matched to the member's
+stored ones by allergen, and new ones get ids from this database. Orders and
+their items that already exist are skipped. Newly imported completed orders
+are added to the dish popularity counts and the sales summary.
+"""
+import argparse
+import csv
+import gzip
+import json
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+from customer import Member
+from db_utils import DictCursor, advance_sequence, bulk_upsert, next_sequence_values, pooled_connection, transaction
+from menu_item import MenuItem
+from popularity import dish_counts, increment_dish_counts_in_db, meal_time_for
+import analytics
+
+MEMBER_FIELDS = ['member_id', 'name', 'phone', 'points', 'favorites', 'allergies']
+ORDER_FIELDS = ['order_id', 'customer_id', 'total_amount', 'status', 'timestamp', 'items']
+NESTED_FIELDS = {'favorites', 'allergies', 'items'}
+
+# Member ids the member id generator hands out, e.g. M0042
+MEMBER_ID_PATTERN = re.compile(r'^M(\d+)$')
+
+def _open(path: str, mode: str) -> TextIO:
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+def _format(path: str, format: Optional[str]) -> str:
+    if format:
+        return format
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.json')) else 'csv'
+
+def _batches(records: Iterable, size: int) -> Iterator[List]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+def write_records(records: Iterable[Dict], path: str, fields: List[str], format: Optional[str] = None) -> int:
+    """Write records to a CSV or JSONL file as they are produced; returns how many were written"""
+    count = 0
+    with _open(path, 'w') as f:
+        if _format(path, format) == 'jsonl':
+            for record in records:
+                f.write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+                count += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for record in records:
+                writer.writerow({
+                    field: json.dumps(value, default=str, ensure_ascii=False) if field in NESTED_FIELDS else value
+                    for field, value in record.items()
+                })
+                count += 1
+    return count
+
+def read_records(path: str, format: Optional[str] = None) -> Iterator[Dict]:
+    """Records of a CSV or JSONL file, read one line at a time"""
+    with _open(path, 'r') as f:
+        if _format(path, format) == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield {
+                    field: json.loads(value) if field in NESTED_FIELDS and value else value
+                    for field, value in row.items()
+                }
+
+# Export
+
+def member_records(batch_size: int = 2000) -> Iterator[Dict]:
+    """Every member with favorites and allergies, streamed in member_id order"""
+    for member in Member.load_all_from_db(batch_size=batch_size):
+        yield {
+            'member_id': member.member_id,
+            'name': member.name,
+            'phone': member.phone,
+            'points': member.points,
+            'favorites': {str(menu_item_id): count for menu_item_id, count in member.favorite_items.items()},
+            'allergies': [
+                {'allergy_id': allergy.allergy_id, 'allergen': allergy.allergen, 'severity': allergy.severity}
+                for allergy in member.allergies
+            ],
+        }
+
+def order_records(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  batch_size: int = 2000) -> Iterator[Dict]:
+    """Orders placed in [since, until) with their item ids, streamed in order_id order"""
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("o.timestamp >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("o.timestamp < %s")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor(name='orders_export', cursor_factory=DictCursor)
+        cursor.itersize = batch_size
+        
+        # One row per (order, item); consecutive rows of the same order are merged
+        cursor.execute(
+            "SELECT o.order_id, o.customer_id, o.total_amount, o.status, o.timestamp, oi.menu_item_id "
+            "FROM orders o LEFT JOIN order_items oi ON oi.order_id = o.order_id "
+            + where + "ORDER BY o.order_id",
+            params
+        )
+        
+        record = None
+        for row in cursor:
+            if record is None or record['order_id'] != row['order_id']:
+                if record is not None:
+                    yield record
+                record = {
+                    'order_id': row['order_id'],
+                    'customer_id': row['customer_id'],
+                    'total_amount': row['total_amount'],
+                    'status': row['status'],
+                    'timestamp': row['timestamp'],
+                    'items': [],
+                }
+            if row['menu_item_id'] is not None:
+                record['items'].append(row['menu_item_id'])
+        if record is not None:
+            yield record
+        
+        cursor.close()
+
+def export_members(path: str, format: Optional[str] = None, batch_size: int = 2000) -> int:
+    return write_records(member_records(batch_size), path, MEMBER_FIELDS, format)
+
+def export_orders(path: str, format: Optional[str] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, batch_size: int = 2000) -> int:
+    return write_records(order_records(since, until, batch_size), path, ORDER_FIELDS, format)
+
+# Import
+
+def import_members(records: Iterable[Dict], batch_size: int = 5000) -> int:
+    """Upsert members with their favorite counts and allergies; returns the number of members"""
+    count = 0
+    for batch in _batches(records, batch_size):
+        # The last record for a member wins, as a second upsert of it would
+        members = {record['member_id']: record for record in batch}
+        favorites = [
+            (member_id, int(menu_item_id), int(favorite_count))
+            for member_id, record in members.items()
+            for menu_item_id, favorite_count in (record.get('favorites') or {}).items()
+        ]
+        allergies = {
+            (member_id, allergy['allergen']): allergy.get('severity') or 'Moderate'
+            for member_id, record in members.items()
+            for allergy in record.get('allergies') or []
+        }
+        
+        with transaction() as conn:
+            cursor = conn.cursor()
+            
+            bulk_upsert(
+                cursor, 'members', ['member_id', 'name', 'phone', 'points'],
+                [(member_id, record['name'], record['phone'], int(record.get('points') or 0))
+                 for member_id, record in members.items()],
+                key=['member_id'], update=['name', 'phone', 'points']
+            )
+            if favorites:
+                bulk_upsert(cursor, 'favorite_items', ['member_id', 'menu_item_id', 'count'], favorites,
+                            key=['member_id', 'menu_item_id'], update=['count'])
+            if allergies:
+                # Allergy ids are local to each database, so the file's ids are not used:
+                # an allergy updates the member's stored one for the same allergen or gets
+                # a fresh id, and can never take over a row of another member
+                cursor.execute(
+                    "SELECT member_id, allergen, allergy_id FROM member_allergies WHERE member_id IN %s",
+                    (tuple({member_id for member_id, _ in allergies}),)
+                )
+                allergy_ids = {(member_id, allergen): allergy_id for member_id, allergen, allergy_id in cursor.fetchall()}
+                new = [key for key in allergies if key not in allergy_ids]
+                if new:
+                    allergy_ids.update(zip(new, next_sequence_values(cursor, 'allergy_id_seq', len(new))))
+                bulk_upsert(cursor, 'member_allergies', ['allergy_id', 'member_id', 'allergen', 'severity'],
+                            [(allergy_ids[key], *key, severity) for key, severity in allergies.items()],
+                            key=['allergy_id'], update=['severity'])
+            
+            # Keep generated member ids clear of the imported ones
+            numbers = [int(match.group(1)) for match in map(MEMBER_ID_PATTERN.match, members) if match]
+            if numbers:
+                advance_sequence(cursor, 'member_id_seq', max(numbers))
+            
+            cursor.close()
+        count += len(members)
+    return count
+
+def import_orders(records: Iterable[Dict], batch_size: int = 5000) -> int:
+    """Insert orders and their items that do not exist yet; returns the number of new orders"""
+    count = 0
+    for batch in _batches(records, batch_size):
+        orders = {}
+        for record in batch:
+            timestamp = record['timestamp']
+            orders[record['order_id']] = {
+                **record,
+                'total_amount': Decimal(str(record['total_amount'])),
+                'timestamp': timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp),
+                # order_items has one row per (order, dish)
+                'items': list(dict.fromkeys(int(menu_item_id) for menu_item_id in record.get('items') or [])),
+            }
+        
+        with transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT order_id FROM orders WHERE order_id IN %s", (tuple(orders),))
+            existing = {row[0] for row in cursor.fetchall()}
+            new_orders = [order for order_id, order in orders.items() if order_id not in existing]
+            if not new_orders:
+                cursor.close()
+                continue
+            
+            # Written now, however old, so the next sales summary refresh picks their hours up
+            written_at = datetime.now()
+            bulk_upsert(
+                cursor, 'orders', ['order_id', 'customer_id', 'total_amount', 'status', 'timestamp', 'completed_at'],
+                [(order['order_id'], order['customer_id'], order['total_amount'], order['status'], order['timestamp'],
+                  written_at)
+                 for order in new_orders],
+                key=['order_id']
+            )
+            order_items = [(order['order_id'], menu_item_id) for order in new_orders for menu_item_id in order['items']]
+            if order_items:
+                bulk_upsert(cursor, 'order_items', ['order_id', 'menu_item_id'], order_items,
+                            key=['order_id', 'menu_item_id'])
+            
+            completed = [order for order in new_orders if order['status'] == 'Completed']
+            menu_items = MenuItem.load_many_from_db({menu_item_id for order in completed for menu_item_id in order['items']})
+            counts = Counter()
+            for order in completed:
+                items = [menu_items[menu_item_id] for menu_item_id in order['items'] if menu_item_id in menu_items]
+                counts.update(dish_counts(items, meal_time_for(order['timestamp'])))
+            increment_dish_counts_in_db(counts)
+            
+            cursor.close()
+        
+        count += len(new_orders)
+    
+    if count:
+        analytics.refresh_sales_summary()
+    return count
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream members and orders to or from CSV / JSONL files")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    for command in ('export', 'import'):
+        subcommand = subcommands.add_parser(command)
+        subcommand.add_argument('entity', choices=['members', 'orders'])
+        subcommand.add_argument('path', help="file name ending in .csv or .jsonl, optionally .gz")
+        subcommand.add_argument('--format', choices=['csv', 'jsonl'], help="override the format implied by the name")
+        subcommand.add_argument('--batch-size', type=int, default=2000 if command == 'export' else 5000)
+        if command == 'export':
+            subcommand.add_argument('--since', type=datetime.fromisoformat, help="orders placed at or after this time")
+            subcommand.add_argument('--until', type=datetime.fromisoformat, help="orders placed before this time")
+    args = parser.parse_args(argv)
+    
+    started = time.perf_counter()
+    if args.command == 'export' and args.entity == 'members':
+        count = export_members(args.path, args.format, args.batch_size)
+    elif args.command == 'export':
+        count = export_orders(args.path, args.format, args.since, args.until, args.batch_size)
+    elif args.entity == 'members':
+        count = import_members(read_records(args.path, args.format), args.batch_size)
+    else:
+        count = import_orders(read_records(args.path, args.format), args.batch_size)
+    print(f"{args.command}ed {count} {args.entity} in {time.perf_counter() - started:.1f} s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
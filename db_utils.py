@@ -1,94 +1,353 @@
 import os
-import psycopg2
-from psycopg2.extras import DictCursor
-
-def get_db_connection():
-    """Create a connection to the PostgreSQL database"""
-    conn = psycopg2.connect(
-        host=os.environ.get('DB_HOST', 'postgres'),
-        database=os.environ.get('DB_NAME', 'restaurant'),
-        user=os.environ.get('DB_USER', 'postgres'),
-        password=os.environ.get('DB_PASSWORD', 'postgres')
-    )
-    return conn
+import time
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+from storage import TRANSACTION_STATUS_IDLE, StorageBackend, get_backend, psycopg2_extras
+import instrumentation
 
-def initialize_database():
-    """Create database tables if they don't exist"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Row factory for cursors whose rows are read by column name; SQLite rows always are
+DictCursor = psycopg2_extras.DictCursor if psycopg2_extras else None
+
+def get_db_connection(**kwargs):
+    """Create a connection through the configured storage backend (see storage.py), instrumented"""
+    return instrumentation.instrument_connection(get_backend().connect(**kwargs))
+
+def execute_values(cursor, sql: str, rows: Sequence[Sequence], page_size: int = 100):
+    """Run ``sql`` with its ``VALUES %s`` expanded to many rows, as psycopg2.extras.execute_values"""
+    get_backend().execute_values(cursor, sql, rows, page_size=page_size)
+
+def next_sequence_values(cursor, sequence: str, count: int = 1) -> List[int]:
+    """Reserve ``count`` values from a named id sequence"""
+    return get_backend().next_sequence_values(cursor, sequence, count)
+
+def advance_sequence(cursor, sequence: str, value: int):
+    """Move a named id sequence past ``value``, e.g. after importing rows with their own ids"""
+    get_backend().advance_sequence(cursor, sequence, value)
+
+def create_sequence(cursor, sequence: str):
+    """Create a named id sequence starting at 1, unless it already exists"""
+    get_backend().create_sequence(cursor, sequence)
+
+def drop_sequence(cursor, sequence: str):
+    """Drop a named id sequence, if it exists"""
+    get_backend().drop_sequence(cursor, sequence)
+
+def bulk_upsert(cursor, table: str, columns: Sequence[str], rows: Sequence[Sequence],
+                key: Sequence[str], update: Sequence[str] = ()):
+    """Load many rows at once (COPY where the backend has it), updating ``update`` columns on key conflicts"""
+    get_backend().bulk_upsert(cursor, table, columns, rows, key, update)
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes available in time"""
+
+class _PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs for recycling"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections.
+    
+    Connections are handed out most-recently-used first so that a quiet pool
+    keeps a few warm connections and lets the rest age out. Idle connections
+    older than ``max_idle`` seconds (or alive longer than ``max_lifetime``) are
+    closed on the next checkout/return, and a connection that has been idle
+    longer than ``health_check_interval`` is pinged before it is handed out.
+    """
+    def __init__(self, min_size: int = 1, max_size: int = 10, max_idle: float = 300,
+                 max_lifetime: float = 3600, health_check_interval: float = 30,
+                 checkout_timeout: float = 10, connect: Callable = get_db_connection):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self._connect = connect
+        self._idle: Deque[_PooledConnection] = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0  # open connections, idle + in use + being created
+        self._closed = False
+        self._lock = threading.Condition(threading.Lock())
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_waits': 0,
+            'checkout_timeouts': 0,
+            'total_wait_time': 0.0,
+            'health_check_failures': 0,
+            'recycled': 0,
+        }
+    
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds for one"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        
+        while True:
+            entry = None
+            stale = []
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    stale.extend(self._prune_idle_locked())
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1  # reserve a slot, connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['checkout_timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+            
+            self._close_entries(stale)
+            
+            if entry is None:
+                try:
+                    entry = _PooledConnection(self._connect())
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._stats['connections_created'] += 1
+            elif not self._is_healthy(entry):
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                self._discard(entry)
+                continue
+            
+            with self._lock:
+                self._in_use[id(entry.conn)] = entry
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['checkout_waits'] += 1
+                    self._stats['total_wait_time'] += time.monotonic() - started
+            return entry.conn
     
-    # Create menu_items table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS menu_items (
-        id INTEGER PRIMARY KEY,
-        name VARCHAR(100) NOT NULL,
-        price NUMERIC(10, 2) NOT NULL,
-        category VARCHAR(50) NOT NULL
-    )
-    ''')
+    def putconn(self, conn):
+        """Return a connection to the pool, discarding it if it is broken or expired"""
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Connection does not belong to this pool")
+        
+        if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            # Never hand the next caller a half-finished transaction
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        
+        now = time.monotonic()
+        if conn.closed or self._closed or now - entry.created_at > self.max_lifetime:
+            self._discard(entry, recycled=not conn.closed)
+            return
+        
+        entry.last_used = now
+        with self._lock:
+            self._idle.append(entry)
+            stale = self._prune_idle_locked()
+            self._lock.notify()
+        self._close_entries(stale)
     
-    # Create members table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS members (
-        member_id VARCHAR(50) PRIMARY KEY,
-        name VARCHAR(100) NOT NULL,
-        phone VARCHAR(20) NOT NULL,
-        points INTEGER DEFAULT 0
-    )
-    ''')
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            for _ in idle:
+                self._release_slot_locked()
+            self._lock.notify_all()
+        self._close_entries(idle)
     
-    # Create favorite_items table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS favorite_items (
-        member_id VARCHAR(50) REFERENCES members(member_id),
-        menu_item_id INTEGER REFERENCES menu_items(id),
-        count INTEGER DEFAULT 0,
-        PRIMARY KEY (member_id, menu_item_id)
-    )
-    ''')
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of pool counters for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size,
+            })
+        return stats
     
-    # Create orders table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS orders (
-        order_id VARCHAR(50) PRIMARY KEY,
-        customer_id VARCHAR(50),
-        total_amount NUMERIC(10, 2) NOT NULL,
-        status VARCHAR(20) NOT NULL,
-        timestamp TIMESTAMP NOT NULL
-    )
-    ''')
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        """Cheap liveness check, only pinging connections that sat idle for a while"""
+        if entry.conn.closed:
+            return False
+        now = time.monotonic()
+        if now - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            cursor = entry.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            entry.conn.rollback()
+        except Exception:
+            return False
+        entry.last_checked = now
+        return True
     
-    # Create order_items table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS order_items (
-        order_id VARCHAR(50) REFERENCES orders(order_id),
-        menu_item_id INTEGER REFERENCES menu_items(id),
-        PRIMARY KEY (order_id, menu_item_id)
-    )
-    ''')
+    def _prune_idle_locked(self):
+        """Pop idle connections past their idle/lifetime limits, keeping min_size open"""
+        now = time.monotonic()
+        stale = []
+        # Oldest idle connections sit at the left end of the deque
+        while self._idle and self._size > self.min_size:
+            entry = self._idle[0]
+            if now - entry.last_used <= self.max_idle and now - entry.created_at <= self.max_lifetime:
+                break
+            stale.append(self._idle.popleft())
+            self._release_slot_locked(recycled=True)
+        return stale
     
-    # Create member_allergies table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS member_allergies (
-        allergy_id INTEGER PRIMARY KEY,
-        member_id VARCHAR(50) REFERENCES members(member_id),
-        allergen VARCHAR(100) NOT NULL,
-        severity VARCHAR(20) NOT NULL
-    )
-    ''')
+    def _release_slot_locked(self, recycled: bool = False):
+        self._size -= 1
+        self._stats['connections_closed'] += 1
+        if recycled:
+            self._stats['recycled'] += 1
+        self._lock.notify()
     
-    # Create menu_allergens table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS menu_allergens (
-        menu_item_id INTEGER REFERENCES menu_items(id),
-        allergen VARCHAR(100) NOT NULL,
-        PRIMARY KEY (menu_item_id, allergen)
-    )
-    ''')
+    def _close_entries(self, entries):
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
     
-    conn.commit()
-    cursor.close()
-    conn.close()
+    def _discard(self, entry: _PooledConnection, recycled: bool = False):
+        with self._lock:
+            self._release_slot_locked(recycled)
+        self._close_entries([entry])
 
-# Initialize the database when module is imported
-initialize_database()
\ No newline at end of file
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_backend: Optional[StorageBackend] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool, _pool_pid, _pool_backend
+    if _pool is None or _pool_pid != os.getpid() or _pool_backend is not get_backend():
+        backend = get_backend()
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid() or _pool_backend is not backend:
+                # A forked child must not share the parent's sockets; the inherited
+                # pool is abandoned (not closed, which would end the parent's sessions)
+                previous = _pool if _pool_pid == os.getpid() else None
+                if backend.auto_migrate:
+                    initialize_database()
+                _pool = ConnectionPool(connect=get_db_connection, **backend.pool_options())
+                _pool_pid, _pool_backend = os.getpid(), backend
+                atexit.register(_pool.close)
+                if previous is not None:
+                    previous.close()
+    return _pool
+
+def set_pool(pool: ConnectionPool):
+    """Replace the process-wide pool, e.g. with one using a different connect function"""
+    global _pool, _pool_pid, _pool_backend
+    with _pool_lock:
+        previous = _pool if _pool_pid == os.getpid() else None
+        _pool, _pool_pid, _pool_backend = pool, os.getpid(), get_backend()
+    if previous is not None:
+        previous.close()
+
+def pool_stats() -> Dict[str, float]:
+    """Counters of the shared connection pool, for monitoring"""
+    return get_pool().stats()
+
+# Connection of the transaction() currently open in each thread, if any
+_local = threading.local()
+
+@contextmanager
+def pooled_connection():
+    """
+    Check out a connection from the shared pool.
+    
+    The transaction is committed when the block exits normally and rolled back
+    if it raises; either way the connection goes back to the pool. Inside a
+    transaction() block the enclosing connection is reused instead, and
+    committing is left to the transaction.
+    """
+    active = getattr(_local, 'conn', None)
+    if active is not None:
+        yield active
+        return
+    
+    pool = get_pool()
+    conn = pool.getconn()
+    instrumentation.record_checkout()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        pool.putconn(conn)
+
+@contextmanager
+def transaction():
+    """
+    Unit of work spanning several model calls.
+    
+    Every pooled_connection() block entered in this thread while the
+    transaction is open shares its connection, so the whole unit commits once
+    at the end or rolls back as a whole. Nested transaction() blocks join the
+    outermost one. Callbacks registered with after_commit() run once it has
+    committed.
+    """
+    if getattr(_local, 'conn', None) is not None:
+        yield _local.conn
+        return
+    
+    callbacks: List[Callable[[], None]] = []
+    with pooled_connection() as conn:
+        _local.conn, _local.after_commit = conn, callbacks
+        try:
+            yield conn
+        finally:
+            _local.conn = _local.after_commit = None
+    for callback in callbacks:
+        callback()
+
+def after_commit(callback: Callable[[], None]):
+    """Run ``callback`` when this thread's transaction() commits (never, if it rolls back), or now outside one"""
+    if getattr(_local, 'conn', None) is None:
+        callback()
+    else:
+        _local.after_commit.append(callback)
+
+def initialize_database():
+    """Bring the schema up to date by applying pending migrations (see migrations.py)"""
+    from migrations import apply_migrations
+    apply_migrations()
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Pluggable primary-key generators.
+
+Models ask for ids by name (``get_id_generator('order').next_id()``) rather
+than deriving them from the data, so no id costs a table scan or races
+another terminal. Defaults are registered lazily and can be replaced with
+set_id_generator, e.g. in tests or on a deployment with its own scheme.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from db_utils import next_sequence_values, pooled_connection
+
+class IdGenerator:
+    """Source of unique ids; implementations must be safe to call from many threads"""
+    def next_id(self):
+        raise NotImplementedError
+
+class SequenceIdGenerator(IdGenerator):
+    """
+    Ids drawn from a database sequence.
+    
+    ``block_size`` values are reserved per round trip, so with a block size
+    above 1 most calls are served from memory. Values reserved by a process
+    that exits are skipped, never reused, so ids are unique but may have gaps.
+    """
+    def __init__(self, sequence: str, block_size: int = 1, formatter: Optional[Callable[[int], object]] = None):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.sequence = sequence
+        self.block_size = block_size
+        self.formatter = formatter
+        self._reserved: Deque[int] = deque()
+        self._lock = threading.Lock()
+    
+    def next_id(self):
+        with self._lock:
+            if not self._reserved:
+                self._reserved.extend(self._reserve_block())
+            value = self._reserved.popleft()
+        return self.formatter(value) if self.formatter else value
+    
+    def _reserve_block(self):
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            values = next_sequence_values(cursor, self.sequence, self.block_size)
+            cursor.close()
+        return values
+
+class KSortableIdGenerator(IdGenerator):
+    """
+    Time-ordered ids generated locally, in the style of ULIDs.
+    
+    Each id is a 48-bit millisecond timestamp followed by 80 random bits,
+    written as 26 Crockford base32 characters, so ids sort by creation time
+    and need no coordination between terminals. Within one process ids are
+    strictly increasing: in the same millisecond (or if the clock steps
+    back) the random part of the previous id is incremented instead.
+    """
+    ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+    RANDOM_BITS = 80
+    
+    def __init__(self):
+        self._last_time = -1
+        self._last_random = 0
+        self._lock = threading.Lock()
+    
+    def next_id(self) -> str:
+        now = time.time_ns() // 1_000_000
+        with self._lock:
+            if now <= self._last_time:
+                now = self._last_time
+                random_part = self._last_random + 1
+                if random_part >> self.RANDOM_BITS:
+                    # Random space for this millisecond exhausted: borrow the next one
+                    now += 1
+                    random_part = int.from_bytes(os.urandom(10), 'big')
+            else:
+                random_part = int.from_bytes(os.urandom(10), 'big')
+            self._last_time = now
+            self._last_random = random_part
+        return self._encode((now << self.RANDOM_BITS) | random_part)
+    
+    @classmethod
+    def _encode(cls, value: int) -> str:
+        chars = []
+        for _ in range(26):
+            chars.append(cls.ALPHABET[value & 31])
+            value >>= 5
+        return ''.join(reversed(chars))
+
+_generators: Dict[str, IdGenerator] = {}
+_generators_lock = threading.Lock()
+
+def _default_generator(name: str) -> IdGenerator:
+    if name == 'order':
+        return KSortableIdGenerator()
+    if name == 'member':
+        return SequenceIdGenerator('member_id_seq', formatter=lambda value: f"M{value:04d}")
+    if name == 'allergy':
+        return SequenceIdGenerator('allergy_id_seq')
+    raise KeyError(f"No id generator registered for '{name}'")
+
+def get_id_generator(name: str) -> IdGenerator:
+    """The generator registered for an entity ('order', 'member', 'allergy', ...)"""
+    generator = _generators.get(name)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(name)
+            if generator is None:
+                generator = _generators[name] = _default_generator(name)
+    return generator
+
+def set_id_generator(name: str, generator: IdGenerator):
+    """Register (or replace) the generator used for an entity"""
+    with _generators_lock:
+        _generators[name] = generator
@@ -0,0 +1,340 @@
+"""
+Query-level instrumentation for the database layer.
+
+Connections made by db_utils.get_db_connection are wrapped so that, while
+recording is enabled, every statement is logged as a QueryEvent: a
+fingerprint of its SQL (literals and placeholders replaced by ``?``), time
+spent executing it and fetching its rows, the row count and the model method
+that ran it. Events go to a bounded log of recent queries and to the trace of
+the calling thread, if one was started; a Streamlit rerun is traced with
+
+    start_trace("rerun")
+    ...
+    trace = stop_trace()
+
+Queries an AsyncRepository runs on its worker threads are logged but not
+attributed to the caller's trace. When recording is off the wrappers only
+forward calls.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, List, Optional
+import numpy as np
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches the rest
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf')]
+
+# Frames from these modules are skipped when looking for the code that ran a query
+_INFRASTRUCTURE_MODULES = ('instrumentation', 'db_utils', 'storage', 'contextlib', 'psycopg2')
+
+_enabled = os.environ.get('DB_INSTRUMENT', '') not in ('', '0')
+_local = threading.local()
+_recent: Deque['QueryEvent'] = deque(maxlen=10000)
+_counters = {'connections_opened': 0, 'checkouts': 0}
+_lock = threading.Lock()
+
+def enable(recent_size: Optional[int] = None):
+    """Start recording queries, optionally resizing the log of recent ones"""
+    global _enabled, _recent
+    if recent_size is not None:
+        with _lock:
+            _recent = deque(_recent, maxlen=recent_size)
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+class QueryEvent:
+    """One statement: what ran it, how long it took and how many rows it touched"""
+    __slots__ = ('fingerprint', 'sql', 'caller', 'thread', 'started_at', 'duration', 'rows')
+    
+    def __init__(self, fingerprint: str, sql: str, caller: str, started_at: float):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.caller = caller
+        self.thread = threading.current_thread().name
+        self.started_at = started_at
+        self.duration = 0.0
+        self.rows = 0
+    
+    def to_dict(self) -> Dict:
+        return {
+            'fingerprint': self.fingerprint,
+            'caller': self.caller,
+            'thread': self.thread,
+            'started_at': self.started_at,
+            'duration_ms': self.duration * 1000,
+            'rows': self.rows,
+        }
+
+class Trace:
+    """Queries, new connections and pool checkouts of one unit of work, e.g. a rerun"""
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self.queries: List[QueryEvent] = []
+        self.connections_opened = 0
+        self.checkouts = 0
+    
+    @property
+    def query_time(self) -> float:
+        """Seconds spent in the database"""
+        return sum(event.duration for event in self.queries)
+    
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._started
+    
+    def summary(self) -> List[Dict]:
+        return summarize(self.queries)
+    
+    def to_dict(self) -> Dict:
+        return {
+            'label': self.label,
+            'started_at': self.started_at,
+            'elapsed_ms': self.elapsed * 1000 if self.elapsed is not None else None,
+            'query_count': len(self.queries),
+            'query_time_ms': self.query_time * 1000,
+            'connections_opened': self.connections_opened,
+            'checkouts': self.checkouts,
+            'queries': [event.to_dict() for event in self.queries],
+        }
+
+def start_trace(label: str = '') -> Trace:
+    """Attribute this thread's queries to a new trace, replacing any unfinished one"""
+    trace = Trace(label)
+    _local.trace = trace
+    return trace
+
+def stop_trace() -> Optional[Trace]:
+    """Finish and return this thread's trace"""
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    if trace is not None:
+        trace.finish()
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+def recent_queries() -> List[QueryEvent]:
+    """The most recent queries from every thread, oldest first"""
+    with _lock:
+        return list(_recent)
+
+def counters() -> Dict[str, int]:
+    """Connections opened and pool checkouts since recording started"""
+    return dict(_counters)
+
+def reset():
+    with _lock:
+        _recent.clear()
+        for key in _counters:
+            _counters[key] = 0
+
+def record_checkout():
+    """Count a connection handed out by the pool"""
+    if _enabled:
+        with _lock:
+            _counters['checkouts'] += 1
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.checkouts += 1
+
+def latency_histogram(durations: Iterable[float]) -> List[int]:
+    """Number of durations (seconds) in each LATENCY_BUCKETS_MS bucket"""
+    values = np.fromiter(durations, dtype=float) * 1000
+    buckets = np.searchsorted(LATENCY_BUCKETS_MS, values, side='left')
+    return np.bincount(buckets, minlength=len(LATENCY_BUCKETS_MS)).tolist()
+
+def summarize(events: Iterable[QueryEvent]) -> List[Dict]:
+    """Per-fingerprint count, time, rows, callers and latency histogram, slowest total first"""
+    groups: Dict[str, List[QueryEvent]] = {}
+    for event in events:
+        groups.setdefault(event.fingerprint, []).append(event)
+    
+    summary = []
+    for fingerprint, group in groups.items():
+        durations = np.array([event.duration for event in group]) * 1000
+        callers: Dict[str, int] = {}
+        for event in group:
+            callers[event.caller] = callers.get(event.caller, 0) + 1
+        summary.append({
+            'fingerprint': fingerprint,
+            'count': len(group),
+            'total_ms': float(durations.sum()),
+            'p50_ms': float(np.percentile(durations, 50)),
+            'p95_ms': float(np.percentile(durations, 95)),
+            'max_ms': float(durations.max()),
+            'rows': sum(event.rows for event in group),
+            'callers': callers,
+            'histogram': latency_histogram(event.duration for event in group),
+        })
+    summary.sort(key=lambda entry: entry['total_ms'], reverse=True)
+    return summary
+
+def export_jsonl(traces: Iterable[Trace], path_or_file) -> int:
+    """Write traces one JSON object per line, for offline analysis; returns how many were written"""
+    count = 0
+    close = isinstance(path_or_file, str)
+    f = open(path_or_file, 'w') if close else path_or_file
+    try:
+        for trace in traces:
+            f.write(json.dumps(trace.to_dict()) + '\n')
+            count += 1
+    finally:
+        if close:
+            f.close()
+    return count
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+# A value as it appears once literals are replaced, including psycopg2's inlined ones ('...'::timestamp, NULL)
+_VALUE = r"\s*(?:-?\?(?:::\w+)?|NULL|TRUE|FALSE)\s*"
+_ROW = rf"\((?:{_VALUE},)*{_VALUE}\)"
+_VALUE_LIST = re.compile(rf"\bVALUES\s*{_ROW}(?:\s*,\s*{_ROW})*", re.IGNORECASE)
+_IN_LIST = re.compile(rf"\bIN\s*\((?:{_VALUE},)+{_VALUE}\)", re.IGNORECASE)
+
+# Statements longer than this (multi-row INSERTs with inlined values) are
+# neither cached by fingerprint nor kept in full on their event
+MAX_SQL_LENGTH = 2000
+
+def fingerprint(sql: str) -> str:
+    """SQL with literals and placeholders replaced, so repeats of one statement group together"""
+    if len(sql) > MAX_SQL_LENGTH:
+        return _normalize(sql)
+    return _cached_fingerprint(sql)
+
+@lru_cache(maxsize=2048)
+def _cached_fingerprint(sql: str) -> str:
+    return _normalize(sql)
+
+def _normalize(sql: str) -> str:
+    normalized = ' '.join(sql.split())
+    normalized = _STRING_LITERAL.sub('?', normalized)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _VALUE_LIST.sub('VALUES (...)', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    return normalized
+
+def _caller() -> str:
+    """module.function of the innermost frame outside the database layer"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(_INFRASTRUCTURE_MODULES):
+            code = frame.f_code
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return '?'
+
+def _record(event: QueryEvent):
+    with _lock:
+        _recent.append(event)
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.queries.append(event)
+
+class InstrumentedCursor:
+    """Cursor proxy that logs each execute and the rows fetched from it"""
+    def __init__(self, cursor):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_event', None)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+    
+    def execute(self, sql, params=None):
+        return self._timed(self._cursor.execute, sql, params)
+    
+    def execute_native(self, sql, params=()):
+        # SQLite cursors only; see storage.SQLiteCursor
+        return self._timed(self._cursor.execute_native, sql, params)
+    
+    def _timed(self, execute, sql, params):
+        if not _enabled:
+            object.__setattr__(self, '_event', None)
+            return execute(sql, params)
+        text = sql.decode() if isinstance(sql, bytes) else str(sql)
+        event = QueryEvent(fingerprint(text), text[:MAX_SQL_LENGTH], _caller(), time.time())
+        object.__setattr__(self, '_event', event)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params)
+        finally:
+            event.duration += time.perf_counter() - started
+            # Statements without a result set report what they changed; reads count rows as fetched
+            if getattr(self._cursor, 'description', None) is None:
+                event.rows = max(self._cursor.rowcount, 0)
+            _record(event)
+    
+    def _fetched(self, fetch, *args, many: bool = True):
+        event = self._event
+        if event is None:
+            return fetch(*args)
+        started = time.perf_counter()
+        rows = fetch(*args)
+        event.duration += time.perf_counter() - started
+        if many:
+            event.rows += len(rows)
+        elif rows is not None:
+            event.rows += 1
+        return rows
+    
+    def fetchone(self):
+        return self._fetched(self._cursor.fetchone, many=False)
+    
+    def fetchmany(self, *args):
+        return self._fetched(self._cursor.fetchmany, *args)
+    
+    def fetchall(self):
+        return self._fetched(self._cursor.fetchall)
+    
+    def __iter__(self):
+        if self._event is None:
+            yield from self._cursor
+            return
+        while True:
+            rows = self.fetchmany(getattr(self._cursor, 'itersize', 2000))
+            if not rows:
+                return
+            yield from rows
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented"""
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+        if _enabled:
+            with _lock:
+                _counters['connections_opened'] += 1
+            trace = getattr(_local, 'trace', None)
+            if trace is not None:
+                trace.connections_opened += 1
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+    
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+def instrument_connection(conn) -> InstrumentedConnection:
+    return InstrumentedConnection(conn)
@@ -0,0 +1,96 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from customer import Member
+
+class MemberCache:
+    """
+    Bounded LRU cache of members, filled lazily from the database.
+    
+    Lookups that miss (or find an entry older than ``ttl`` seconds) go through
+    ``loader``; once more than ``max_size`` members are cached the least recently
+    used one is evicted. The loader runs outside the lock, so a slow query for
+    one member never blocks lookups of others.
+    """
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = 600,
+                 loader: Callable[[str], Optional[Member]] = Member.load_from_db):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._loader = loader
+        self._entries: 'OrderedDict[str, Tuple[Member, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, member_id: str) -> Optional[Member]:
+        """Return a cached member, loading it from the database on a miss"""
+        member = self.peek(member_id)
+        if member is not None:
+            return member
+        
+        member = self._loader(member_id)
+        if member is not None:
+            self.put(member)
+        return member
+    
+    def peek(self, member_id: str) -> Optional[Member]:
+        """Return a cached member without falling back to the database"""
+        with self._lock:
+            entry = self._entries.get(member_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            member, loaded_at = entry
+            if self.ttl is not None and time.monotonic() - loaded_at > self.ttl:
+                del self._entries[member_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(member_id)
+            self.hits += 1
+            return member
+    
+    def put(self, member: Member):
+        """Cache a member, evicting the least recently used ones past max_size"""
+        with self._lock:
+            self._entries[member.member_id] = (member, time.monotonic())
+            self._entries.move_to_end(member.member_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, member_id: str):
+        """Drop a member so the next lookup reloads it"""
+        with self._lock:
+            self._entries.pop(member_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss/eviction counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+    
+    def __contains__(self, member_id: str) -> bool:
+        with self._lock:
+            return member_id in self._entries
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
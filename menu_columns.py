@@ -0,0 +1,95 @@
+"""
+Columnar snapshot of the menu.
+
+Restaurant keeps its menu as a dict of MenuItem objects for per-item access.
+Scans over the whole menu (which dishes are safe for a diner, what a
+category holds, what a basket costs) read this snapshot instead: one NumPy
+array per column, sorted by id, so a scan is a few vectorized operations
+rather than a Python loop over objects, and a column costs a few bytes per
+item. Snapshots are immutable; build a new one whenever the menu changes.
+"""
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from allergen_index import allergen_registry
+from menu_item import MenuItem
+
+class MenuColumns:
+    """Menu ids, names, prices, category codes and allergen masks as parallel columns, sorted by id"""
+    __slots__ = ('ids', 'names', 'prices', 'category_codes', 'categories', 'allergen_masks')
+    
+    def __init__(self, items: Iterable[MenuItem]):
+        items = sorted(items, key=lambda item: item.id)
+        self.ids = np.array([item.id for item in items], dtype=np.int64)
+        self.names: List[str] = [item.name for item in items]
+        self.prices = np.array([item.price for item in items], dtype=np.float64)
+        
+        # Categories are few; each item stores a small code into this list
+        self.categories: List[str] = sorted({item.category for item in items})
+        codes = {category: code for code, category in enumerate(self.categories)}
+        self.category_codes = np.array([codes[item.category] for item in items], dtype=np.int16)
+        
+        # Masks fit a machine word until there are more than 64 distinct allergens
+        masks = [item.allergen_mask for item in items]
+        dtype = np.uint64 if max(masks, default=0).bit_length() <= 64 else object
+        self.allergen_masks = np.array(masks, dtype=dtype)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __contains__(self, menu_item_id: int) -> bool:
+        return self.position(menu_item_id) is not None
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the NumPy columns (names and category labels excluded)"""
+        return self.ids.nbytes + self.prices.nbytes + self.category_codes.nbytes + self.allergen_masks.nbytes
+    
+    def position(self, menu_item_id: int) -> Optional[int]:
+        """Row of an item, by binary search on the sorted ids"""
+        row = int(np.searchsorted(self.ids, menu_item_id))
+        if row < len(self.ids) and self.ids[row] == menu_item_id:
+            return row
+        return None
+    
+    def positions(self, menu_item_ids: Iterable[int]) -> np.ndarray:
+        """Rows of the given items, repeats kept; ids not on the menu are left out"""
+        wanted = np.fromiter(menu_item_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.empty(0, dtype=np.intp)
+        rows = np.searchsorted(self.ids, wanted).clip(max=len(self.ids) - 1)
+        return rows[self.ids[rows] == wanted]
+    
+    def conflict_masks(self, member_mask: int) -> np.ndarray:
+        """Per row, the allergens (as a mask) an item shares with ``member_mask``"""
+        if self.allergen_masks.dtype == object:
+            # Object arrays apply & to each Python int
+            return self.allergen_masks & member_mask
+        # No item has an allergen past bit 63, so the diner's higher bits can't conflict
+        return self.allergen_masks & np.uint64(member_mask & 0xFFFFFFFFFFFFFFFF)
+    
+    def safe_ids(self, member_mask: int) -> np.ndarray:
+        """Ids of the items containing none of the allergens in ``member_mask``"""
+        if not member_mask:
+            return self.ids
+        return self.ids[self.conflict_masks(member_mask) == 0]
+    
+    def conflicts(self, member_mask: int) -> Dict[int, List[str]]:
+        """Allergen names of every item that conflicts with ``member_mask``, by item id"""
+        if not member_mask:
+            return {}
+        masks = self.conflict_masks(member_mask)
+        rows = np.flatnonzero(masks != 0)
+        return {int(self.ids[row]): allergen_registry.names(int(masks[row])) for row in rows}
+    
+    def ids_in_category(self, category: str) -> np.ndarray:
+        if category not in self.categories:
+            return self.ids[:0]
+        return self.ids[self.category_codes == self.categories.index(category)]
+    
+    def category_of(self, menu_item_id: int) -> Optional[str]:
+        row = self.position(menu_item_id)
+        return None if row is None else self.categories[self.category_codes[row]]
+    
+    def total_price(self, menu_item_ids: Iterable[int]) -> float:
+        """Price of a basket; ids may repeat, ids not on the menu count as zero"""
+        return float(self.prices[self.positions(menu_item_ids)].sum())
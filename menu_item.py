@@ -1,101 +1,288 @@
-from typing import Optional, List
-from psycopg2.extras import DictCursor
-from db_utils import get_db_connection
+from typing import Optional, List, Dict, Iterable, Set, Tuple
+from db_utils import DictCursor, after_commit, execute_values, pooled_connection, transaction
+from allergen_index import allergen_registry
+
+def record_menu_changes(cursor, menu_item_ids: Iterable[int]) -> int:
+    """
+    Bump the menu version and log the changed items, in the caller's transaction.
+    
+    The version lives in one row, so concurrent menu writers queue on its lock
+    and versions become visible in order; a reader that has seen version N
+    has seen every change up to N.
+    """
+    cursor.execute("UPDATE menu_state SET version = version + 1 RETURNING version")
+    version = cursor.fetchone()[0]
+    execute_values(
+        cursor,
+        "INSERT INTO menu_changes (version, menu_item_id) VALUES %s",
+        [(version, menu_item_id) for menu_item_id in set(menu_item_ids)]
+    )
+    return version
 
 class MenuItem:
-    def __init__(self, id: int, name: str, price: float, category: str, allergens: List[str] = None):
+    __slots__ = ('id', 'name', 'price', 'category', '_allergens', 'allergen_mask', 'allergen_version',
+                 '_saved_allergens')
+    
+    def __init__(self, id: int, name: str, price: float, category: str, allergens: Iterable[str] = ()):
         self.id = id
         self.name = name
         self.price = price
         self.category = category
-        self.allergens = allergens or []  # List of potential allergens in this item
+        # Bumped whenever the allergens change, so snapshots built from this
+        # item (Restaurant.menu_columns) can tell they are out of date
+        self.allergen_version = 0
+        self.allergens = allergens  # Potential allergens in this item
+        self._saved_allergens: Optional[Set[str]] = None  # allergens known to be in the DB, None if unknown
+    
+    @property
+    def allergens(self) -> Tuple[str, ...]:
+        return self._allergens
+    
+    @allergens.setter
+    def allergens(self, allergens: Iterable[str]):
+        # A tuple, so every change goes through here and updates the mask
+        self._allergens = tuple(allergens)
+        self.allergen_mask = allergen_registry.mask(self._allergens)
+        self.allergen_version += 1
     
     def add_allergen(self, allergen: str):
         """Add an allergen to this menu item"""
         if allergen not in self.allergens:
-            self.allergens.append(allergen)
+            self.allergens = (*self.allergens, allergen)
             self._save_allergens_to_db()
     
     def remove_allergen(self, allergen: str):
         """Remove an allergen from this menu item"""
         if allergen in self.allergens:
-            self.allergens.remove(allergen)
+            self.allergens = [existing for existing in self.allergens if existing != allergen]
             self._save_allergens_to_db()
     
     def _save_allergens_to_db(self):
-        """Save menu item allergens to database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        """Sync menu item allergens to database, only touching rows that changed"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            if self._write_allergens(cursor):
+                record_menu_changes(cursor, [self.id])
+            cursor.close()
+    
+    def _write_allergens(self, cursor) -> bool:
+        """Write the allergen rows that differ from the stored ones; returns whether any did"""
+        current = set(self.allergens)
+        
+        saved = self._saved_allergens
+        if saved is None:
+            # Not loaded from the database, so find out what is stored first
+            cursor.execute(
+                "SELECT allergen FROM menu_allergens WHERE menu_item_id = %s",
+                (self.id,)
+            )
+            saved = {row[0] for row in cursor.fetchall()}
         
-        # First delete existing allergens
-        cursor.execute(
-            "DELETE FROM menu_allergens WHERE menu_item_id = %s",
-            (self.id,)
-        )
+        removed = saved - current
+        added = current - saved
         
-        # Then insert current allergens
-        for allergen in self.allergens:
+        if removed:
             cursor.execute(
-                "INSERT INTO menu_allergens (menu_item_id, allergen) VALUES (%s, %s)",
-                (self.id, allergen)
+                "DELETE FROM menu_allergens WHERE menu_item_id = %s AND allergen IN %s",
+                (self.id, tuple(removed))
+            )
+        
+        if added:
+            execute_values(
+                cursor,
+                "INSERT INTO menu_allergens (menu_item_id, allergen) VALUES %s ON CONFLICT DO NOTHING",
+                [(self.id, allergen) for allergen in added]
             )
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Only trust the rows as saved once they are committed
+        def mark_saved():
+            self._saved_allergens = current
+        after_commit(mark_saved)
+        
+        return bool(removed or added)
     
     @staticmethod
     def load_from_db(menu_id: int) -> Optional['MenuItem']:
         """Load a menu item from the database"""
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        
-        cursor.execute(
-            "SELECT * FROM menu_items WHERE id = %s",
-            (menu_id,)
-        )
-        item = cursor.fetchone()
-        
-        if not item:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            
+            cursor.execute(
+                "SELECT * FROM menu_items WHERE id = %s",
+                (menu_id,)
+            )
+            item = cursor.fetchone()
+            
+            if not item:
+                cursor.close()
+                return None
+            
+            menu_item = MenuItem(
+                id=item['id'],
+                name=item['name'],
+                price=float(item['price']),
+                category=item['category']
+            )
+            
+            # Get allergens
+            cursor.execute(
+                "SELECT allergen FROM menu_allergens WHERE menu_item_id = %s",
+                (menu_id,)
+            )
+            allergen_data = cursor.fetchall()
+            
+            menu_item.allergens = [data['allergen'] for data in allergen_data]
+            menu_item._saved_allergens = set(menu_item.allergens)
+            
             cursor.close()
-            conn.close()
-            return None
-        
-        menu_item = MenuItem(
-            id=item['id'],
-            name=item['name'],
-            price=float(item['price']),
-            category=item['category']
-        )
         
-        # Get allergens
-        cursor.execute(
-            "SELECT allergen FROM menu_allergens WHERE menu_item_id = %s",
-            (menu_id,)
-        )
-        allergen_data = cursor.fetchall()
+        return menu_item
+    
+    @staticmethod
+    def load_all_from_db() -> Dict[int, 'MenuItem']:
+        """Load every menu item with its allergens in a single query"""
+        return MenuItem._load_where('', ())
+    
+    @staticmethod
+    def load_many_from_db(menu_ids: Iterable[int]) -> Dict[int, 'MenuItem']:
+        """Load the given menu items with their allergens in a single query; missing ids are left out"""
+        menu_ids = tuple(menu_ids)
+        if not menu_ids:
+            return {}
+        return MenuItem._load_where('WHERE m.id IN %s ', (menu_ids,))
+    
+    @staticmethod
+    def _load_where(where: str, params: tuple) -> Dict[int, 'MenuItem']:
+        menu_items: Dict[int, MenuItem] = {}
+        allergens: Dict[int, List[str]] = {}
         
-        menu_item.allergens = [data['allergen'] for data in allergen_data]
+        with pooled_connection() as conn:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            
+            # One row per (item, allergen); items without allergens come back once with NULL
+            cursor.execute(
+                "SELECT m.id, m.name, m.price, m.category, a.allergen "
+                "FROM menu_items m LEFT JOIN menu_allergens a ON a.menu_item_id = m.id "
+                + where + "ORDER BY m.id",
+                params
+            )
+            
+            for row in cursor:
+                menu_item = menu_items.get(row['id'])
+                if menu_item is None:
+                    menu_item = MenuItem(
+                        id=row['id'],
+                        name=row['name'],
+                        price=float(row['price']),
+                        category=row['category']
+                    )
+                    menu_items[menu_item.id] = menu_item
+                if row['allergen'] is not None:
+                    allergens.setdefault(menu_item.id, []).append(row['allergen'])
+            
+            cursor.close()
         
-        cursor.close()
-        conn.close()
+        for menu_item in menu_items.values():
+            menu_item.allergens = allergens.get(menu_item.id, ())
+            menu_item._saved_allergens = set(menu_item.allergens)
         
-        return menu_item
+        return menu_items
     
     def save_to_db(self):
         """Save menu item to database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with transaction():
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    "INSERT INTO menu_items (id, name, price, category) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (id) DO UPDATE SET name = %s, price = %s, category = %s",
+                    (self.id, self.name, self.price, self.category, self.name, self.price, self.category)
+                )
+                self._write_allergens(cursor)
+                record_menu_changes(cursor, [self.id])
+                
+                cursor.close()
+    
+    @staticmethod
+    def bulk_save_to_db(items: Iterable['MenuItem']) -> List['MenuItem']:
+        """
+        Upsert many menu items and their allergens in one transaction.
         
-        cursor.execute(
-            "INSERT INTO menu_items (id, name, price, category) VALUES (%s, %s, %s, %s) "
-            "ON CONFLICT (id) DO UPDATE SET name = %s, price = %s, category = %s",
-            (self.id, self.name, self.price, self.category, self.name, self.price, self.category)
-        )
+        Items are written with a single multi-row upsert; allergens are diffed
+        against what is stored for those items, so only added and removed
+        (item, allergen) pairs are written. If the same id appears more than
+        once, the last item wins. Returns the de-duplicated items.
+        """
+        by_id = {item.id: item for item in items}
+        if not by_id:
+            return []
+        menu_items = list(by_id.values())
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with transaction() as conn:
+            cursor = conn.cursor()
+            
+            execute_values(
+                cursor,
+                "INSERT INTO menu_items (id, name, price, category) VALUES %s "
+                "ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, price = EXCLUDED.price, "
+                "category = EXCLUDED.category",
+                [(item.id, item.name, item.price, item.category) for item in menu_items],
+                page_size=len(menu_items)
+            )
+            
+            cursor.execute(
+                "SELECT menu_item_id, allergen FROM menu_allergens WHERE menu_item_id IN %s",
+                (tuple(by_id),)
+            )
+            saved = {(menu_item_id, allergen) for menu_item_id, allergen in cursor.fetchall()}
+            current = {(item.id, allergen) for item in menu_items for allergen in item.allergens}
+            
+            removed = list(saved - current)
+            if removed:
+                execute_values(
+                    cursor,
+                    "DELETE FROM menu_allergens WHERE (menu_item_id, allergen) IN (VALUES %s)",
+                    removed,
+                    page_size=len(removed)
+                )
+            
+            added = list(current - saved)
+            if added:
+                execute_values(
+                    cursor,
+                    "INSERT INTO menu_allergens (menu_item_id, allergen) VALUES %s ON CONFLICT DO NOTHING",
+                    added,
+                    page_size=len(added)
+                )
+            
+            record_menu_changes(cursor, by_id)
+            
+            cursor.close()
         
-        # Save allergens
-        self._save_allergens_to_db()
\ No newline at end of file
+        for item in menu_items:
+            item._saved_allergens = set(item.allergens)
+        return menu_items
+    
+    @staticmethod
+    def current_menu_version() -> int:
+        """Version of the stored menu; it goes up with every committed menu change"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM menu_state WHERE id = 1")
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def changed_since(version: int, up_to: int) -> Tuple[int, ...]:
+        """Ids of the items changed by menu versions in (version, up_to]"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT DISTINCT menu_item_id FROM menu_changes WHERE version > %s AND version <= %s",
+                (version, up_to)
+            )
+            menu_ids = tuple(row[0] for row in cursor.fetchall())
+            cursor.close()
+        return menu_ids
@@ -0,0 +1,172 @@
+"""
+Fuzzy search over menu item names and categories, in Thai and English.
+
+Names are normalized before indexing: decomposed (NFKD), stripped of
+combining marks (Latin accents, Thai tone marks and above/below vowels),
+case-folded, and reduced to letters and digits, so "Tom Yum", "tomyum" and
+"TOM-YUM" are the same string and a wrong Thai tone mark still matches.
+Each normalized name is split into character trigrams (Thai is written
+without spaces, so no word segmentation is needed) and every trigram maps to
+the rows containing it.
+
+A query is scored against every row at once: the postings of its trigrams
+are counted with one ``np.bincount``, turned into a Jaccard similarity with
+each name, plus a smaller share for a matching category, and the best
+``limit`` rows are picked with ``np.argpartition``. Items are added, replaced
+and removed one at a time; removed rows are skipped until enough accumulate
+to be worth compacting.
+"""
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from menu_item import MenuItem
+
+# Weight of a category match relative to a name match
+CATEGORY_WEIGHT = 0.3
+# Results scoring below this are left out
+MIN_SCORE = 0.15
+
+def normalize(text: str) -> str:
+    """Case-folded letters and digits of ``text``, without accents or tone marks"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(
+        char for char in decomposed.casefold()
+        if char.isalnum() and unicodedata.category(char) != 'Mn'
+    )
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of the normalized text, padded so short strings and word starts count too"""
+    normalized = normalize(text)
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class MenuSearchIndex:
+    """Trigram inverted index over menu item names and categories"""
+    def __init__(self, items: Iterable[MenuItem] = ()):
+        self._lock = threading.RLock()
+        self._clear()
+        for item in items:
+            self._add(item)
+    
+    def _clear(self):
+        self._row_ids: List[int] = []  # row -> menu item id
+        self._row_names: List[str] = []
+        self._rows: Dict[int, int] = {}  # menu item id -> live row
+        self._gram_counts: List[int] = []  # row -> distinct trigrams in its name
+        self._category_codes: List[int] = []  # row -> index into _categories
+        self._categories: List[str] = []
+        self._category_grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        # Postings as arrays, built on first use after each change to them
+        self._posting_arrays: Dict[str, np.ndarray] = {}
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._dead = 0
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def add(self, item: MenuItem):
+        """Index an item, replacing what was indexed under its id"""
+        with self._lock:
+            self._add(item)
+            self._compact_if_sparse()
+    
+    def remove(self, menu_item_id: int):
+        with self._lock:
+            self._remove(menu_item_id)
+            self._compact_if_sparse()
+    
+    def _compact_if_sparse(self):
+        # Once most rows are dead, queries would mostly count rows they then discard
+        if self._dead > len(self._rows):
+            self.rebuild()
+    
+    def rebuild(self, items: Optional[Iterable[MenuItem]] = None):
+        """Re-index ``items``, or compact the current rows when None"""
+        with self._lock:
+            if items is None:
+                items = [
+                    (menu_item_id, self._row_names[row], self._categories[self._category_codes[row]])
+                    for menu_item_id, row in self._rows.items()
+                ]
+                self._clear()
+                for menu_item_id, name, category in items:
+                    self._index(menu_item_id, name, category)
+            else:
+                self._clear()
+                for item in items:
+                    self._add(item)
+    
+    def _add(self, item: MenuItem):
+        self._remove(item.id)
+        self._index(item.id, item.name, item.category)
+    
+    def _index(self, menu_item_id: int, name: str, category: str):
+        row = len(self._row_ids)
+        grams = trigrams(name)
+        if category not in self._categories:
+            self._categories.append(category)
+            self._category_grams.append(trigrams(category))
+        self._row_ids.append(menu_item_id)
+        self._row_names.append(name)
+        self._rows[menu_item_id] = row
+        self._gram_counts.append(len(grams))
+        self._category_codes.append(self._categories.index(category))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(row)
+            self._posting_arrays.pop(gram, None)
+        self._arrays = None
+    
+    def _remove(self, menu_item_id: int):
+        row = self._rows.pop(menu_item_id, None)
+        if row is not None:
+            # The row stays in the postings; an id of -1 marks it dead
+            self._row_ids[row] = -1
+            self._dead += 1
+            self._arrays = None
+    
+    def _row_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._row_ids, dtype=np.int64),
+                np.array(self._gram_counts, dtype=np.float64),
+                np.array(self._category_codes, dtype=np.intp),
+            )
+        return self._arrays
+    
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            array = self._posting_arrays[gram] = np.array(self._postings[gram], dtype=np.intp)
+        return array
+    
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """Up to ``limit`` (menu item id, score) pairs, best first; scores are between 0 and 1 + CATEGORY_WEIGHT"""
+        grams = trigrams(query)
+        if not grams or limit <= 0:
+            return []
+        with self._lock:
+            if not self._rows:
+                return []
+            row_ids, gram_counts, category_codes = self._row_arrays()
+            postings = [self._posting_array(gram) for gram in grams if gram in self._postings]
+            category_scores = np.array([
+                len(grams & category_grams) / len(grams | category_grams) if category_grams else 0.0
+                for category_grams in self._category_grams
+            ])
+        
+        shared = np.bincount(np.concatenate(postings), minlength=len(row_ids)) if postings \
+            else np.zeros(len(row_ids), dtype=np.intp)
+        scores = shared / (len(grams) + gram_counts - shared)
+        scores += CATEGORY_WEIGHT * category_scores[category_codes]
+        scores[row_ids < 0] = 0
+        
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Ties go to the lower id, so results are stable between identical queries
+        order = np.lexsort((row_ids[candidates], -scores[candidates]))
+        return [(int(row_ids[row]), float(scores[row])) for row in candidates[order]]
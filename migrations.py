@@ -0,0 +1,350 @@
+"""
+Versioned schema migrations.
+
+The schema is described by the ordered MIGRATIONS list below; the database
+records which versions it has in ``schema_migrations``. Apply pending
+migrations explicitly, once per deploy, instead of at application startup:
+
+    python migrations.py status
+    python migrations.py upgrade [--target VERSION]
+
+To change the schema, append a Migration with the next version number; never
+edit one that has shipped. Migrations that must not hold a long lock on a
+busy table (e.g. ``CREATE INDEX CONCURRENTLY``) are declared with
+``transactional=False`` and run statement by statement in autocommit mode, so
+they should be written to be safely re-runnable (``IF NOT EXISTS``).
+
+Statements are written for PostgreSQL. Where another storage backend's SQL
+dialect differs (see storage.py), the migration lists replacement statements
+for it in ``overrides``.
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional
+from db_utils import get_db_connection, pooled_connection
+from storage import get_backend
+
+class Migration:
+    def __init__(self, version: int, description: str, statements: List[str], transactional: bool = True,
+                 overrides: Optional[Dict[str, List[str]]] = None):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.transactional = transactional
+        self.overrides = overrides or {}
+    
+    def statements_for(self, dialect: str) -> List[str]:
+        return self.overrides.get(dialect, self.statements)
+
+def _dish_popularity_statements(order_hour: str) -> List[str]:
+    """Create dish_popularity and backfill it from the completed orders so far"""
+    completed_items = (
+        "FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+        "JOIN menu_items m ON m.id = oi.menu_item_id WHERE o.status = 'Completed'"
+    )
+    # Same boundaries as popularity.MEAL_TIMES
+    meal_time = (
+        f"CASE WHEN {order_hour} >= 16 THEN 'Dinner' WHEN {order_hour} >= 11 THEN 'Lunch' "
+        f"WHEN {order_hour} >= 5 THEN 'Breakfast' ELSE 'Dinner' END"
+    )
+    insert = "INSERT INTO dish_popularity (scope, scope_value, menu_item_id, count) "
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS dish_popularity (
+            scope VARCHAR(20) NOT NULL,
+            scope_value VARCHAR(50) NOT NULL,
+            menu_item_id INTEGER NOT NULL REFERENCES menu_items(id) ON DELETE CASCADE,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, scope_value, menu_item_id)
+        )
+        ''',
+        insert + f"SELECT 'all', '', oi.menu_item_id, COUNT(*) {completed_items} GROUP BY oi.menu_item_id",
+        insert + f"SELECT 'category', m.category, oi.menu_item_id, COUNT(*) {completed_items} "
+                 "GROUP BY m.category, oi.menu_item_id",
+        insert + f"SELECT 'meal_time', {meal_time}, oi.menu_item_id, COUNT(*) {completed_items} "
+                 f"GROUP BY {meal_time}, oi.menu_item_id",
+    ]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            price NUMERIC(10, 2) NOT NULL,
+            category VARCHAR(50) NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS members (
+            member_id VARCHAR(50) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            phone VARCHAR(20) NOT NULL,
+            points INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS favorite_items (
+            member_id VARCHAR(50) REFERENCES members(member_id),
+            menu_item_id INTEGER REFERENCES menu_items(id),
+            count INTEGER DEFAULT 0,
+            PRIMARY KEY (member_id, menu_item_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id VARCHAR(50) PRIMARY KEY,
+            customer_id VARCHAR(50),
+            total_amount NUMERIC(10, 2) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            timestamp TIMESTAMP NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id VARCHAR(50) REFERENCES orders(order_id),
+            menu_item_id INTEGER REFERENCES menu_items(id),
+            PRIMARY KEY (order_id, menu_item_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS member_allergies (
+            allergy_id INTEGER PRIMARY KEY,
+            member_id VARCHAR(50) REFERENCES members(member_id),
+            allergen VARCHAR(100) NOT NULL,
+            severity VARCHAR(20) NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS menu_allergens (
+            menu_item_id INTEGER REFERENCES menu_items(id),
+            allergen VARCHAR(100) NOT NULL,
+            PRIMARY KEY (menu_item_id, allergen)
+        )
+        ''',
+    ]),
+    Migration(2, "Sequences for member and allergy ids", [
+        "CREATE SEQUENCE IF NOT EXISTS member_id_seq",
+        # Continue after the highest existing M<number> id rather than the row count
+        "SELECT setval('member_id_seq', COALESCE(MAX(CAST(substring(member_id FROM 2) AS BIGINT)), 0) + 1, false) "
+        "FROM members WHERE member_id ~ '^M[0-9]+$'",
+        "CREATE SEQUENCE IF NOT EXISTS allergy_id_seq",
+        "SELECT setval('allergy_id_seq', COALESCE(MAX(allergy_id), 0) + 1, false) FROM member_allergies",
+    ], overrides={
+        # SQLite has no sequences: a table holds the last value handed out
+        'sqlite': [
+            "CREATE TABLE IF NOT EXISTS id_sequences (name VARCHAR(50) PRIMARY KEY, value INTEGER NOT NULL)",
+            "INSERT OR IGNORE INTO id_sequences (name, value) "
+            "SELECT 'member_id_seq', COALESCE(MAX(CAST(substr(member_id, 2) AS INTEGER)), 0) "
+            "FROM members WHERE member_id GLOB 'M[0-9]*'",
+            "INSERT OR IGNORE INTO id_sequences (name, value) "
+            "SELECT 'allergy_id_seq', COALESCE(MAX(allergy_id), 0) FROM member_allergies",
+        ],
+    }),
+    # Built concurrently so a live database keeps taking orders meanwhile. If a
+    # build fails it leaves an INVALID index behind; drop it before re-running,
+    # since IF NOT EXISTS would otherwise skip it.
+    Migration(3, "Indexes for member, order and allergen lookups", [
+        # Member.load_from_db / get_allergies filter allergies by member
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_member_allergies_member_id ON member_allergies (member_id)",
+        # A member's order history, newest first
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_customer_id_timestamp ON orders (customer_id, timestamp)",
+        # Sales reports over a time range
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_timestamp ON orders (timestamp)",
+        # Dishes containing a given allergen
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_allergens_allergen ON menu_allergens (allergen)",
+        # Per-dish lookups, and the foreign key checks when a menu item is deleted
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_favorite_items_menu_item_id ON favorite_items (menu_item_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_items_menu_item_id ON order_items (menu_item_id)",
+    ], transactional=False, overrides={
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_member_allergies_member_id ON member_allergies (member_id)",
+            "CREATE INDEX IF NOT EXISTS idx_orders_customer_id_timestamp ON orders (customer_id, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders (timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_menu_allergens_allergen ON menu_allergens (allergen)",
+            "CREATE INDEX IF NOT EXISTS idx_favorite_items_menu_item_id ON favorite_items (menu_item_id)",
+            "CREATE INDEX IF NOT EXISTS idx_order_items_menu_item_id ON order_items (menu_item_id)",
+        ],
+    }),
+    Migration(4, "Dish popularity counters", _dish_popularity_statements("EXTRACT(HOUR FROM o.timestamp)"), overrides={
+        'sqlite': _dish_popularity_statements("CAST(strftime('%H', o.timestamp) AS INTEGER)"),
+    }),
+    # Filled and kept current by analytics.refresh_sales_summary
+    Migration(5, "Hourly sales summary", [
+        '''
+        CREATE TABLE IF NOT EXISTS sales_hourly (
+            hour TIMESTAMP PRIMARY KEY,
+            order_count INTEGER NOT NULL,
+            revenue NUMERIC(14, 2) NOT NULL,
+            items_sold INTEGER NOT NULL,
+            member_order_count INTEGER NOT NULL,
+            member_revenue NUMERIC(14, 2) NOT NULL
+        )
+        ''',
+    ]),
+    # Every menu write bumps the single menu_state row and logs the items it
+    # touched, so other processes can poll the version and reload just those
+    Migration(6, "Menu version and change log", [
+        "CREATE TABLE IF NOT EXISTS menu_state (id INTEGER PRIMARY KEY CHECK (id = 1), version BIGINT NOT NULL)",
+        "INSERT INTO menu_state (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+        '''
+        CREATE TABLE IF NOT EXISTS menu_changes (
+            version BIGINT NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            PRIMARY KEY (version, menu_item_id)
+        )
+        ''',
+    ]),
+    # order_history pages seek on (timestamp, order_id) within a customer; with
+    # order_id in the index no page has to sort orders sharing a timestamp.
+    # The new index covers every lookup of the one it replaces.
+    Migration(7, "Keyset index for order history", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_customer_id_timestamp_order_id "
+        "ON orders (customer_id, timestamp, order_id)",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_orders_customer_id_timestamp",
+    ], transactional=False, overrides={
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_orders_customer_id_timestamp_order_id "
+            "ON orders (customer_id, timestamp, order_id)",
+            "DROP INDEX IF EXISTS idx_orders_customer_id_timestamp",
+        ],
+    }),
+    # Orders are bucketed by when they were placed but written when they
+    # complete; analytics.refresh_sales_summary finds the hours to recompute
+    # from the orders written since its last run. A nullable column with no
+    # default is added without rewriting the table, so existing orders are
+    # not backfilled: their write time is taken to be when they were placed,
+    # COALESCE(completed_at, timestamp).
+    Migration(8, "Order write times", [
+        "ALTER TABLE orders ADD COLUMN completed_at TIMESTAMP",
+    ]),
+    # The watermark starts empty, so the first refresh rebuilds the summary
+    Migration(9, "Sales summary watermark", [
+        "CREATE TABLE IF NOT EXISTS sales_summary_state (id INTEGER PRIMARY KEY CHECK (id = 1), refreshed_through TIMESTAMP)",
+        "INSERT INTO sales_summary_state (id, refreshed_through) VALUES (1, NULL) ON CONFLICT (id) DO NOTHING",
+    ]),
+    Migration(10, "Index for orders written since a time", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_written_at ON orders ((COALESCE(completed_at, timestamp)))",
+    ], transactional=False, overrides={
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_orders_written_at ON orders (COALESCE(completed_at, timestamp))",
+        ],
+    }),
+]
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _applied_versions(cursor) -> List[int]:
+    if not get_backend().table_exists(cursor, 'schema_migrations'):
+        return []
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+def current_version() -> int:
+    """Highest migration version applied to the database (0 for an empty database)"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        versions = _applied_versions(cursor)
+        cursor.close()
+    return versions[-1] if versions else 0
+
+def pending_migrations() -> List[Migration]:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        applied = set(_applied_versions(cursor))
+        cursor.close()
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+def check_schema_version():
+    """Fail fast if the database is behind the code; a single read, no DDL"""
+    version = current_version()
+    if version < latest_version():
+        raise RuntimeError(
+            f"Database schema is at version {version} but the application needs "
+            f"{latest_version()}; run `python migrations.py upgrade`"
+        )
+
+def apply_migrations(target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations up to ``target`` (default: latest), returning those applied"""
+    target = latest_version() if target is None else target
+    applied_now = []
+    
+    # A dedicated connection rather than a pooled one: it runs in autocommit
+    # mode and holds the backend's session-level migration lock
+    backend = get_backend()
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        backend.lock_migrations(cursor)
+        try:
+            _ensure_version_table(cursor)
+            applied = set(_applied_versions(cursor))
+            
+            for migration in MIGRATIONS:
+                if migration.version in applied or migration.version > target:
+                    continue
+                
+                if migration.transactional:
+                    # DDL and the version row commit together, or not at all
+                    cursor.execute("BEGIN")
+                    try:
+                        for statement in migration.statements_for(backend.dialect):
+                            cursor.execute(statement)
+                        cursor.execute(
+                            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                            (migration.version, migration.description)
+                        )
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+                else:
+                    for statement in migration.statements_for(backend.dialect):
+                        cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (migration.version, migration.description)
+                    )
+                
+                applied_now.append(migration)
+        finally:
+            backend.unlock_migrations(cursor)
+            cursor.close()
+    finally:
+        conn.close()
+    
+    return applied_now
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the restaurant database schema")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    upgrade = subparsers.add_parser('upgrade', help="apply pending migrations")
+    upgrade.add_argument('--target', type=int, help="stop after this version")
+    subparsers.add_parser('status', help="show applied and pending migrations")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'upgrade':
+        applied = apply_migrations(args.target)
+        for migration in applied:
+            print(f"applied {migration.version:>4}  {migration.description}")
+        print(f"schema at version {current_version()}")
+    else:
+        pending = {migration.version for migration in pending_migrations()}
+        for migration in MIGRATIONS:
+            state = 'pending' if migration.version in pending else 'applied'
+            print(f"{migration.version:>4}  {state:<8} {migration.description}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
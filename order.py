@@ -1,12 +1,16 @@
 from datetime import datetime
 from typing import List
-from db_utils import get_db_connection
+from db_utils import execute_values, pooled_connection, transaction
+from id_generator import get_id_generator
 from menu_item import MenuItem
 from customer import Customer, Member
+from popularity import dish_counts, increment_dish_counts_in_db, meal_time_for
 
 class Order:
+    __slots__ = ('order_id', 'customer', 'items', 'total_amount', 'status', 'timestamp')
+    
     def __init__(self, customer: Customer):
-        self.order_id = datetime.now().strftime("%Y%m%d%H%M%S")
+        self.order_id = get_id_generator('order').next_id()
         self.customer = customer
         self.items: List[MenuItem] = []
         self.total_amount = 0
@@ -20,10 +24,10 @@ class Order:
         
         # Check for allergies if customer is a member
         if isinstance(self.customer, Member) and self.customer.allergies:
-            allergen_warnings = []
-            for allergy in self.customer.allergies:
-                if allergy.allergen in item.allergens:
-                    allergen_warnings.append(f"{item.name} contains {allergy.allergen} (Severity: {allergy.severity})")
+            allergen_warnings = [
+                f"{item.name} contains {allergy.allergen} (Severity: {allergy.severity})"
+                for allergy in self.customer.allergy_conflicts(item)
+            ]
             
             if allergen_warnings:
                 # In a real application, you might want to:
@@ -34,45 +38,70 @@ class Order:
         
         return []  # No warnings
     
+    @property
+    def meal_time(self) -> str:
+        return meal_time_for(self.timestamp)
+    
     def remove_item(self, item: MenuItem):
         if item in self.items:
             self.items.remove(item)
             self.total_amount -= item.price
     
     def complete_order(self):
-        self.status = "Completed"
-        if isinstance(self.customer, Member):
-            points_earned = int(self.total_amount / 10)
-            self.customer.add_points(points_earned)
-            for item in self.items:
-                self.customer.update_favorites(item.id)
-        self._save_to_db()
+        """
+        Mark the order completed and persist it as one unit of work.
+        
+        Points, favorite counts, dish popularity counts and the order rows are
+        written over a single connection and committed together; if anything
+        fails nothing is stored and the in-memory state is rolled back too.
+        """
+        member = self.customer if isinstance(self.customer, Member) else None
+        previous_status = self.status
+        if member:
+            previous_points = member.points
+            previous_favorites = dict(member.favorite_items)
+        
+        try:
+            with transaction():
+                self.status = "Completed"
+                if member:
+                    points_earned = int(self.total_amount / 10)
+                    member.add_points(points_earned)
+                    member.update_favorites_many(item.id for item in self.items)
+                self._save_to_db()
+                increment_dish_counts_in_db(dish_counts(self.items, self.meal_time))
+        except Exception:
+            self.status = previous_status
+            if member:
+                member.points = previous_points
+                member.favorite_items = previous_favorites
+            raise
     
     def _save_to_db(self):
         """Save order to database"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Save order
-        cursor.execute(
-            "INSERT INTO orders (order_id, customer_id, total_amount, status, timestamp) "
-            "VALUES (%s, %s, %s, %s, %s)",
-            (
-                self.order_id,
-                self.customer.member_id if isinstance(self.customer, Member) else 'NON-MEMBER',
-                self.total_amount,
-                self.status,
-                self.timestamp
-            )
-        )
-        
-        # Save order items
-        for item in self.items:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Save order; completed_at tells the sales summary refresh which hours changed
             cursor.execute(
-                "INSERT INTO order_items (order_id, menu_item_id) VALUES (%s, %s)",
-                (self.order_id, item.id)
+                "INSERT INTO orders (order_id, customer_id, total_amount, status, timestamp, completed_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                (
+                    self.order_id,
+                    self.customer.member_id if isinstance(self.customer, Member) else 'NON-MEMBER',
+                    self.total_amount,
+                    self.status,
+                    self.timestamp,
+                    datetime.now()
+                )
             )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
\ No newline at end of file
+            
+            # Save order items in one multi-row INSERT
+            if self.items:
+                execute_values(
+                    cursor,
+                    "INSERT INTO order_items (order_id, menu_item_id) VALUES %s",
+                    [(self.order_id, item.id) for item in self.items]
+                )
+            
+            cursor.close()
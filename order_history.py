@@ -0,0 +1,113 @@
+"""
+A customer's past orders, newest first, one page at a time.
+
+Pages use keyset pagination: each page starts strictly after the
+``(timestamp, order_id)`` of the last order of the previous one, so fetching
+page 100 costs the same as page 1 and orders placed meanwhile never shift or
+repeat rows. A page is one query that picks the page's orders from the
+``(customer_id, timestamp, order_id)`` index and joins their items.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, List, Optional, Tuple
+from db_utils import pooled_connection
+
+# Position after which the next page starts: (timestamp, order_id) of the last order shown
+HistoryCursor = Tuple[datetime, str]
+
+class OrderSummary:
+    """A past order as stored: its totals and the ids of the dishes in it"""
+    __slots__ = ('order_id', 'customer_id', 'total_amount', 'status', 'timestamp', 'menu_item_ids')
+    
+    def __init__(self, order_id: str, customer_id: str, total_amount: Decimal, status: str,
+                 timestamp: datetime, menu_item_ids: List[int]):
+        self.order_id = order_id
+        self.customer_id = customer_id
+        self.total_amount = total_amount
+        self.status = status
+        self.timestamp = timestamp
+        self.menu_item_ids = menu_item_ids
+    
+    @property
+    def cursor(self) -> HistoryCursor:
+        return (self.timestamp, self.order_id)
+
+class HistoryPage:
+    """Orders of one page, and the cursor of the page after it (None on the last page)"""
+    def __init__(self, orders: List[OrderSummary], next_cursor: Optional[HistoryCursor]):
+        self.orders = orders
+        self.next_cursor = next_cursor
+    
+    def __iter__(self) -> Iterator[OrderSummary]:
+        return iter(self.orders)
+    
+    def __len__(self) -> int:
+        return len(self.orders)
+
+def fetch_order_history_page(customer_id: str, page_size: int = 20,
+                             after: Optional[HistoryCursor] = None) -> HistoryPage:
+    """The customer's ``page_size`` most recent orders placed before ``after`` (or overall), with their items"""
+    keyset = "AND (timestamp, order_id) < (%s, %s) " if after else ""
+    # One extra order tells whether another page follows
+    params = [customer_id, *(after or ()), page_size + 1]
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT o.order_id, o.total_amount, o.status, o.timestamp, oi.menu_item_id "
+            "FROM (SELECT order_id, total_amount, status, timestamp FROM orders "
+            "      WHERE customer_id = %s " + keyset +
+            "      ORDER BY timestamp DESC, order_id DESC LIMIT %s) o "
+            "LEFT JOIN order_items oi ON oi.order_id = o.order_id "
+            "ORDER BY o.timestamp DESC, o.order_id DESC",
+            params
+        )
+        
+        # Rows of an order are adjacent; fold them into one summary per order
+        orders: List[OrderSummary] = []
+        for order_id, total_amount, status, timestamp, menu_item_id in cursor.fetchall():
+            if not orders or orders[-1].order_id != order_id:
+                orders.append(OrderSummary(order_id, customer_id, total_amount, status, timestamp, []))
+            if menu_item_id is not None:
+                orders[-1].menu_item_ids.append(menu_item_id)
+        
+        cursor.close()
+    
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        return HistoryPage(orders, orders[-1].cursor)
+    return HistoryPage(orders, None)
+
+class OrderHistory:
+    """
+    Lazily loaded order history of one customer.
+    
+    Nothing is read until it is used; iterating it fetches ``page_size``
+    orders at a time, and ``page()`` fetches a single page for paged views.
+    """
+    def __init__(self, customer_id: Optional[str], page_size: int = 20):
+        self.customer_id = customer_id
+        self.page_size = page_size
+    
+    def page(self, after: Optional[HistoryCursor] = None, page_size: Optional[int] = None) -> HistoryPage:
+        if self.customer_id is None:
+            return HistoryPage([], None)
+        return fetch_order_history_page(self.customer_id, page_size or self.page_size, after)
+    
+    def pages(self) -> Iterator[HistoryPage]:
+        after = None
+        while True:
+            page = self.page(after)
+            if page.orders:
+                yield page
+            if page.next_cursor is None:
+                return
+            after = page.next_cursor
+    
+    def __iter__(self) -> Iterator[OrderSummary]:
+        for page in self.pages():
+            yield from page
+    
+    def recent(self, limit: int) -> List[OrderSummary]:
+        """The ``limit`` most recent orders, in one query"""
+        return self.page(page_size=limit).orders
@@ -0,0 +1,149 @@
+"""
+Dish popularity counters for the "Favorite Dishes" panel.
+
+Counts are kept per scope: every order ('all'), per menu category and per
+meal time. They are bumped as orders complete instead of being re-aggregated
+from order_items: Order.complete_order adds the order's dishes to the
+dish_popularity table in its transaction, and Restaurant.complete_order
+applies the same increments to the in-memory PopularityIndex, which keeps
+each scope ranked so the top k dishes are read off without sorting the menu.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from db_utils import execute_values, pooled_connection
+from menu_item import MenuItem
+
+SCOPE_ALL = 'all'
+SCOPE_CATEGORY = 'category'
+SCOPE_MEAL_TIME = 'meal_time'
+
+# (meal time, first hour) in order; keep in step with the backfill in migrations.py
+MEAL_TIMES = [('Breakfast', 5), ('Lunch', 11), ('Dinner', 16)]
+
+def meal_time_for(timestamp: datetime) -> str:
+    """The meal an order placed at ``timestamp`` belongs to; late night counts as dinner"""
+    meal_time = MEAL_TIMES[-1][0]
+    for name, first_hour in MEAL_TIMES:
+        if timestamp.hour >= first_hour:
+            meal_time = name
+    return meal_time
+
+def dish_counts(items: Iterable[MenuItem], meal_time: str) -> Dict[Tuple[str, str, int], int]:
+    """Increments one order makes, keyed by (scope, scope value, menu item id)"""
+    counts: Dict[Tuple[str, str, int], int] = Counter()
+    for item in items:
+        counts[(SCOPE_ALL, '', item.id)] += 1
+        counts[(SCOPE_CATEGORY, item.category, item.id)] += 1
+        counts[(SCOPE_MEAL_TIME, meal_time, item.id)] += 1
+    return counts
+
+def increment_dish_counts_in_db(counts: Dict[Tuple[str, str, int], int]):
+    """Add ``counts`` to dish_popularity in one multi-row upsert"""
+    if not counts:
+        return
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Increment rather than overwrite, so terminals never lose each other's counts
+        execute_values(
+            cursor,
+            "INSERT INTO dish_popularity (scope, scope_value, menu_item_id, count) VALUES %s "
+            "ON CONFLICT (scope, scope_value, menu_item_id) DO UPDATE SET count = dish_popularity.count + EXCLUDED.count",
+            [(scope, value, menu_item_id, count) for (scope, value, menu_item_id), count in counts.items()]
+        )
+        
+        cursor.close()
+
+class _RankedCounts:
+    """Counts for one scope plus a list of (-count, menu_item_id) kept in sorted order"""
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.ranking: List[Tuple[int, int]] = []
+    
+    def add(self, menu_item_id: int, amount: int):
+        old = self.counts.get(menu_item_id, 0)
+        if old:
+            del self.ranking[bisect_left(self.ranking, (-old, menu_item_id))]
+        new = old + amount
+        self.counts[menu_item_id] = new
+        insort(self.ranking, (-new, menu_item_id))
+    
+    def discard(self, menu_item_id: int):
+        old = self.counts.pop(menu_item_id, None)
+        if old is not None:
+            del self.ranking[bisect_left(self.ranking, (-old, menu_item_id))]
+
+class PopularityIndex:
+    """Thread-safe, incrementally updated dish counts with top-k lookups"""
+    def __init__(self):
+        self._scopes: Dict[Tuple[str, str], _RankedCounts] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, counts: Dict[Tuple[str, str, int], int]):
+        """Apply increments keyed by (scope, scope value, menu item id)"""
+        with self._lock:
+            for (scope, value, menu_item_id), amount in counts.items():
+                ranked = self._scopes.get((scope, value))
+                if ranked is None:
+                    ranked = self._scopes[(scope, value)] = _RankedCounts()
+                ranked.add(menu_item_id, amount)
+    
+    def record_order(self, items: Iterable[MenuItem], meal_time: str):
+        self.add(dish_counts(items, meal_time))
+    
+    def remove_item(self, menu_item_id: int):
+        """Forget a dish, e.g. one taken off the menu"""
+        with self._lock:
+            for ranked in self._scopes.values():
+                ranked.discard(menu_item_id)
+    
+    def top(self, k: int, category: Optional[str] = None, meal_time: Optional[str] = None,
+            include: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, int]]:
+        """
+        The ``k`` most ordered dishes as (menu_item_id, count), most popular first.
+        
+        Pass ``category`` or ``meal_time`` (not both) to rank within that
+        scope; ``include`` skips dishes it returns False for, e.g. ones no
+        longer on the menu.
+        """
+        if category is not None and meal_time is not None:
+            raise ValueError("Rank by category or by meal time, not both")
+        if category is not None:
+            key = (SCOPE_CATEGORY, category)
+        elif meal_time is not None:
+            key = (SCOPE_MEAL_TIME, meal_time)
+        else:
+            key = (SCOPE_ALL, '')
+        
+        with self._lock:
+            ranked = self._scopes.get(key)
+            if ranked is None:
+                return []
+            top = []
+            for negative_count, menu_item_id in ranked.ranking:
+                if len(top) == k:
+                    break
+                if include is None or include(menu_item_id):
+                    top.append((menu_item_id, -negative_count))
+            return top
+    
+    @classmethod
+    def load_from_db(cls, batch_size: int = 10000) -> 'PopularityIndex':
+        """Build the index from the dish_popularity table"""
+        index = cls()
+        index.add({(scope, value, menu_item_id): count for scope, value, menu_item_id, count in _stream_counts(batch_size)})
+        return index
+
+def _stream_counts(batch_size: int) -> Iterator[Tuple[str, str, int, int]]:
+    with pooled_connection() as conn:
+        cursor = conn.cursor(name='dish_popularity_stream')
+        cursor.itersize = batch_size
+        
+        cursor.execute("SELECT scope, scope_value, menu_item_id, count FROM dish_popularity WHERE count > 0")
+        for scope, value, menu_item_id, count in cursor:
+            yield scope, value, menu_item_id, count
+        
+        cursor.close()
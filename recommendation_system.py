@@ -1,40 +1,371 @@
 import random
-from typing import Dict, List
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+import scipy.sparse as sp
 from menu_item import MenuItem
 from customer import Member
 
 class RecommendationSystem:
+    """
+    Item-to-item collaborative filtering over members' favorite_items counts.
+    
+    Each member is a sparse row of log-damped order counts over menu items.
+    Rather than keeping that member x item matrix X around, the system keeps
+    its Gram matrix C = X^T X (weighted item co-occurrence) as a CSR matrix;
+    cosine similarity between items i and j is C[i, j] / (|x_i| |x_j|), where
+    the squared norms are C's diagonal. Scoring a member only touches the
+    rows of C for the items they have ordered.
+    
+    Completed orders update C incrementally: a member's row changing from u
+    to v changes C by v v^T - u u^T, which only involves the handful of items
+    that member has ordered. Those deltas collect in a small per-row dict and
+    are merged into the CSR matrix once enough have built up.
+    
+    For serving, compute_batch_recommendations scores every member at once
+    (X C in row chunks) and keeps the top N menu ids per member in one int32
+    array; get_recommendations answers from it with a dict lookup until the
+    member orders again, then falls back to scoring on demand.
+    """
+    # Merge pending deltas into the CSR matrix past this many entries
+    MERGE_THRESHOLD = 50000
+    
     def __init__(self):
         self.menu_items: Dict[int, MenuItem] = {}
+        self._lock = threading.RLock()
+        self._item_index: Dict[int, int] = {}  # menu_item_id: column
+        self._item_ids: List[int] = []  # column: menu_item_id
+        self._cooccurrence = sp.csr_matrix((0, 0), dtype=np.float64)
+        self._norms_sq = np.zeros(0, dtype=np.float64)
+        self._on_menu = np.zeros(0, dtype=bool)
+        self._pending: Dict[int, Dict[int, float]] = {}  # row: {column: delta}
+        self._pending_count = 0
+        self._menu_list: Optional[List[MenuItem]] = None  # cached list for random sampling
+        
+        # Weighted member x item matrix as last loaded, plus members changed since
+        self._interactions = sp.csr_matrix((0, 0), dtype=np.float64)
+        self._member_index: Dict[str, int] = {}
+        self._member_overrides: Dict[str, Dict[int, int]] = {}
+        
+        # Precomputed top-N menu ids per member (-1 pads short rows)
+        self._batch_ids = np.zeros((0, 0), dtype=np.int32)
+        self._batch_rows: Dict[str, int] = {}
+        self._batch_running = False
+        self._changed_during_batch: Set[str] = set()
+        self.batch_computed_at: Optional[datetime] = None
     
     def add_menu_item(self, item: MenuItem):
-        self.menu_items[item.id] = item
+        with self._lock:
+            self.menu_items[item.id] = item
+            self._menu_list = None
+            self._add_columns([item.id])
+            self._on_menu[self._item_index[item.id]] = True
+    
+    def remove_menu_item(self, menu_item_id: int):
+        with self._lock:
+            self.menu_items.pop(menu_item_id, None)
+            self._menu_list = None
+            column = self._item_index.get(menu_item_id)
+            if column is not None:
+                self._on_menu[column] = False
+    
+    def set_menu_items(self, items: Iterable[MenuItem]):
+        """Replace the known menu wholesale"""
+        with self._lock:
+            self.menu_items = {item.id: item for item in items}
+            self._menu_list = None
+            self._add_columns(self.menu_items)
+            self._on_menu[:] = False
+            self._on_menu[[self._item_index[menu_item_id] for menu_item_id in self.menu_items]] = True
+    
+    def load_interactions(self, rows: Iterable[Tuple[str, int, int]]):
+        """
+        Rebuild the model from (member_id, menu_item_id, count) rows,
+        e.g. Member.load_favorite_counts_from_db()
+        """
+        member_index: Dict[str, int] = {}
+        member_rows: List[int] = []
+        menu_item_ids: List[int] = []
+        weights: List[float] = []
+        for member_id, menu_item_id, count in rows:
+            if count > 0:
+                member_rows.append(member_index.setdefault(member_id, len(member_index)))
+                menu_item_ids.append(menu_item_id)
+                weights.append(count)
+        
+        with self._lock:
+            self._add_columns(menu_item_ids)
+            item_columns = [self._item_index[menu_item_id] for menu_item_id in menu_item_ids]
+            num_items = len(self._item_ids)
+            interactions = sp.csr_matrix(
+                (self._weight(np.asarray(weights, dtype=np.float64)), (member_rows, item_columns)),
+                shape=(len(member_index), num_items)
+            )
+            self._cooccurrence = (interactions.T @ interactions).tocsr()
+            self._norms_sq = self._cooccurrence.diagonal().astype(np.float64)
+            self._pending.clear()
+            self._pending_count = 0
+            self._interactions = interactions
+            self._member_index = member_index
+            self._member_overrides.clear()
+            self._batch_ids = np.zeros((0, 0), dtype=np.int32)
+            self._batch_rows = {}
+            self.batch_computed_at = None
+    
+    def update_member(self, before: Dict[int, int], after: Dict[int, int], member_id: Optional[str] = None):
+        """
+        Fold a change of one member's favorite counts (e.g. a completed order) into
+        the model; with ``member_id`` the member's precomputed list is retired too
+        """
+        if member_id is not None:
+            with self._lock:
+                self._member_overrides[member_id] = dict(after)
+                self._batch_rows.pop(member_id, None)
+                if self._batch_running:
+                    self._changed_during_batch.add(member_id)
+        
+        menu_item_ids = [menu_item_id for menu_item_id in set(before) | set(after)
+                         if before.get(menu_item_id, 0) != after.get(menu_item_id, 0)]
+        if not menu_item_ids:
+            return
+        # Only co-occurrences with a changed item move, but those pair with every item the member has
+        menu_item_ids = list(set(menu_item_ids) | set(after) | set(before))
+        
+        with self._lock:
+            self._add_columns(menu_item_ids)
+            columns = np.array([self._item_index[menu_item_id] for menu_item_id in menu_item_ids])
+            old = self._weight(np.array([before.get(menu_item_id, 0) for menu_item_id in menu_item_ids], dtype=np.float64))
+            new = self._weight(np.array([after.get(menu_item_id, 0) for menu_item_id in menu_item_ids], dtype=np.float64))
+            delta = np.outer(new, new) - np.outer(old, old)
+            
+            self._norms_sq[columns] += np.diag(delta)
+            for i, row in enumerate(columns):
+                pending_row = self._pending.setdefault(int(row), {})
+                for j, column in enumerate(columns):
+                    if delta[i, j]:
+                        if column not in pending_row:
+                            self._pending_count += 1
+                        pending_row[int(column)] = pending_row.get(int(column), 0.0) + delta[i, j]
+            
+            if self._pending_count > self.MERGE_THRESHOLD:
+                self._merge_pending()
+    
+    def score_items(self, favorite_items: Dict[int, int]) -> np.ndarray:
+        """Cosine item-to-item score of every known item (by column) for a set of favorites"""
+        with self._lock:
+            known = [(self._item_index[menu_item_id], count) for menu_item_id, count in favorite_items.items()
+                     if count > 0 and menu_item_id in self._item_index]
+            scores = np.zeros(len(self._item_ids), dtype=np.float64)
+            if not known:
+                return scores
+            
+            rows = np.array([column for column, _ in known])
+            norms = np.sqrt(np.maximum(self._norms_sq, 0.0))
+            safe_norms = np.where(norms > 0, norms, np.inf)
+            query = self._weight(np.array([count for _, count in known], dtype=np.float64)) / safe_norms[rows]
+            
+            scores += self._cooccurrence[rows].T @ query
+            for row, weight in zip(rows, query):
+                for column, delta in self._pending.get(int(row), {}).items():
+                    scores[column] += weight * delta
+            scores /= safe_norms
+            return scores
     
     def get_personal_recommendations(self, member: Member, num_recommendations: int = 3) -> List[MenuItem]:
+        """
+        Menu items most similar to what the member orders, excluding dishes they
+        already have; padded with their own favorites and then random picks
+        """
         if not member.favorite_items:
             return self.get_random_recommendations(num_recommendations)
         
+        with self._lock:
+            scores = self.score_items(member.favorite_items)
+            candidates = self._on_menu & (scores > 0)
+            for menu_item_id in member.favorite_items:
+                column = self._item_index.get(menu_item_id)
+                if column is not None:
+                    candidates[column] = False
+            
+            recommendations = [self.menu_items[self._item_ids[column]]
+                               for column in self._top_k(scores, candidates, num_recommendations)]
+        
+        return self._pad_recommendations(recommendations, member, num_recommendations)
+    
+    def get_recommendations(self, member: Member, num_recommendations: int = 3) -> List[MenuItem]:
+        """Serve the member's precomputed list if it is still fresh, otherwise score on demand"""
+        with self._lock:
+            row = self._batch_rows.get(member.member_id)
+            if row is not None and num_recommendations <= self._batch_ids.shape[1]:
+                recommendations = [self.menu_items[menu_item_id]
+                                   for menu_item_id in self._batch_ids[row].tolist()
+                                   if menu_item_id in self.menu_items][:num_recommendations]
+                return self._pad_recommendations(recommendations, member, num_recommendations)
+        return self.get_personal_recommendations(member, num_recommendations)
+    
+    def compute_batch_recommendations(self, num_recommendations: int = 10, chunk_size: int = 256):
+        """
+        Precompute the top ``num_recommendations`` unseen menu items for every member.
+        
+        Scores for a chunk of members are (X_chunk D) C D with D the inverse item
+        norms, so each chunk is one sparse product plus a row-wise argpartition.
+        The model is snapshotted first and the work runs outside the lock, so
+        recommendations keep being served meanwhile; members who order during
+        the run are left out and scored on demand.
+        """
+        with self._lock:
+            if self._pending:
+                self._merge_pending()
+            self._fold_member_overrides()
+            interactions = self._interactions.copy()
+            cooccurrence = self._cooccurrence.copy()
+            norms_sq = self._norms_sq.copy()
+            on_menu = self._on_menu.copy()
+            item_ids = np.array(self._item_ids, dtype=np.int32)
+            member_ids = list(self._member_index)
+            self._batch_running = True
+            self._changed_during_batch = set()
+        
+        try:
+            norms = np.sqrt(np.maximum(norms_sq, 0.0))
+            inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+            queries = (interactions @ sp.diags(inverse_norms)).tocsr()
+            k = min(num_recommendations, len(item_ids))
+            top_ids = np.full((len(member_ids), num_recommendations), -1, dtype=np.int32)
+            
+            for start in range(0, len(member_ids), chunk_size):
+                end = min(start + chunk_size, len(member_ids))
+                scores = (queries[start:end] @ cooccurrence).toarray()
+                scores *= inverse_norms
+                seen_rows, seen_columns = interactions[start:end].nonzero()
+                scores[seen_rows, seen_columns] = 0.0
+                scores[:, ~on_menu] = 0.0
+                if k == 0:
+                    continue
+                
+                best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(scores, best, axis=1)
+                order = np.argsort(-best_scores, axis=1, kind='stable')
+                best = np.take_along_axis(best, order, axis=1)
+                best_scores = np.take_along_axis(best_scores, order, axis=1)
+                chunk_ids = item_ids[best]
+                chunk_ids[best_scores <= 0] = -1
+                top_ids[start:end, :k] = chunk_ids
+        except Exception:
+            with self._lock:
+                self._batch_running = False
+            raise
+        
+        with self._lock:
+            self._batch_ids = top_ids
+            self._batch_rows = {member_id: row for row, member_id in enumerate(member_ids)
+                                if member_id not in self._changed_during_batch}
+            self._batch_running = False
+            self._changed_during_batch = set()
+            self.batch_computed_at = datetime.now()
+    
+    def get_random_recommendations(self, num_recommendations: int) -> List[MenuItem]:
+        available_items = self._available_items()
+        return random.sample(
+            available_items,
+            min(num_recommendations, len(available_items))
+        )
+    
+    def _available_items(self) -> List[MenuItem]:
+        """Menu items as a list, rebuilt only after the menu changes"""
+        items = self._menu_list
+        if items is None:
+            items = self._menu_list = list(self.menu_items.values())
+        return items
+    
+    def _pad_recommendations(self, recommendations: List[MenuItem], member: Member,
+                             num_recommendations: int) -> List[MenuItem]:
+        """Top up a short list with the member's own favorites, then distinct random items"""
+        chosen = {item.id for item in recommendations}
         sorted_favorites = sorted(
             member.favorite_items.items(),
             key=lambda x: x[1],
             reverse=True
         )
-        
-        recommendations = []
-        for menu_id, _ in sorted_favorites[:num_recommendations]:
-            if menu_id in self.menu_items:
+        for menu_id, _ in sorted_favorites:
+            if len(recommendations) >= num_recommendations:
+                break
+            if menu_id in self.menu_items and menu_id not in chosen:
                 recommendations.append(self.menu_items[menu_id])
+                chosen.add(menu_id)
         
-        while len(recommendations) < num_recommendations:
-            random_item = self.get_random_recommendations(1)[0]
-            if random_item not in recommendations:
-                recommendations.append(random_item)
+        missing = num_recommendations - len(recommendations)
+        if missing > 0:
+            remaining = [item for item in self._available_items() if item.id not in chosen]
+            recommendations.extend(random.sample(remaining, min(missing, len(remaining))))
         
         return recommendations
     
-    def get_random_recommendations(self, num_recommendations: int) -> List[MenuItem]:
-        available_items = list(self.menu_items.values())
-        return random.sample(
-            available_items,
-            min(num_recommendations, len(available_items))
+    @staticmethod
+    def _weight(counts: np.ndarray) -> np.ndarray:
+        """Damp raw order counts so a few very heavy regulars don't dominate similarities"""
+        return np.log1p(counts)
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+        """Columns of the k highest scores among candidates, best first"""
+        columns = np.flatnonzero(candidates)
+        if k <= 0:
+            return columns[:0]
+        if len(columns) > k:
+            columns = columns[np.argpartition(-scores[columns], k - 1)[:k]]
+        return columns[np.argsort(-scores[columns], kind='stable')]
+    
+    def _add_columns(self, menu_item_ids: Iterable[int]):
+        """Give items seen for the first time a matrix column, growing the model once for all of them"""
+        new_ids = [menu_item_id for menu_item_id in dict.fromkeys(menu_item_ids) if menu_item_id not in self._item_index]
+        if not new_ids:
+            return
+        for menu_item_id in new_ids:
+            self._item_index[menu_item_id] = len(self._item_ids)
+            self._item_ids.append(menu_item_id)
+        size = len(self._item_ids)
+        self._cooccurrence.resize((size, size))
+        self._interactions.resize((self._interactions.shape[0], size))
+        self._norms_sq = np.concatenate([self._norms_sq, np.zeros(len(new_ids))])
+        self._on_menu = np.concatenate([self._on_menu, np.zeros(len(new_ids), dtype=bool)])
+    
+    def _fold_member_overrides(self):
+        """Rewrite the rows of members whose counts changed since the interactions were loaded"""
+        if not self._member_overrides:
+            return
+        for member_id in self._member_overrides:
+            self._member_index.setdefault(member_id, len(self._member_index))
+        changed_rows = np.array([self._member_index[member_id] for member_id in self._member_overrides])
+        
+        base = self._interactions.tocoo()
+        keep = ~np.isin(base.row, changed_rows)
+        rows = [base.row[keep]]
+        columns = [base.col[keep]]
+        values = [base.data[keep]]
+        for member_id, favorites in self._member_overrides.items():
+            counts = {menu_item_id: count for menu_item_id, count in favorites.items() if count > 0}
+            rows.append(np.full(len(counts), self._member_index[member_id]))
+            columns.append(np.array([self._item_index[menu_item_id] for menu_item_id in counts], dtype=np.int64))
+            values.append(self._weight(np.array(list(counts.values()), dtype=np.float64)))
+        
+        self._interactions = sp.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(len(self._member_index), len(self._item_ids))
         )
+        self._member_overrides.clear()
+    
+    def _merge_pending(self):
+        rows, columns, values = [], [], []
+        for row, deltas in self._pending.items():
+            for column, value in deltas.items():
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+        size = len(self._item_ids)
+        delta = sp.csr_matrix((values, (rows, columns)), shape=(size, size))
+        self._cooccurrence = (self._cooccurrence + delta).tocsr()
+        self._cooccurrence.eliminate_zeros()
+        self._pending.clear()
+        self._pending_count = 0
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
 import random
+import threading
+import functools
 from PIL import Image
 import io
 import base64
@@ -10,16 +13,43 @@ import base64
 from restaurant import Restaurant
 from customer import Member, Customer
 from menu_item import MenuItem
+from menu_search import MenuSearchIndex
 from order import Order
 from allergic import Allergy
-from db_utils import get_db_connection, initialize_database
-
-# Initialize the restaurant
-restaurant = Restaurant("Flavorithm Restaurant")
+from migrations import check_schema_version
+import analytics
+import instrumentation
 
 # Setting page config
 st.set_page_config(page_title="Flavorithm Restaurant", layout="wide")
 
+# DEV_PANEL=1 shows the database work of each rerun in the sidebar (see instrumentation.py)
+DEV_PANEL = os.environ.get("DEV_PANEL", "") not in ("", "0")
+DEV_TRACE_HISTORY = 50
+if DEV_PANEL:
+    instrumentation.enable()
+    instrumentation.start_trace("rerun")
+
+@st.cache_resource(show_spinner="Loading menu and members...")
+def get_restaurant() -> Restaurant:
+    """
+    Build the restaurant once per process and share it across reruns and sessions.
+    
+    Use the Restaurant refresh_* / invalidate_member hooks when data changes;
+    get_restaurant.clear() forces a full reload on the next rerun.
+    """
+    check_schema_version()
+    restaurant = Restaurant("Flavorithm Restaurant")
+    # Precompute everyone's recommendations without holding up the first page;
+    # until it finishes they are computed per request
+    threading.Thread(target=restaurant.refresh_batch_recommendations, daemon=True).start()
+    return restaurant
+
+# Initialize the restaurant
+restaurant = get_restaurant()
+# Menu edits made by other workers (prices, allergens) show up on the next rerun
+restaurant.sync_menu()
+
 # Custom CSS to match the style from the HTML
 st.markdown("""
 <style>
@@ -119,7 +149,7 @@ st.markdown("""
         margin-right: 8px;
         color: #aaa;
     }
-
+    
     /* Sidebar styles */
     [data-testid="stSidebar"] {
         background-color: white;
@@ -146,20 +176,29 @@ if 'children_count' not in st.session_state:
     st.session_state.children_count = 2
 if 'older_count' not in st.session_state:
     st.session_state.older_count = 1
+if 'menu_page' not in st.session_state:
+    st.session_state.menu_page = 0
+if 'history_cursors' not in st.session_state:
+    st.session_state.history_cursors = []
+
+# Menu rows rendered per page; each row is three columns and two buttons
+MENU_PAGE_SIZE = 20
+# Orders fetched per page of the order history
+HISTORY_PAGE_SIZE = 10
 
 # Mock data for demonstration - we'll use this instead of actual DB data 
 # in case the DB connection fails
 menu_items = {
-    1: {"name": "Tom Yum Kung", "price": 120, "category": "Soup", "popularity": 120},
-    2: {"name": "Pad Thai", "price": 100, "category": "Noodle", "popularity": 100},
-    3: {"name": "Rice", "price": 93, "category": "Side", "popularity": 93},
-    4: {"name": "Fresh Water", "price": 90, "category": "Drink", "popularity": 90},
-    5: {"name": "Stir fried Thai basil", "price": 110, "category": "Main", "popularity": 85},
-    6: {"name": "Green Curry", "price": 130, "category": "Main", "popularity": 75},
-    7: {"name": "Omelette", "price": 100, "category": "Main", "popularity": 100},
-    8: {"name": "Fries Pork with Garlic", "price": 99, "category": "Main", "popularity": 99},
-    9: {"name": "Som Tam", "price": 80, "category": "Salad", "popularity": 80},
-    10: {"name": "Satay", "price": 130, "category": "Appetizer", "popularity": 130}
+    1: {"name": "Tom Yum Kung", "price": 120, "category": "Soup"},
+    2: {"name": "Pad Thai", "price": 100, "category": "Noodle"},
+    3: {"name": "Rice", "price": 93, "category": "Side"},
+    4: {"name": "Fresh Water", "price": 90, "category": "Drink"},
+    5: {"name": "Stir fried Thai basil", "price": 110, "category": "Main"},
+    6: {"name": "Green Curry", "price": 130, "category": "Main"},
+    7: {"name": "Omelette", "price": 100, "category": "Main"},
+    8: {"name": "Fries Pork with Garlic", "price": 99, "category": "Main"},
+    9: {"name": "Som Tam", "price": 80, "category": "Salad"},
+    10: {"name": "Satay", "price": 130, "category": "Appetizer"}
 }
 
 allergies = [
@@ -193,10 +232,25 @@ def remove_from_cart(item_id):
         else:
             del st.session_state.cart[item_id]
 
-def get_top_items(items_dict, sort_key="popularity", limit=4):
-    """Get top items sorted by a key"""
-    sorted_items = sorted(items_dict.items(), key=lambda x: x[1][sort_key], reverse=True)
-    return {k: v for k, v in sorted_items[:limit]}
+# Function to move between menu pages
+def change_menu_page(step, page_count):
+    st.session_state.menu_page = min(max(st.session_state.menu_page + step, 0), page_count - 1)
+
+# Function to start a new search from the first page of results
+def reset_menu_page():
+    st.session_state.menu_page = 0
+
+@st.cache_resource
+def get_menu_search() -> MenuSearchIndex:
+    """
+    Search index over the dishes the order panel lists.
+    
+    The panel still shows the sample menu above, so that is what is indexed;
+    Restaurant.search_menu searches the real menu the same way.
+    """
+    return MenuSearchIndex(
+        MenuItem(item_id, item["name"], item["price"], item["category"]) for item_id, item in menu_items.items()
+    )
 
 def render_counter(label, counter_name, col):
     """Render a counter with +/- buttons"""
@@ -207,9 +261,251 @@ def render_counter(label, counter_name, col):
     counter_col2.write(f"<div style='text-align: center;'>{st.session_state[counter_name]}</div>", unsafe_allow_html=True)
     counter_col3.button("+", key=f"inc_{counter_name}", on_click=increment_counter, args=(counter_name,))
 
+def traced_fragment(func):
+    """
+    st.fragment whose reruns get their own trace in the dev panel.
+    
+    A fragment rerun runs only the fragment, so the trace started at the top
+    of the script never sees it. During a full rerun the fragment's queries
+    belong to that rerun's trace instead.
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        if not DEV_PANEL or instrumentation.current_trace() is not None:
+            return func(*args, **kwargs)
+        instrumentation.start_trace(func.__name__)
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            # e.g. st.rerun(): this run is abandoned, panel and all
+            instrumentation.stop_trace()
+            raise
+        # A fragment rerun may only draw inside the fragment, not in the sidebar
+        render_dev_panel(instrumentation.stop_trace(), st.container())
+        return result
+    return st.fragment(run)
+
+@traced_fragment
+def render_order_panel():
+    """
+    Menu and cart, rerun on their own.
+    
+    Clicking +/- or paging the menu reruns only this function, not the CSS,
+    sidebar and left-hand sections, and only one page of the menu is built.
+    """
+    cart = st.session_state.cart
+    st.markdown(f"""
+    <div style="font-size: 1.5rem; text-align: right;">🛒 {sum(cart.values())}</div>
+    """, unsafe_allow_html=True)
+    
+    # Main Menu Section
+    st.markdown('<div class="section">', unsafe_allow_html=True)
+    st.markdown('<h3 class="section-title">Main Menu</h3>', unsafe_allow_html=True)
+    
+    # Partial or misspelled names in Thai or English, best matches first
+    query = st.text_input("Search dishes", key="menu_query", placeholder="e.g. tomyum, pad tai, ส้มตำ",
+                          on_change=reset_menu_page)
+    if query:
+        item_ids = [item_id for item_id, _ in get_menu_search().search(query, limit=len(menu_items))]
+        if not item_ids:
+            st.caption("No matching dishes")
+    else:
+        item_ids = list(menu_items)
+    page_count = max(1, -(-len(item_ids) // MENU_PAGE_SIZE))
+    page = min(st.session_state.menu_page, page_count - 1)
+    
+    for item_id in item_ids[page * MENU_PAGE_SIZE:(page + 1) * MENU_PAGE_SIZE]:
+        item = menu_items[item_id]
+        col1, col2, col3 = st.columns([4, 1, 1])
+        
+        col1.write(f"**{item['name']}**")
+        
+        # Get current item count from cart
+        item_count = cart.get(item_id, 0)
+        
+        col2.button("-", key=f"dec_item_{item_id}", on_click=remove_from_cart, args=(item_id,), disabled=item_count == 0)
+        col3.write(f"{item_count}")
+        col3.button("+", key=f"inc_item_{item_id}", on_click=add_to_cart, args=(item_id,))
+    
+    if page_count > 1:
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        prev_col.button("◀ Prev", key="menu_prev", on_click=change_menu_page, args=(-1, page_count), disabled=page == 0)
+        page_col.write(f"<div style='text-align: center;'>Page {page + 1} of {page_count}</div>", unsafe_allow_html=True)
+        next_col.button("Next ▶", key="menu_next", on_click=change_menu_page, args=(1, page_count),
+                        disabled=page == page_count - 1)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Add a total amount section
+    total_amount = sum(menu_items[item_id]["price"] * qty for item_id, qty in cart.items())
+    
+    st.markdown(f"""
+    <div style="background-color: #f0f0f0; padding: 15px; border-radius: 5px; margin-top: 20px;">
+        <h3>Total: ฿{total_amount}</h3>
+        <div style="margin-top: 10px;">
+            {sum(cart.values())} items in cart
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if st.button("Place Order", type="primary"):
+        st.success("Order placed successfully!")
+        # Here you would create a real order in the database
+        # For demo, we'll just clear the cart
+        st.session_state.cart = {}
+        st.rerun(scope="fragment")
+
+# Function to move between order history pages; None goes back to the newer page
+def change_history_page(next_cursor):
+    if next_cursor is None:
+        st.session_state.history_cursors.pop()
+    else:
+        st.session_state.history_cursors.append(next_cursor)
+
+@traced_fragment
+def render_order_history(member_id):
+    """
+    A member's past orders, newest first.
+    
+    Only the page on screen is read: session state keeps the cursor each
+    visited page started after, so Older fetches the next page by keyset and
+    Newer goes back without counting or skipping rows.
+    """
+    st.markdown('<div class="section">', unsafe_allow_html=True)
+    st.markdown('<h3 class="section-title">Order History</h3>', unsafe_allow_html=True)
+    
+    member = restaurant.get_member(member_id)
+    # An id with no member record (the login does not check) has no history
+    customer = member or Customer(st.session_state.member["name"], st.session_state.member["phone"])
+    cursors = st.session_state.history_cursors
+    page = customer.order_history.page(after=cursors[-1] if cursors else None, page_size=HISTORY_PAGE_SIZE)
+    
+    if not page:
+        st.caption("No orders yet" if not cursors else "No older orders")
+    else:
+        menu = restaurant.menu_items
+        st.dataframe(pd.DataFrame([
+            {
+                "Date": order.timestamp.strftime('%Y-%m-%d %H:%M'),
+                "Order": order.order_id,
+                "Dishes": ", ".join(menu[menu_item_id].name if menu_item_id in menu else f"#{menu_item_id}"
+                                    for menu_item_id in order.menu_item_ids),
+                "Total (฿)": float(order.total_amount),
+                "Status": order.status,
+            }
+            for order in page
+        ]), hide_index=True, use_container_width=True)
+    
+    if cursors or page.next_cursor:
+        newer_col, page_col, older_col = st.columns([1, 2, 1])
+        newer_col.button("◀ Newer", key="history_newer", on_click=change_history_page, args=(None,),
+                         disabled=not cursors)
+        page_col.write(f"<div style='text-align: center;'>Page {len(cursors) + 1}</div>", unsafe_allow_html=True)
+        older_col.button("Older ▶", key="history_older", on_click=change_history_page, args=(page.next_cursor,),
+                         disabled=page.next_cursor is None)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.cache_data(ttl=60, show_spinner="Loading sales...")
+def load_sales(start, end, freq):
+    """Roll up new orders, then read the report for a date range; cached for a minute"""
+    analytics.refresh_sales_summary()
+    return (
+        analytics.sales_report(start, end, freq),
+        analytics.sales_totals(start, end),
+        analytics.hour_of_day_profile(start, end),
+    )
+
+def render_sales_dashboard():
+    """Admin view of revenue, items sold, average ticket and the member split"""
+    st.markdown("""
+    <div class="header">
+        <h2>Sales Dashboard</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    range_col, freq_col = st.columns([3, 1])
+    today = datetime.now().date()
+    dates = range_col.date_input("Dates", value=(today - timedelta(days=29), today), max_value=today)
+    granularity = freq_col.radio("Group by", ["Day", "Hour"], horizontal=True)
+    if not isinstance(dates, tuple) or len(dates) != 2:
+        st.info("Pick a start and an end date")
+        return
+    start = datetime.combine(dates[0], datetime.min.time())
+    end = datetime.combine(dates[1] + timedelta(days=1), datetime.min.time())
+    report, totals, profile = load_sales(start, end, "h" if granularity == "Hour" else "D")
+    
+    if not totals["order_count"]:
+        st.info("No completed orders in this period")
+        return
+    
+    metric_cols = st.columns(5)
+    metric_cols[0].metric("Revenue", f"฿{totals['revenue']:,.0f}")
+    metric_cols[1].metric("Orders", f"{totals['order_count']:,.0f}")
+    metric_cols[2].metric("Items sold", f"{totals['items_sold']:,.0f}")
+    metric_cols[3].metric("Average ticket", f"฿{totals['average_ticket']:,.2f}")
+    metric_cols[4].metric("Member share", f"{totals['member_revenue_share']:.0%}")
+    
+    st.subheader("Revenue")
+    st.bar_chart(report[["member_revenue", "non_member_revenue"]].rename(
+        columns={"member_revenue": "Members", "non_member_revenue": "Non-members"}))
+    
+    trend_col, hours_col = st.columns(2)
+    with trend_col:
+        st.subheader("Average ticket")
+        st.line_chart(report["average_ticket"])
+    with hours_col:
+        st.subheader("Orders by hour of day")
+        st.bar_chart(profile["order_count"])
+    
+    st.dataframe(report.round(2), use_container_width=True)
+
+def render_dev_panel(trace, container=st.sidebar):
+    """Queries, connections and time of this rerun, plus a download of recent reruns"""
+    traces = st.session_state.setdefault("dev_traces", [])
+    traces.append(trace)
+    del traces[:-DEV_TRACE_HISTORY]
+    
+    title = "Performance" if trace.label == "rerun" else f"Performance ({trace.label})"
+    with container.expander(title, expanded=False):
+        counter_cols = st.columns(3)
+        counter_cols[0].metric("Queries", len(trace.queries))
+        counter_cols[1].metric("Connections", trace.connections_opened)
+        counter_cols[2].metric("Checkouts", trace.checkouts)
+        time_cols = st.columns(2)
+        time_cols[0].metric("DB time", f"{trace.query_time * 1000:.1f} ms")
+        time_cols[1].metric("Rerun", f"{trace.elapsed * 1000:.0f} ms")
+        
+        summary = trace.summary()
+        if summary:
+            st.dataframe(pd.DataFrame([
+                {
+                    "query": entry["fingerprint"],
+                    "count": entry["count"],
+                    "total ms": round(entry["total_ms"], 2),
+                    "rows": entry["rows"],
+                    "caller": ", ".join(entry["callers"]),
+                }
+                for entry in summary
+            ]), hide_index=True)
+        
+        recent = instrumentation.recent_queries()
+        if recent:
+            st.caption(f"Latency of the last {len(recent)} queries (all sessions)")
+            st.dataframe(pd.DataFrame({
+                "latency": [f"≤ {bound:g} ms" for bound in instrumentation.LATENCY_BUCKETS_MS[:-1]] + ["slower"],
+                "queries": instrumentation.latency_histogram(event.duration for event in recent),
+            }), hide_index=True)
+        
+        export = io.StringIO()
+        instrumentation.export_jsonl(traces, export)
+        st.download_button(f"Download last {len(traces)} reruns (JSONL)", export.getvalue(),
+                           file_name="reruns.jsonl", mime="application/x-ndjson", key=f"dev_export_{trace.label}")
+
 # Set up sidebar
 with st.sidebar:
     st.title("Flavorithm Restaurant")
+    st.radio("Page", ["Dining", "Order history", "Sales dashboard"], key="page", horizontal=True)
     
     # Check if user is already logged in
     if not st.session_state.member:
@@ -230,6 +526,7 @@ with st.sidebar:
                     "phone": tel_number or "099-999-9999",
                     "points": 150
                 }
+                st.session_state.history_cursors = []
                 # Force a rerun to update the UI immediately
                 st.rerun()
     
@@ -249,13 +546,13 @@ with st.sidebar:
                              help="Select Breakfast",
                              type="secondary" if st.session_state.meal_time != "Breakfast" else "primary"):
             st.session_state.meal_time = "Breakfast"
-            
+        
         if meal_cols[1].button("Lunch", 
                              key="lunch_btn", 
                              help="Select Lunch",
                              type="secondary" if st.session_state.meal_time != "Lunch" else "primary"):
             st.session_state.meal_time = "Lunch"
-            
+        
         if meal_cols[2].button("Dinner", 
                              key="dinner_btn", 
                              help="Select Dinner",
@@ -274,12 +571,18 @@ with st.sidebar:
             st.success("Information updated!")
 
 # Main content
-if st.session_state.member:
+if st.session_state.page == "Sales dashboard":
+    render_sales_dashboard()
+
+elif st.session_state.page == "Order history" and st.session_state.member:
+    render_order_history(st.session_state.member["member_id"])
+
+elif st.session_state.member:
     # Header with welcome message
+    # The cart badge is drawn by render_order_panel so it updates on partial reruns
     st.markdown(f"""
     <div class="header">
         <h2>Welcome Khun {st.session_state.member["name"]} {st.session_state.member["surname"]}</h2>
-        <div style="font-size: 1.5rem;">🛒 {sum(st.session_state.cart.values()) if st.session_state.cart else 0}</div>
     </div>
     """, unsafe_allow_html=True)
     
@@ -291,15 +594,18 @@ if st.session_state.member:
         st.markdown('<div class="section">', unsafe_allow_html=True)
         st.markdown('<h3 class="section-title">Favorite Dishes</h3>', unsafe_allow_html=True)
         
-        favorite_items = get_top_items(menu_items, "popularity", 4)
-        for item_id, item in favorite_items.items():
+        # Most ordered dishes for the selected meal, kept ranked as orders complete
+        favorite_dishes = restaurant.top_dishes(4, meal_time=st.session_state.meal_time)
+        if not favorite_dishes:
+            st.caption(f"No {st.session_state.meal_time.lower()} orders yet")
+        for item, times_ordered in favorite_dishes:
             st.markdown(f"""
             <div class="menu-item">
                 <div class="item-name">
                     <span class="arrow-icon">➤</span>
-                    <span>{item["name"]}</span>
+                    <span>{item.name}</span>
                 </div>
-                <span>{item["popularity"]}</span>
+                <span>{times_ordered}</span>
             </div>
             """, unsafe_allow_html=True)
         
@@ -346,42 +652,7 @@ if st.session_state.member:
         st.markdown('</div>', unsafe_allow_html=True)
     
     with right_col:
-        # Main Menu Section
-        st.markdown('<div class="section">', unsafe_allow_html=True)
-        st.markdown('<h3 class="section-title">Main Menu</h3>', unsafe_allow_html=True)
-        
-        for item_id, item in menu_items.items():
-            col1, col2, col3 = st.columns([4, 1, 1])
-            
-            col1.write(f"**{item['name']}**")
-            
-            # Get current item count from cart
-            item_count = st.session_state.cart.get(item_id, 0)
-            
-            col2.button("-", key=f"dec_item_{item_id}", on_click=remove_from_cart, args=(item_id,), disabled=item_count == 0)
-            col3.write(f"{item_count}")
-            col3.button("+", key=f"inc_item_{item_id}", on_click=add_to_cart, args=(item_id,))
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Add a total amount section
-        total_amount = sum(menu_items[item_id]["price"] * qty for item_id, qty in st.session_state.cart.items())
-        
-        st.markdown(f"""
-        <div style="background-color: #f0f0f0; padding: 15px; border-radius: 5px; margin-top: 20px;">
-            <h3>Total: ฿{total_amount}</h3>
-            <div style="margin-top: 10px;">
-                {sum(st.session_state.cart.values())} items in cart
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        if st.button("Place Order", type="primary"):
-            st.success("Order placed successfully!")
-            # Here you would create a real order in the database
-            # For demo, we'll just clear the cart
-            st.session_state.cart = {}
-            st.rerun()
+        render_order_panel()
 
 # If no member is logged in, show a simple login form in the main area
 else:
@@ -408,4 +679,8 @@ else:
                     "phone": tel_number or "099-999-9999",
                     "points": 150
                 }
+                st.session_state.history_cursors = []
                 st.rerun()
+
+if DEV_PANEL:
+    render_dev_panel(instrumentation.stop_trace())
@@ -1,152 +1,251 @@
-from typing import Dict, List, Optional
-from psycopg2.extras import DictCursor
-from db_utils import get_db_connection
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from db_utils import pooled_connection
+from id_generator import get_id_generator
 from menu_item import MenuItem
+from menu_columns import MenuColumns
+from menu_search import MenuSearchIndex
 from customer import Customer, Member
+from member_cache import MemberCache
 from order import Order
+from popularity import PopularityIndex
 from recommendation_system import RecommendationSystem
 
+# Items of a menu, their allergen versions when the columns were built, and the columns
+MenuSnapshot = Tuple[Tuple[MenuItem, ...], Tuple[int, ...], MenuColumns]
+
 class Restaurant:
-    def __init__(self, name: str):
+    """
+    In-memory view of the restaurant's menu and members.
+    
+    One instance is meant to be shared by every session in the process (see
+    ``get_restaurant`` in res.py), so mutations go through ``self._lock`` and the
+    menu dict is replaced rather than mutated in place; readers can keep
+    iterating a snapshot while a refresh swaps in a new one.
+    """
+    def __init__(self, name: str, member_cache_size: int = 1000, member_ttl: Optional[float] = 600,
+                 menu_poll_interval: float = 1.0):
         self.name = name
+        self._lock = threading.RLock()
+        # Read before the menu, so a change committed while loading is picked up by the next sync_menu
+        self.menu_version = MenuItem.current_menu_version()
+        self.menu_poll_interval = menu_poll_interval
+        self._menu_polled_at = time.monotonic()
+        self._menu_sync_lock = threading.Lock()
         self.menu_items: Dict[int, MenuItem] = self._load_menu_items_from_db()
-        self.members: Dict[str, Member] = self._load_members_from_db()
+        # Members are loaded on demand; only recently active diners stay in memory
+        self.members = MemberCache(max_size=member_cache_size, ttl=member_ttl)
         self.orders: List[Order] = []
         self.recommendation_system = RecommendationSystem()
         
-        # Initialize recommendation system with menu items
-        for item in self.menu_items.values():
-            self.recommendation_system.add_menu_item(item)
+        # Initialize recommendation system with menu items and every member's order history
+        self.recommendation_system.set_menu_items(self.menu_items.values())
+        self.menu_search = MenuSearchIndex(self.menu_items.values())
+        self.recommendation_system.load_interactions(Member.load_favorite_counts_from_db())
+        self.popularity = PopularityIndex.load_from_db()
+    
+    @property
+    def menu_items(self) -> Dict[int, MenuItem]:
+        return self._menu_items
+    
+    @menu_items.setter
+    def menu_items(self, menu_items: Dict[int, MenuItem]):
+        # The dict is only ever swapped, so its columns are rebuilt here, and
+        # again only if an item's allergens are edited in place
+        self._menu_columns = self._build_menu_columns(menu_items)
+        self._menu_items = menu_items
+    
+    @staticmethod
+    def _build_menu_columns(menu_items: Dict[int, MenuItem]) -> MenuSnapshot:
+        """The items' columns, with the items and their allergen versions to tell when they go stale"""
+        items = tuple(menu_items.values())
+        # Versions first: an edit made during the build triggers another
+        versions = tuple(item.allergen_version for item in items)
+        return items, versions, MenuColumns(items)
+    
+    @staticmethod
+    def _allergens_edited(items: Tuple[MenuItem, ...], versions: Tuple[int, ...]) -> bool:
+        return any(item.allergen_version != version for item, version in zip(items, versions))
+    
+    @property
+    def menu_columns(self) -> MenuColumns:
+        """Columnar snapshot of the menu, rebuilt on first use after an item's allergens changed"""
+        items, versions, columns = self._menu_columns
+        if self._allergens_edited(items, versions):
+            with self._lock:
+                items, versions, columns = self._menu_columns
+                if self._allergens_edited(items, versions):
+                    self._menu_columns = self._build_menu_columns(self._menu_items)
+                    columns = self._menu_columns[2]
+        return columns
     
     def _load_menu_items_from_db(self) -> Dict[int, MenuItem]:
         """Load all menu items from database"""
-        menu_items = {}
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        
-        cursor.execute("SELECT * FROM menu_items")
-        items = cursor.fetchall()
-        
-        for item in items:
-            menu_item = MenuItem(
-                id=item['id'],
-                name=item['name'],
-                price=float(item['price']),
-                category=item['category']
-            )
-            
-            # Load allergens for menu item
-            cursor.execute(
-                "SELECT allergen FROM menu_allergens WHERE menu_item_id = %s",
-                (menu_item.id,)
-            )
-            allergen_data = cursor.fetchall()
-            
-            menu_item.allergens = [data['allergen'] for data in allergen_data]
-            menu_items[menu_item.id] = menu_item
-        
-        cursor.close()
-        conn.close()
-        
-        return menu_items
+        return MenuItem.load_all_from_db()
+    
+    def add_menu_item(self, item: MenuItem):
+        item.save_to_db()
+        with self._lock:
+            self.menu_items = {**self.menu_items, item.id: item}
+            self.recommendation_system.add_menu_item(item)
+            self.menu_search.add(item)
+    
+    def import_menu_items(self, items: List[MenuItem]):
+        """Bulk-load many menu items (e.g. a new menu) in one transaction"""
+        items = MenuItem.bulk_save_to_db(items)
+        with self._lock:
+            self.menu_items = {**self.menu_items, **{item.id: item for item in items}}
+            for item in items:
+                self.recommendation_system.add_menu_item(item)
+                self.menu_search.add(item)
     
-    def _load_members_from_db(self) -> Dict[str, Member]:
-        """Load all members from database"""
-        members = {}
+    def refresh_menu(self):
+        """Reload the whole menu, e.g. after a bulk change made outside this process"""
+        version = MenuItem.current_menu_version()
+        self.replace_menu(self._load_menu_items_from_db())
+        self.menu_version = max(self.menu_version, version)
+    
+    def sync_menu(self, force: bool = False) -> List[int]:
+        """
+        Pick up menu changes committed by other processes; returns the ids reloaded.
         
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=DictCursor)
+        Costs one single-row read when nothing changed, and at most one per
+        ``menu_poll_interval`` seconds unless ``force`` is set. Only the
+        changed items are reloaded; ones deleted from the database are dropped.
+        """
+        now = time.monotonic()
+        if not force and now - self._menu_polled_at < self.menu_poll_interval:
+            return []
+        # One sync at a time, so a slower one can't apply older rows over a newer one's
+        if not self._menu_sync_lock.acquire(blocking=force):
+            return []
+        try:
+            self._menu_polled_at = now
+            return self._apply_menu_changes()
+        finally:
+            self._menu_sync_lock.release()
+    
+    def _apply_menu_changes(self) -> List[int]:
+        version = MenuItem.current_menu_version()
+        known = self.menu_version
+        if version <= known:
+            return []
+        changed = MenuItem.changed_since(known, version)
+        items = MenuItem.load_many_from_db(changed)
         
-        cursor.execute("SELECT * FROM members")
-        member_data = cursor.fetchall()
+        with self._lock:
+            menu_items = dict(self.menu_items)
+            for menu_item_id in changed:
+                item = items.get(menu_item_id)
+                if item:
+                    menu_items[menu_item_id] = item
+                    self.recommendation_system.add_menu_item(item)
+                    self.menu_search.add(item)
+                else:
+                    menu_items.pop(menu_item_id, None)
+                    self.recommendation_system.remove_menu_item(menu_item_id)
+                    self.menu_search.remove(menu_item_id)
+                    self.popularity.remove_item(menu_item_id)
+            self.menu_items = menu_items
+            self.menu_version = max(self.menu_version, version)
+        return list(changed)
+    
+    def replace_menu(self, menu_items: Dict[int, MenuItem]):
+        """Swap in an already loaded menu"""
+        with self._lock:
+            self.menu_items = menu_items
+            self.recommendation_system.set_menu_items(menu_items.values())
+            self.menu_search.rebuild(menu_items.values())
+    
+    def refresh_menu_item(self, menu_item_id: int) -> Optional[MenuItem]:
+        """Reload a single menu item that changed in the database, dropping it if it was deleted"""
+        item = MenuItem.load_from_db(menu_item_id)
+        with self._lock:
+            menu_items = dict(self.menu_items)
+            if item:
+                menu_items[item.id] = item
+                self.recommendation_system.add_menu_item(item)
+                self.menu_search.add(item)
+            else:
+                menu_items.pop(menu_item_id, None)
+                self.recommendation_system.remove_menu_item(menu_item_id)
+                self.menu_search.remove(menu_item_id)
+                self.popularity.remove_item(menu_item_id)
+            self.menu_items = menu_items
+        return item
+    
+    def refresh_member(self, member_id: str) -> Optional[Member]:
+        """Reload a member that changed in the database"""
+        self.members.invalidate(member_id)
+        return self.members.get(member_id)
+    
+    def invalidate_member(self, member_id: str):
+        """Forget a cached member so the next get_member reads it from the database"""
+        self.members.invalidate(member_id)
+    
+    def register_member(self, name: str, phone: str) -> Member:
+        member_id = get_id_generator('member').next_id()
         
-        for data in member_data:
-            member = Member(
-                name=data['name'],
-                phone=data['phone'],
-                member_id=data['member_id'],
-                points=data['points']
-            )
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
             
-            # Get favorite items
+            # Insert new member
             cursor.execute(
-                "SELECT menu_item_id, count FROM favorite_items WHERE member_id = %s",
-                (member.member_id,)
+                "INSERT INTO members (member_id, name, phone, points) VALUES (%s, %s, %s, %s)",
+                (member_id, name, phone, 0)
             )
-            favorite_items = cursor.fetchall()
-            
-            for item in favorite_items:
-                member.favorite_items[item['menu_item_id']] = item['count']
             
-            # Get allergies
-            cursor.execute(
-                "SELECT * FROM member_allergies WHERE member_id = %s",
-                (member.member_id,)
-            )
-            allergy_data = cursor.fetchall()
-            
-            from allergic import Allergy
-            for allergy in allergy_data:
-                member.allergies.append(
-                    Allergy(
-                        allergy_id=allergy['allergy_id'],
-                        member_id=allergy['member_id'],
-                        allergen=allergy['allergen'],
-                        severity=allergy['severity']
-                    )
-                )
-            
-            members[member.member_id] = member
-        
-        cursor.close()
-        conn.close()
-        
-        return members
-    
-    def add_menu_item(self, item: MenuItem):
-        self.menu_items[item.id] = item
-        self.recommendation_system.add_menu_item(item)
-        item.save_to_db()
-    
-    def register_member(self, name: str, phone: str) -> Member:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get next member ID
-        cursor.execute("SELECT COUNT(*) FROM members")
-        count = cursor.fetchone()[0]
-        member_id = f"M{count + 1:04d}"
-        
-        # Insert new member
-        cursor.execute(
-            "INSERT INTO members (member_id, name, phone, points) VALUES (%s, %s, %s, %s)",
-            (member_id, name, phone, 0)
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            cursor.close()
         
         member = Member(name, phone, member_id)
-        self.members[member_id] = member
+        self.members.put(member)
         return member
     
     def get_member(self, member_id: str) -> Optional[Member]:
-        member = self.members.get(member_id)
-        if not member:
-            member = Member.load_from_db(member_id)
-            if member:
-                self.members[member_id] = member
-        return member
+        return self.members.get(member_id)
     
     def create_order(self, customer: Customer) -> Order:
         order = Order(customer)
-        self.orders.append(order)
+        with self._lock:
+            self.orders.append(order)
         return order
     
+    def complete_order(self, order: Order):
+        """Complete an order and feed it to the recommender and the dish popularity counts"""
+        member = order.customer if isinstance(order.customer, Member) else None
+        favorites_before = dict(member.favorite_items) if member else {}
+        order.complete_order()
+        self.popularity.record_order(order.items, order.meal_time)
+        if member:
+            self.recommendation_system.update_member(favorites_before, member.favorite_items, member.member_id)
+    
+    def refresh_popularity(self):
+        """Reload the dish popularity counts, picking up orders completed by other processes"""
+        self.popularity = PopularityIndex.load_from_db()
+    
+    def top_dishes(self, k: int = 5, category: Optional[str] = None,
+                   meal_time: Optional[str] = None) -> List[Tuple[MenuItem, int]]:
+        """The most ordered dishes still on the menu as (item, times ordered), overall or per category or meal time"""
+        menu_items = self.menu_items
+        return [
+            (menu_items[menu_item_id], count)
+            for menu_item_id, count in self.popularity.top(k, category=category, meal_time=meal_time,
+                                                           include=menu_items.__contains__)
+        ]
+    
+    def search_menu(self, query: str, limit: int = 10) -> List[MenuItem]:
+        """Menu items best matching a partial or misspelled name or category, in Thai or English"""
+        menu_items = self.menu_items
+        return [menu_items[menu_item_id] for menu_item_id, _ in self.menu_search.search(query, limit)
+                if menu_item_id in menu_items]
+    
+    def refresh_batch_recommendations(self, num_recommendations: int = 10):
+        """Recompute every member's precomputed recommendation list"""
+        self.recommendation_system.compute_batch_recommendations(num_recommendations)
+    
     def get_recommendations(self, member: Member) -> List[MenuItem]:
-        return self.recommendation_system.get_personal_recommendations(member)
+        return self.recommendation_system.get_recommendations(member)
     
     def check_menu_item_allergens(self, menu_item_id: int, member: Member) -> List[str]:
         """Check if a menu item contains allergens that a member is allergic to"""
@@ -154,9 +253,17 @@ class Restaurant:
         if not menu_item or not member.allergies:
             return []
         
-        warnings = []
-        for allergy in member.allergies:
-            if allergy.allergen in menu_item.allergens:
-                warnings.append(f"{menu_item.name} contains {allergy.allergen} (Severity: {allergy.severity})")
-        
-        return warnings
\ No newline at end of file
+        return [
+            f"{menu_item.name} contains {allergy.allergen} (Severity: {allergy.severity})"
+            for allergy in member.allergy_conflicts(menu_item)
+        ]
+    
+    def check_menu_allergens(self, member: Member) -> Dict[int, List[str]]:
+        """Conflicting allergens of every menu item unsafe for a member, from one AND over the mask column"""
+        return self.menu_columns.conflicts(member.allergen_mask)
+    
+    def safe_menu_items(self, member: Member) -> List[MenuItem]:
+        """Menu items containing none of a member's allergens"""
+        menu_items = self.menu_items
+        return [menu_items[menu_item_id] for menu_item_id in self.menu_columns.safe_ids(member.allergen_mask).tolist()
+                if menu_item_id in menu_items]
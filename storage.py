@@ -0,0 +1,429 @@
+"""
+Storage backends.
+
+The models talk to the database through db_utils (pooled_connection,
+execute_values, next_sequence_values) and write plain SQL with ``%s``
+placeholders. A backend supplies the connections and the few operations
+whose SQL differs between engines:
+
+- ``postgres``: the PostgreSQL server configured by DB_HOST, DB_NAME, DB_USER
+  and DB_PASSWORD (the default)
+- ``sqlite``: an embedded SQLite file at DB_PATH (default ``restaurant.db``),
+  for single-terminal deployments
+- ``memory``: a private in-memory SQLite database that lives as long as the
+  process and is migrated on first use, for tests and benchmarks
+
+The backend is chosen with the DB_BACKEND environment variable or set_backend.
+SQLite connections are wrapped to look like the subset of psycopg2 the models
+use: ``%s`` placeholders (a tuple parameter expands for ``IN %s``, to
+``(?, ?, ...)`` or, when long, a JSON list), ``cursor(name=...,
+cursor_factory=...)`` and rows readable by position or by column name.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import psycopg2
+    from psycopg2 import extras as psycopg2_extras
+except ImportError:  # SQLite-only installs
+    psycopg2 = None
+    psycopg2_extras = None
+
+# psycopg2's transaction status codes, reported by SQLite connections too
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_INTRANS = 2
+
+class StorageBackend:
+    """Creates connections and runs the engine-specific parts of the SQL"""
+    name = ''
+    # Key for Migration.overrides; backends sharing an SQL dialect share migrations
+    dialect = ''
+    # Apply pending migrations when the pool is first created
+    auto_migrate = False
+    
+    def connect(self, **kwargs):
+        raise NotImplementedError
+    
+    def pool_options(self) -> Dict[str, float]:
+        """ConnectionPool keyword arguments that suit this backend"""
+        return {}
+    
+    def execute_values(self, cursor, sql: str, rows: Sequence[Sequence], page_size: int = 100):
+        """Run ``sql``, whose single ``VALUES %s`` takes many rows, in pages"""
+        raise NotImplementedError
+    
+    def next_sequence_values(self, cursor, sequence: str, count: int) -> List[int]:
+        """Reserve ``count`` consecutive-or-not values from a named sequence, ascending"""
+        raise NotImplementedError
+    
+    def bulk_upsert(self, cursor, table: str, columns: Sequence[str], rows: Sequence[Sequence],
+                    key: Sequence[str], update: Sequence[str] = ()):
+        """
+        Insert many rows, updating the ``update`` columns of rows whose ``key`` exists.
+        
+        With no ``update`` columns existing rows are left alone. ``rows`` must
+        not repeat a key.
+        """
+        raise NotImplementedError
+    
+    def advance_sequence(self, cursor, sequence: str, value: int):
+        """Make sure a sequence never hands out ``value`` or anything below it again"""
+        raise NotImplementedError
+    
+    def create_sequence(self, cursor, sequence: str):
+        """Create a named sequence starting at 1, if there is none by that name"""
+        raise NotImplementedError
+    
+    def drop_sequence(self, cursor, sequence: str):
+        """Drop a named sequence, if it exists"""
+        raise NotImplementedError
+    
+    @staticmethod
+    def _on_conflict(key: Sequence[str], update: Sequence[str]) -> str:
+        if not update:
+            return f"ON CONFLICT ({', '.join(key)}) DO NOTHING"
+        return (f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET "
+                + ', '.join(f"{column} = EXCLUDED.{column}" for column in update))
+    
+    def table_exists(self, cursor, table: str) -> bool:
+        raise NotImplementedError
+    
+    def truncate_to_hour(self, expression: str) -> str:
+        """SQL for a timestamp expression rounded down to the hour"""
+        raise NotImplementedError
+    
+    def lock_migrations(self, cursor):
+        """Keep concurrent deploys from migrating at the same time (session-level)"""
+    
+    def unlock_migrations(self, cursor):
+        pass
+
+class PostgresBackend(StorageBackend):
+    name = 'postgres'
+    dialect = 'postgres'
+    # Arbitrary key for pg_advisory_lock
+    MIGRATION_LOCK_ID = 724310
+    
+    def connect(self, **kwargs):
+        """Create a connection to the PostgreSQL database; ``kwargs`` go to psycopg2.connect"""
+        if psycopg2 is None:
+            raise RuntimeError("The postgres backend needs psycopg2; install it or set DB_BACKEND=sqlite")
+        return psycopg2.connect(
+            host=os.environ.get('DB_HOST', 'postgres'),
+            database=os.environ.get('DB_NAME', 'restaurant'),
+            user=os.environ.get('DB_USER', 'postgres'),
+            password=os.environ.get('DB_PASSWORD', 'postgres'),
+            **kwargs
+        )
+    
+    def pool_options(self) -> Dict[str, float]:
+        return {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'health_check_interval': float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+            'checkout_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    
+    def execute_values(self, cursor, sql: str, rows: Sequence[Sequence], page_size: int = 100):
+        psycopg2_extras.execute_values(cursor, sql, rows, page_size=page_size)
+    
+    def next_sequence_values(self, cursor, sequence: str, count: int) -> List[int]:
+        cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", (sequence, count))
+        return sorted(row[0] for row in cursor.fetchall())
+    
+    def bulk_upsert(self, cursor, table: str, columns: Sequence[str], rows: Sequence[Sequence],
+                    key: Sequence[str], update: Sequence[str] = ()):
+        # COPY into a session-local staging table, then one set-based upsert from it
+        stage = f"import_{table}"
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS)")
+        cursor.execute(f"TRUNCATE {stage}")
+        buffer = io.StringIO()
+        # Strings are quoted so that only None (an unquoted empty field) loads as NULL
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        column_list = ', '.join(columns)
+        cursor.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} "
+            + self._on_conflict(key, update)
+        )
+    
+    def advance_sequence(self, cursor, sequence: str, value: int):
+        # Read from the sequence itself: until the first nextval, last_value is
+        # the next value to hand out (is_called false), not one handed out, and
+        # pg_sequences shows it as NULL. Only ever moves the sequence forward
+        cursor.execute(
+            f"SELECT setval(%s, %s) FROM {sequence} "
+            "WHERE CASE WHEN is_called THEN last_value + 1 ELSE last_value END <= %s",
+            (sequence, value, value)
+        )
+    
+    def create_sequence(self, cursor, sequence: str):
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+    
+    def drop_sequence(self, cursor, sequence: str):
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence}")
+    
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        return cursor.fetchone()[0] is not None
+    
+    def truncate_to_hour(self, expression: str) -> str:
+        return f"date_trunc('hour', {expression})"
+    
+    def lock_migrations(self, cursor):
+        cursor.execute("SELECT pg_advisory_lock(%s)", (self.MIGRATION_LOCK_ID,))
+    
+    def unlock_migrations(self, cursor):
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (self.MIGRATION_LOCK_ID,))
+
+def _translate(sql: str, params: Optional[Sequence]):
+    """Rewrite psycopg2-style ``%s`` placeholders for sqlite3, expanding tuple parameters"""
+    if params is None:
+        return sql.replace('%%', '%'), ()
+    parts = [part.split('%s') for part in sql.split('%%')]
+    if sum(len(pieces) - 1 for pieces in parts) != len(params):
+        raise ValueError(f"Query has a different number of placeholders than the {len(params)} parameters given")
+    values = iter(params)
+    flat = []
+    translated = []
+    for pieces in parts:
+        out = [pieces[0]]
+        for piece in pieces[1:]:
+            value = next(values)
+            if isinstance(value, (tuple, list)) and len(value) > SQLiteBackend.MAX_VARIABLES // 4:
+                # Too many values for one placeholder each: pass the list as one JSON parameter
+                out.append('(SELECT value FROM json_each(?))')
+                flat.append(json.dumps(list(value)))
+            elif isinstance(value, (tuple, list)):
+                out.append('(' + ', '.join('?' * len(value)) + ')')
+                flat.extend(value)
+            else:
+                out.append('?')
+                flat.append(value)
+            out.append(piece)
+        translated.append(''.join(out))
+    return '%'.join(translated), flat
+
+class SQLiteCursor:
+    """sqlite3 cursor behind the psycopg2 cursor interface the models use"""
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+        self.itersize = 2000
+    
+    def execute(self, sql: str, params: Optional[Sequence] = None):
+        sql, params = _translate(sql, params)
+        self._cursor.execute(sql, params)
+    
+    def execute_native(self, sql: str, params: Sequence = ()):
+        """Run SQL already written for sqlite3, with ``?`` placeholders"""
+        self._cursor.execute(sql, params)
+    
+    def fetchone(self):
+        return self._cursor.fetchone()
+    
+    def fetchmany(self, size: Optional[int] = None):
+        return self._cursor.fetchmany(size or self.itersize)
+    
+    def fetchall(self):
+        return self._cursor.fetchall()
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+    
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """sqlite3 connection behind the psycopg2 connection interface the pool and models use"""
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self.closed = 0
+    
+    def cursor(self, name: Optional[str] = None, cursor_factory=None) -> SQLiteCursor:
+        # sqlite3 cursors already stream rows, and every row is addressable by
+        # column name, so named (server-side) cursors and DictCursor need nothing extra
+        return SQLiteCursor(self._conn.cursor())
+    
+    @property
+    def autocommit(self) -> bool:
+        return self._conn.isolation_level is None
+    
+    @autocommit.setter
+    def autocommit(self, value: bool):
+        self._conn.isolation_level = None if value else 'DEFERRED'
+    
+    def get_transaction_status(self) -> int:
+        return TRANSACTION_STATUS_INTRANS if self._conn.in_transaction else TRANSACTION_STATUS_IDLE
+    
+    def commit(self):
+        self._conn.commit()
+    
+    def rollback(self):
+        self._conn.rollback()
+    
+    def close(self):
+        if not self.closed:
+            self._conn.close()
+            self.closed = 1
+
+# Timestamps are stored as ISO-8601 text and come back as datetimes for TIMESTAMP columns
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+# Amounts read from Postgres or import files; NUMERIC columns store them as numbers
+sqlite3.register_adapter(Decimal, str)
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+    dialect = 'sqlite'
+    # Default SQLITE_MAX_VARIABLE_NUMBER of older SQLite builds
+    MAX_VARIABLES = 999
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get('DB_PATH', 'restaurant.db')
+    
+    def _open(self, database: str, uri: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(database, uri=uri, timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+    
+    def connect(self, **kwargs) -> SQLiteConnection:
+        conn = self._open(self.path)
+        # Readers do not block the single writer
+        conn.execute("PRAGMA journal_mode = WAL")
+        return SQLiteConnection(conn)
+    
+    def pool_options(self) -> Dict[str, float]:
+        return {
+            'min_size': 1,
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+            # Opening a file is cheap and there is no server to lose the connection to
+            'health_check_interval': float('inf'),
+            'checkout_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    
+    def execute_values(self, cursor: SQLiteCursor, sql: str, rows: Sequence[Sequence], page_size: int = 100):
+        rows = list(rows)
+        if not rows:
+            return
+        width = len(rows[0])
+        page_size = max(1, min(page_size, self.MAX_VARIABLES // width))
+        row_sql = '(' + ', '.join('?' * width) + ')'
+        before, after = sql.replace('%%', '%').split('%s')
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            cursor.execute_native(before + ', '.join([row_sql] * len(page)) + after,
+                                  list(itertools.chain.from_iterable(page)))
+    
+    def next_sequence_values(self, cursor: SQLiteCursor, sequence: str, count: int) -> List[int]:
+        # The row lock taken by the UPDATE keeps two terminals from getting the same block
+        cursor.execute("UPDATE id_sequences SET value = value + %s WHERE name = %s RETURNING value", (count, sequence))
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError(f"Unknown sequence '{sequence}'")
+        last = row[0]
+        return list(range(last - count + 1, last + 1))
+    
+    def bulk_upsert(self, cursor, table: str, columns: Sequence[str], rows: Sequence[Sequence],
+                    key: Sequence[str], update: Sequence[str] = ()):
+        # No COPY in SQLite; multi-row upserts within one transaction come close
+        self.execute_values(
+            cursor,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s " + self._on_conflict(key, update),
+            rows,
+            page_size=len(rows)
+        )
+    
+    def advance_sequence(self, cursor, sequence: str, value: int):
+        cursor.execute("UPDATE id_sequences SET value = MAX(value, %s) WHERE name = %s", (value, sequence))
+    
+    def create_sequence(self, cursor, sequence: str):
+        cursor.execute("INSERT INTO id_sequences (name, value) VALUES (%s, 0) ON CONFLICT (name) DO NOTHING", (sequence,))
+    
+    def drop_sequence(self, cursor, sequence: str):
+        cursor.execute("DELETE FROM id_sequences WHERE name = %s", (sequence,))
+    
+    def table_exists(self, cursor, table: str) -> bool:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+        return cursor.fetchone() is not None
+    
+    def truncate_to_hour(self, expression: str) -> str:
+        # Same text form as the datetime adapter above, so it compares and converts like any stored timestamp
+        return f"strftime('%%Y-%%m-%%d %%H:00:00', {expression})"
+
+class MemoryBackend(SQLiteBackend):
+    """
+    SQLite database held in memory, private to this backend instance.
+    
+    Every pooled connection opens the same shared-cache database, and one
+    extra connection is kept open so the data outlives pool recycling. The
+    pool is limited to a single connection because shared-cache SQLite
+    reports table locks as errors instead of waiting on them.
+    """
+    name = 'memory'
+    auto_migrate = True
+    _counter = itertools.count()
+    
+    def __init__(self):
+        super().__init__(path=f"file:restaurant-memory-{os.getpid()}-{next(self._counter)}?mode=memory&cache=shared")
+        self._keepalive: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+    
+    def connect(self, **kwargs) -> SQLiteConnection:
+        with self._lock:
+            if self._keepalive is None:
+                self._keepalive = self._open(self.path, uri=True)
+        return SQLiteConnection(self._open(self.path, uri=True))
+    
+    def pool_options(self) -> Dict[str, float]:
+        return {
+            'min_size': 1,
+            'max_size': 1,
+            'max_idle': float('inf'),
+            'max_lifetime': float('inf'),
+            'health_check_interval': float('inf'),
+            'checkout_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+
+BACKENDS = {
+    'postgres': PostgresBackend,
+    'sqlite': SQLiteBackend,
+    'memory': MemoryBackend,
+}
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> StorageBackend:
+    """The process-wide backend, chosen by DB_BACKEND on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = os.environ.get('DB_BACKEND', 'postgres')
+                if name not in BACKENDS:
+                    raise ValueError(f"Unknown DB_BACKEND '{name}'; expected one of {', '.join(BACKENDS)}")
+                _backend = BACKENDS[name]()
+    return _backend
+
+def set_backend(backend: StorageBackend):
+    """Switch backends, e.g. to a fresh MemoryBackend in a test; the shared pool follows on next use"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
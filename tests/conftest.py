@@ -0,0 +1,38 @@
+from typing import List
+import pytest
+from customer import Member
+from menu_item import MenuItem
+from restaurant import Restaurant
+from storage import MemoryBackend, PostgresBackend, set_backend
+
+@pytest.fixture(autouse=True)
+def database():
+    """A fresh in-memory database, migrated on first use, for every test"""
+    backend = MemoryBackend()
+    set_backend(backend)
+    return backend
+
+@pytest.fixture
+def postgres():
+    """The PostgreSQL server configured by DB_HOST etc., or skip the test when there is none"""
+    backend = PostgresBackend()
+    try:
+        backend.connect().close()
+    except Exception as error:
+        pytest.skip(f"PostgreSQL not available: {error}")
+    set_backend(backend)
+    return backend
+
+@pytest.fixture
+def menu() -> List[MenuItem]:
+    """Three saved dishes without allergens: ids 1-3, "Dish 1".."Dish 3", 100.0 each"""
+    return MenuItem.bulk_save_to_db([MenuItem(menu_id, f"Dish {menu_id}", 100.0, "Main") for menu_id in (1, 2, 3)])
+
+@pytest.fixture
+def restaurant(menu) -> Restaurant:
+    return Restaurant("Test")
+
+@pytest.fixture
+def member(restaurant) -> Member:
+    """A registered member with no allergies, favorites or points"""
+    return restaurant.register_member("Ann", "0800000001")
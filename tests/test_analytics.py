@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import analytics
+from customer import Customer
+from db_utils import pooled_connection
+from menu_item import MenuItem
+from order import Order
+
+def place_order(item: MenuItem, placed_at: datetime) -> Order:
+    order = Order(Customer("Walk-in", "0800000000"))
+    order.timestamp = placed_at
+    order.add_item(item)
+    return order
+
+def summarized_orders(hour: datetime) -> int:
+    frame = analytics.load_hourly_sales(hour, hour + timedelta(hours=1))
+    return int(frame['order_count'].sum())
+
+def test_order_completed_hours_after_it_was_placed_is_summarized(menu):
+    now = datetime.now()
+    placed_at = (now - timedelta(hours=3)).replace(minute=30, second=0, microsecond=0)
+    
+    slow = place_order(menu[0], placed_at)
+    place_order(menu[0], now).complete_order()
+    analytics.refresh_sales_summary()
+    assert summarized_orders(placed_at.replace(minute=0)) == 0
+    
+    # Completed (written) long after its hour was summarized
+    slow.complete_order()
+    assert analytics.refresh_sales_summary() == placed_at.replace(minute=0)
+    assert summarized_orders(placed_at.replace(minute=0)) == 1
+
+def test_refresh_without_new_orders_recomputes_nothing(menu, monkeypatch):
+    place_order(menu[0], datetime.now() - timedelta(hours=1)).complete_order()
+    assert analytics.refresh_sales_summary() == datetime.min
+    
+    # Orders written within COMMIT_LAG of the last refresh are looked at again
+    assert analytics.refresh_sales_summary() is not None
+    monkeypatch.setattr(analytics, 'COMMIT_LAG', timedelta(0))
+    assert analytics.refresh_sales_summary() is None
+
+def test_orders_without_a_write_time_count_as_written_when_placed(menu, monkeypatch):
+    placed_at = (datetime.now() - timedelta(hours=2)).replace(minute=15, second=0, microsecond=0)
+    # As stored before orders recorded completed_at
+    place_order(menu[0], placed_at).complete_order()
+    with pooled_connection() as conn:
+        conn.cursor().execute("UPDATE orders SET completed_at = NULL")
+    
+    assert analytics.refresh_sales_summary() == datetime.min
+    assert summarized_orders(placed_at.replace(minute=0)) == 1
+    
+    # The watermark moved past it, so it is not rebuilt again
+    monkeypatch.setattr(analytics, 'COMMIT_LAG', timedelta(0))
+    assert analytics.refresh_sales_summary() is None
@@ -0,0 +1,74 @@
+import pytest
+from customer import Member
+from data_transfer import export_members, export_orders, import_members, import_orders, read_records
+from db_utils import advance_sequence, pooled_connection
+from menu_item import MenuItem
+from restaurant import Restaurant
+from storage import MemoryBackend, set_backend
+
+def member_record(member_id: str, allergies=()):
+    return {'member_id': member_id, 'name': f"Member {member_id}", 'phone': "0800000000", 'points': 0,
+            'favorites': {}, 'allergies': list(allergies)}
+
+@pytest.mark.parametrize('called', [False, True])
+def test_postgres_advance_sequence_only_moves_forward(postgres, called):
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMP SEQUENCE IF NOT EXISTS advance_test_seq")
+        # As migration 2 leaves a sequence over existing rows: 11 is next, nothing handed out yet
+        cursor.execute("SELECT setval('advance_test_seq', %s, %s)", (10 if called else 11, called))
+        advance_sequence(cursor, 'advance_test_seq', 5)
+        cursor.execute("SELECT nextval('advance_test_seq')")
+        assert cursor.fetchone()[0] == 11
+        advance_sequence(cursor, 'advance_test_seq', 20)
+        cursor.execute("SELECT nextval('advance_test_seq')")
+        assert cursor.fetchone()[0] == 21
+        cursor.execute("DROP SEQUENCE advance_test_seq")
+        cursor.close()
+
+def test_import_below_existing_ids_keeps_new_ids_clear_of_them(restaurant: Restaurant):
+    existing = [restaurant.register_member(f"Local {n}", "0800000000") for n in range(3)]
+    local_allergy = existing[-1].add_allergy('Peanut', 'Severe')
+    
+    import_members([member_record('M0001', [{'allergy_id': None, 'allergen': 'Egg', 'severity': 'Mild'}])])
+    
+    member = restaurant.register_member("New", "0800000000")
+    allergy = member.add_allergy('Soy', 'Mild')
+    assert member.member_id not in {local.member_id for local in existing}
+    assert allergy.allergy_id > local_allergy.allergy_id
+
+def test_imported_allergy_ids_never_take_over_another_members_allergy(member: Member):
+    local_allergy = member.add_allergy('Peanut', 'Severe')
+    
+    # A file from another franchise whose allergy id happens to be in use here
+    record = member_record('M9001', [{'allergy_id': local_allergy.allergy_id, 'allergen': 'Egg', 'severity': 'Mild'}])
+    import_members([record])
+    import_members([record])
+    
+    assert [(a.allergy_id, a.allergen) for a in Member.load_from_db(member.member_id).allergies] == \
+        [(local_allergy.allergy_id, 'Peanut')]
+    imported = Member.load_from_db('M9001').allergies
+    assert [(a.allergen, a.severity) for a in imported] == [('Egg', 'Mild')]
+    assert imported[0].allergy_id != local_allergy.allergy_id
+
+@pytest.mark.parametrize('extension', ['jsonl', 'csv.gz'])
+def test_export_then_import_into_an_empty_database(tmp_path, restaurant, menu, member, extension):
+    member.add_allergy('Peanut', 'Severe')
+    order = restaurant.create_order(member)
+    order.add_item(menu[0])
+    order.add_item(menu[1])
+    restaurant.complete_order(order)
+    members_file, orders_file = str(tmp_path / f"members.{extension}"), str(tmp_path / f"orders.{extension}")
+    assert export_members(members_file) == 1
+    assert export_orders(orders_file) == 1
+    
+    set_backend(MemoryBackend())
+    MenuItem.bulk_save_to_db(menu)
+    assert import_members(read_records(members_file)) == 1
+    assert import_orders(read_records(orders_file)) == 1
+    assert import_orders(read_records(orders_file)) == 0
+    
+    imported = Member.load_from_db(member.member_id)
+    assert (imported.name, imported.points, imported.favorite_items) == ("Ann", 20, {1: 1, 2: 1})
+    assert [(allergy.allergen, allergy.severity) for allergy in imported.allergies] == [('Peanut', 'Severe')]
+    assert [(summary.order_id, summary.total_amount) for summary in imported.order_history] == [(order.order_id, 200.0)]
@@ -0,0 +1,102 @@
+import threading
+import time
+import pytest
+from db_utils import ConnectionPool, PoolTimeoutError, pooled_connection, transaction
+from storage import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+class FakeConnection:
+    """Just enough of a connection for the pool: open/closed state and a transaction flag"""
+    def __init__(self):
+        self.closed = 0
+        self.in_transaction = False
+        self.rollbacks = 0
+    
+    def get_transaction_status(self) -> int:
+        return TRANSACTION_STATUS_INTRANS if self.in_transaction else TRANSACTION_STATUS_IDLE
+    
+    def rollback(self):
+        self.in_transaction = False
+        self.rollbacks += 1
+    
+    def close(self):
+        self.closed = 1
+
+def fake_pool(**options) -> ConnectionPool:
+    return ConnectionPool(connect=FakeConnection, **{'health_check_interval': float('inf'), **options})
+
+def test_returned_connections_are_reused():
+    pool = fake_pool(max_size=2)
+    first = pool.getconn()
+    pool.putconn(first)
+    assert pool.getconn() is first
+    assert pool.stats()['connections_created'] == 1
+
+def test_checkout_times_out_when_every_connection_is_in_use():
+    pool = fake_pool(max_size=1)
+    pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()['checkout_timeouts'] == 1
+
+def test_waiting_checkout_gets_the_returned_connection():
+    pool = fake_pool(max_size=1)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, (conn,)).start()
+    assert pool.getconn(timeout=2) is conn
+    assert pool.stats()['checkout_waits'] == 1
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = fake_pool()
+    conn = pool.getconn()
+    conn.in_transaction = True
+    pool.putconn(conn)
+    assert conn.rollbacks == 1 and not conn.in_transaction
+
+def test_closed_and_expired_connections_are_discarded():
+    pool = fake_pool(max_size=2, max_lifetime=0.01)
+    broken = pool.getconn()
+    broken.close()
+    pool.putconn(broken)
+    old = pool.getconn()
+    time.sleep(0.02)
+    pool.putconn(old)
+    assert old.closed
+    assert pool.stats()['size'] == 0
+    assert pool.getconn() not in (broken, old)
+
+def test_unhealthy_idle_connection_is_replaced():
+    pool = fake_pool(health_check_interval=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 1
+    assert pool.getconn() is not conn
+    assert pool.stats()['health_check_failures'] == 1
+
+def test_pool_rejects_inconsistent_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool(min_size=3, max_size=2, connect=FakeConnection)
+
+def count_menu_items() -> int:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM menu_items")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+def test_transaction_rolls_back_every_block_it_spans():
+    with pytest.raises(RuntimeError):
+        with transaction():
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO menu_items (id, name, price, category) VALUES (1, 'Dish', 10, 'Main')")
+                cursor.close()
+            raise RuntimeError("fail after the insert")
+    assert count_menu_items() == 0
+    
+    with transaction():
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO menu_items (id, name, price, category) VALUES (1, 'Dish', 10, 'Main')")
+            cursor.close()
+    assert count_menu_items() == 1
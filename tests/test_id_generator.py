@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from db_utils import create_sequence, drop_sequence, pooled_connection
+from id_generator import KSortableIdGenerator, SequenceIdGenerator, get_id_generator, set_id_generator
+
+THREADS = 8
+IDS_PER_THREAD = 500
+
+@pytest.fixture
+def scratch_sequence():
+    with pooled_connection() as conn:
+        create_sequence(conn.cursor(), 'test_id_seq')
+    yield 'test_id_seq'
+    with pooled_connection() as conn:
+        drop_sequence(conn.cursor(), 'test_id_seq')
+
+def draw_concurrently(generator):
+    """Each thread's ids, in the order it drew them"""
+    results = [[] for _ in range(THREADS)]
+    start = threading.Barrier(THREADS)
+    
+    def draw(out):
+        start.wait()
+        for _ in range(IDS_PER_THREAD):
+            out.append(generator.next_id())
+    
+    threads = [threading.Thread(target=draw, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def assert_unique_and_ordered(results):
+    all_ids = [value for out in results for value in out]
+    assert len(all_ids) == THREADS * IDS_PER_THREAD
+    assert len(set(all_ids)) == len(all_ids)
+    for out in results:
+        assert out == sorted(out)
+
+@pytest.mark.parametrize('block_size', [1, 7, 100])
+def test_sequence_ids_are_unique_across_threads(scratch_sequence, block_size):
+    results = draw_concurrently(SequenceIdGenerator(scratch_sequence, block_size=block_size))
+    assert_unique_and_ordered(results)
+    assert min(value for out in results for value in out) == 1
+
+def test_sequence_generators_sharing_a_sequence_never_collide(scratch_sequence):
+    first = SequenceIdGenerator(scratch_sequence, block_size=10)
+    second = SequenceIdGenerator(scratch_sequence, block_size=10)
+    ids = [generator.next_id() for _ in range(25) for generator in (first, second)]
+    assert len(set(ids)) == len(ids)
+
+def test_sequence_ids_are_formatted(scratch_sequence):
+    generator = SequenceIdGenerator(scratch_sequence, formatter=lambda value: f"T{value:04d}")
+    assert [generator.next_id(), generator.next_id()] == ['T0001', 'T0002']
+    with pytest.raises(ValueError):
+        SequenceIdGenerator(scratch_sequence, block_size=0)
+
+def test_ksortable_ids_are_unique_and_ordered_across_threads():
+    results = draw_concurrently(KSortableIdGenerator())
+    assert_unique_and_ordered(results)
+    assert all(len(value) == 26 and set(value) <= set(KSortableIdGenerator.ALPHABET)
+               for out in results for value in out)
+
+def test_ksortable_ids_keep_increasing_when_the_clock_steps_back(monkeypatch):
+    generator = KSortableIdGenerator()
+    now = [2_000_000_000_000_000_000]
+    monkeypatch.setattr('id_generator.time.time_ns', lambda: now[0])
+    first = generator.next_id()
+    now[0] -= 5_000_000_000
+    assert generator.next_id() > first
+
+def test_registered_generator_replaces_the_default():
+    default = get_id_generator('order')
+    assert get_id_generator('order') is default
+    replacement = KSortableIdGenerator()
+    set_id_generator('order', replacement)
+    try:
+        assert get_id_generator('order') is replacement
+    finally:
+        set_id_generator('order', default)
+    with pytest.raises(KeyError):
+        get_id_generator('no-such-entity')
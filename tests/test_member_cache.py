@@ -0,0 +1,54 @@
+from typing import Dict
+from customer import Member
+from member_cache import MemberCache
+
+def counting_loader(members: Dict[str, Member], calls: list):
+    def load(member_id: str):
+        calls.append(member_id)
+        return members.get(member_id)
+    return load
+
+def make_members(count: int) -> Dict[str, Member]:
+    return {f"M{n:04d}": Member(f"Member {n}", "0800000000", f"M{n:04d}") for n in range(count)}
+
+def test_hits_are_served_without_loading():
+    calls = []
+    members = make_members(1)
+    cache = MemberCache(loader=counting_loader(members, calls))
+    assert cache.get('M0000') is members['M0000']
+    assert cache.get('M0000') is members['M0000']
+    assert calls == ['M0000']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_member_is_evicted():
+    calls = []
+    cache = MemberCache(max_size=2, loader=counting_loader(make_members(3), calls))
+    cache.get('M0000')
+    cache.get('M0001')
+    cache.get('M0000')  # M0001 is now the least recently used
+    cache.get('M0002')
+    assert cache.peek('M0001') is None
+    assert cache.peek('M0000') is not None
+    assert cache.evictions == 1
+
+def test_expired_entries_are_reloaded():
+    calls = []
+    cache = MemberCache(ttl=0, loader=counting_loader(make_members(1), calls))
+    cache.get('M0000')
+    cache.get('M0000')
+    assert calls == ['M0000', 'M0000']
+    assert cache.expirations == 1
+
+def test_unknown_members_are_not_cached():
+    calls = []
+    cache = MemberCache(loader=counting_loader({}, calls))
+    assert cache.get('M9999') is None
+    assert cache.get('M9999') is None
+    assert len(calls) == 2
+
+def test_restaurant_reloads_an_invalidated_member(restaurant, member):
+    assert restaurant.get_member(member.member_id) is member
+    restaurant.invalidate_member(member.member_id)
+    reloaded = restaurant.get_member(member.member_id)
+    assert reloaded is not member
+    assert (reloaded.member_id, reloaded.name) == (member.member_id, "Ann")
@@ -0,0 +1,36 @@
+from customer import Member
+from menu_item import MenuItem
+from restaurant import Restaurant
+
+def test_allergen_added_in_place_makes_item_unsafe(restaurant: Restaurant, member: Member):
+    member.add_allergy('Peanut', 'Severe')
+    assert [item.id for item in restaurant.safe_menu_items(member)] == [1, 2, 3]
+    
+    restaurant.menu_items[2].add_allergen('Peanut')
+    
+    assert restaurant.check_menu_item_allergens(2, member) == ["Dish 2 contains Peanut (Severity: Severe)"]
+    assert [item.id for item in restaurant.safe_menu_items(member)] == [1, 3]
+    assert restaurant.check_menu_allergens(member) == {2: ['Peanut']}
+    
+    restaurant.menu_items[2].remove_allergen('Peanut')
+    
+    assert [item.id for item in restaurant.safe_menu_items(member)] == [1, 2, 3]
+    assert restaurant.check_menu_allergens(member) == {}
+
+def test_columns_are_only_rebuilt_for_this_menus_edits(restaurant: Restaurant):
+    columns = restaurant.menu_columns
+    
+    # Items built elsewhere, e.g. loaded by another restaurant or a search index
+    other = Restaurant("Other")
+    MenuItem(9, "Elsewhere", 50.0, "Side", ['Egg']).allergens = ('Egg', 'Soy')
+    other.menu_items[1].add_allergen('Egg')
+    assert restaurant.menu_columns is columns
+    
+    restaurant.menu_items[1].add_allergen('Egg')
+    assert restaurant.menu_columns is not columns
+    assert restaurant.menu_columns is restaurant.menu_columns
+
+def test_allergens_are_immutable():
+    item = MenuItem(1, "Pad Thai", 120.0, "Main", ['Peanut'])
+    assert item.allergens == ('Peanut',)
+    assert not hasattr(item.allergens, 'append')
@@ -0,0 +1,49 @@
+import pytest
+
+from db_utils import pooled_connection, transaction
+from menu_item import MenuItem
+
+def menu_version() -> int:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM menu_state")
+        return cursor.fetchone()[0]
+
+def stored_allergens(menu_id: int):
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT allergen FROM menu_allergens WHERE menu_item_id = %s", (menu_id,))
+        return {row[0] for row in cursor.fetchall()}
+
+def test_save_records_one_menu_change():
+    before = menu_version()
+    MenuItem(1, "Pad Thai", 120.0, "Main", ['Peanut', 'Shellfish']).save_to_db()
+    assert menu_version() == before + 1
+    assert stored_allergens(1) == {'Peanut', 'Shellfish'}
+
+def test_allergen_sync_only_writes_the_difference(menu):
+    item = MenuItem.load_from_db(1)
+    item.add_allergen('Peanut')
+    item.allergens = ('Peanut', 'Egg')
+    item.save_to_db()
+    item.remove_allergen('Peanut')
+    assert stored_allergens(1) == {'Egg'}
+    assert MenuItem.load_from_db(1).allergens == ('Egg',)
+
+def test_rolled_back_save_leaves_allergens_unsaved(menu):
+    item = MenuItem.load_from_db(1)
+    item.allergens = ('Peanut',)
+    with pytest.raises(RuntimeError):
+        with transaction():
+            item.save_to_db()
+            raise RuntimeError("abort")
+    assert stored_allergens(1) == set()
+    
+    # The item still knows its allergen is unsaved, so saving again writes it
+    item.save_to_db()
+    assert stored_allergens(1) == {'Peanut'}
+
+def test_bulk_save_loads_back(menu):
+    items = MenuItem.bulk_save_to_db([MenuItem(menu_id, f"Soup {menu_id}", 50.0, "Starter", ['Celery']) for menu_id in (4, 5)])
+    assert [item.id for item in items] == [4, 5]
+    assert {menu_id: loaded.allergens for menu_id, loaded in MenuItem.load_all_from_db().items() if menu_id > 3} == {4: ('Celery',), 5: ('Celery',)}
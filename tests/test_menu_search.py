@@ -0,0 +1,58 @@
+from menu_item import MenuItem
+from menu_search import MenuSearchIndex, normalize
+from restaurant import Restaurant
+
+DISHES = [
+    MenuItem(1, "Tom Yum Goong", 150.0, "Soup"),
+    MenuItem(2, "Pad Thai", 120.0, "Noodle"),
+    MenuItem(3, "Pad See Ew", 110.0, "Noodle"),
+    MenuItem(4, "ส้มตำ", 80.0, "Salad"),
+    MenuItem(5, "ต้มยำกุ้ง", 160.0, "Soup"),
+    MenuItem(6, "Mango Sticky Rice", 90.0, "Dessert"),
+]
+
+def ids(results):
+    return [menu_item_id for menu_item_id, _ in results]
+
+def test_normalize_ignores_case_spacing_accents_and_tone_marks():
+    assert normalize("Tom Yum") == normalize("tomyum") == normalize("TOM-YUM")
+    assert normalize("Pâd Thaï") == normalize("pad thai")
+    # ต้มยำ with and without its tone mark
+    assert normalize("ต้มยำ") == normalize("ตมยำ")
+
+def test_partial_and_misspelled_names_match():
+    index = MenuSearchIndex(DISHES)
+    assert ids(index.search("tomyum"))[0] == 1
+    assert ids(index.search("pad tai"))[0] == 2
+    assert ids(index.search("mango stiky"))[0] == 6
+    assert ids(index.search("ส้มตำ"))[0] == 4
+    assert ids(index.search("ต้มยำ"))[0] == 5
+    assert index.search("zzzz") == []
+
+def test_category_matches_rank_below_name_matches():
+    results = MenuSearchIndex(DISHES).search("noodle")
+    assert sorted(ids(results)) == [2, 3]
+    assert all(score < 1 for _, score in results)
+
+def test_results_are_limited_and_best_first():
+    results = MenuSearchIndex(DISHES).search("pad", limit=1)
+    assert len(results) == 1 and results[0][0] in (2, 3)
+    scores = [score for _, score in MenuSearchIndex(DISHES).search("pad see")]
+    assert scores == sorted(scores, reverse=True)
+
+def test_added_replaced_and_removed_items():
+    index = MenuSearchIndex(DISHES)
+    index.add(MenuItem(2, "Khao Soi", 130.0, "Noodle"))
+    assert 2 not in ids(index.search("pad thai"))
+    assert ids(index.search("khao soi"))[0] == 2
+    
+    for menu_item_id in (1, 3, 4, 5):
+        index.remove(menu_item_id)
+    assert len(index) == 2
+    assert ids(index.search("tom yum")) == []
+    assert ids(index.search("mango"))[0] == 6
+
+def test_restaurant_searches_its_own_menu(restaurant: Restaurant):
+    restaurant.add_menu_item(MenuItem(4, "Green Curry", 140.0, "Curry"))
+    assert [item.id for item in restaurant.search_menu("gren cury")] == [4]
+    assert [item.id for item in restaurant.search_menu("dish 2")][0] == 2
@@ -0,0 +1,65 @@
+import pytest
+
+import migrations
+from db_utils import pooled_connection
+from storage import SQLiteBackend, set_backend
+
+@pytest.fixture
+def empty_database(tmp_path):
+    """A SQLite file with no schema, which is never migrated behind the test's back"""
+    backend = SQLiteBackend(path=str(tmp_path / 'restaurant.db'))
+    set_backend(backend)
+    return backend
+
+def versions(applied):
+    return [migration.version for migration in applied]
+
+def test_versions_are_sequential():
+    assert versions(migrations.MIGRATIONS) == list(range(1, migrations.latest_version() + 1))
+
+def test_empty_database_needs_every_migration(empty_database):
+    assert migrations.current_version() == 0
+    assert versions(migrations.pending_migrations()) == versions(migrations.MIGRATIONS)
+    with pytest.raises(RuntimeError, match="upgrade"):
+        migrations.check_schema_version()
+
+def test_upgrade_in_steps(empty_database):
+    assert versions(migrations.apply_migrations(target=3)) == [1, 2, 3]
+    assert migrations.current_version() == 3
+    with pytest.raises(RuntimeError):
+        migrations.check_schema_version()
+    
+    remaining = versions(migrations.apply_migrations())
+    assert remaining == list(range(4, migrations.latest_version() + 1))
+    assert migrations.pending_migrations() == []
+    migrations.check_schema_version()
+    
+    # Applying again is a no-op
+    assert migrations.apply_migrations() == []
+
+def test_failed_migration_is_rolled_back(empty_database, monkeypatch):
+    migrations.apply_migrations()
+    broken = migrations.Migration(migrations.latest_version() + 1, "Broken", [
+        "CREATE TABLE half_done (id INTEGER)",
+        "SELECT * FROM no_such_table",
+    ])
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [*migrations.MIGRATIONS, broken])
+    
+    with pytest.raises(Exception):
+        migrations.apply_migrations()
+    assert versions(migrations.pending_migrations()) == [broken.version]
+    with pooled_connection() as conn:
+        assert not empty_database.table_exists(conn.cursor(), 'half_done')
+
+def test_status_and_upgrade_commands(empty_database, capsys):
+    assert migrations.main(['status']) == 0
+    assert 'pending' in capsys.readouterr().out
+    
+    assert migrations.main(['upgrade']) == 0
+    assert f"schema at version {migrations.latest_version()}" in capsys.readouterr().out
+    
+    migrations.main(['status'])
+    assert 'pending' not in capsys.readouterr().out
+
+def test_memory_database_is_migrated_on_first_use():
+    assert migrations.current_version() == migrations.latest_version()
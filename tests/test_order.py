@@ -0,0 +1,40 @@
+import pytest
+import order as order_module
+from customer import Member
+from db_utils import pooled_connection
+
+def stored_order_count() -> int:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM orders")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+def test_completed_order_stores_points_favorites_and_rows(restaurant, menu, member):
+    order = restaurant.create_order(member)
+    order.add_item(menu[0])
+    order.add_item(menu[1])
+    restaurant.complete_order(order)
+    
+    stored = Member.load_from_db(member.member_id)
+    assert order.status == "Completed"
+    assert (stored.points, stored.favorite_items) == (20, {1: 1, 2: 1})
+    assert stored_order_count() == 1
+
+def test_failed_completion_stores_nothing_and_restores_the_member(restaurant, menu, member, monkeypatch):
+    order = restaurant.create_order(member)
+    order.add_item(menu[0])
+    
+    def fail(counts):
+        raise RuntimeError("popularity write failed")
+    monkeypatch.setattr(order_module, 'increment_dish_counts_in_db', fail)
+    
+    with pytest.raises(RuntimeError):
+        order.complete_order()
+    
+    stored = Member.load_from_db(member.member_id)
+    assert order.status == "Pending"
+    assert (member.points, member.favorite_items) == (0, {})
+    assert (stored.points, stored.favorite_items) == (0, {})
+    assert stored_order_count() == 0
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from typing import List
+
+from customer import Member
+from menu_item import MenuItem
+from order import Order
+from order_history import OrderHistory
+
+PLACED = datetime(2024, 5, 1, 12, 0)
+
+def place_orders(member: Member, menu: List[MenuItem], minutes: List[int]) -> List[Order]:
+    """One completed order per entry, placed that many minutes after PLACED, with one or two dishes"""
+    orders = []
+    for n, minute in enumerate(minutes):
+        order = Order(member)
+        order.timestamp = PLACED + timedelta(minutes=minute)
+        for item in menu[:1 + n % 2]:
+            order.add_item(item)
+        order.complete_order()
+        orders.append(order)
+    return orders
+
+def newest_first(orders: List[Order]) -> List[str]:
+    return [order.order_id for order in sorted(orders, key=lambda order: (order.timestamp, order.order_id), reverse=True)]
+
+def test_pages_walk_every_order_once_newest_first(menu, member):
+    # Several orders share a timestamp, so pages have to split between them
+    orders = place_orders(member, menu, [0, 5, 5, 5, 5, 10, 20])
+    history = OrderHistory(member.member_id, page_size=2)
+    
+    pages = list(history.pages())
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [summary.order_id for page in pages for summary in page] == newest_first(orders)
+    assert pages[-1].next_cursor is None
+
+def test_page_holds_each_orders_items(menu, member):
+    orders = place_orders(member, menu, [0, 1])
+    page = OrderHistory(member.member_id).page()
+    assert [(summary.order_id, sorted(summary.menu_item_ids), float(summary.total_amount)) for summary in page] == [
+        (orders[1].order_id, [1, 2], 200.0),
+        (orders[0].order_id, [1], 100.0),
+    ]
+    assert page.next_cursor is None
+
+def test_orders_placed_meanwhile_do_not_shift_later_pages(menu, member):
+    orders = place_orders(member, menu, [0, 1, 2, 3])
+    history = OrderHistory(member.member_id, page_size=2)
+    first = history.page()
+    
+    place_orders(member, menu, [30])
+    second = history.page(first.next_cursor)
+    assert [summary.order_id for summary in first] + [summary.order_id for summary in second] == newest_first(orders)
+
+def test_full_last_page_ends_the_history(menu, member):
+    place_orders(member, menu, [0, 1, 2, 3])
+    history = OrderHistory(member.member_id, page_size=2)
+    assert [len(page) for page in history.pages()] == [2, 2]
+    assert len(list(history)) == 4
+
+def test_recent_and_empty_histories(menu, member):
+    orders = place_orders(member, menu, [0, 1, 2])
+    assert [summary.order_id for summary in member.order_history.recent(2)] == newest_first(orders)[:2]
+    assert list(OrderHistory('M9999').pages()) == []
+    assert OrderHistory(None).page().orders == []
@@ -0,0 +1,48 @@
+import asyncio
+from async_repository import AsyncRepository
+from customer import Member
+from write_behind import disable_write_behind, enable_write_behind
+
+def stored_points(member_id: str) -> int:
+    return Member.load_from_db(member_id).points
+
+def test_write_behind_adds_points_once(member):
+    queue = enable_write_behind(flush_interval=60)
+    try:
+        member.add_points(10)
+        queue.flush()
+    finally:
+        disable_write_behind()
+    assert member.points == 10
+    assert stored_points(member.member_id) == 10
+
+def test_points_from_two_copies_of_a_member_add_up(member):
+    other_session = Member.load_from_db(member.member_id)
+    member.add_points(10)
+    other_session.add_points(5)
+    assert stored_points(member.member_id) == 15
+
+def test_async_repository_writes_point_changes(member):
+    repository = AsyncRepository()
+    
+    async def earn_and_spend():
+        await repository.add_points(member, 30)
+        return await repository.use_points(member, 20)
+    
+    try:
+        assert asyncio.run(earn_and_spend())
+    finally:
+        repository.close()
+    assert stored_points(member.member_id) == 10
+
+def test_write_behind_coalesces_favorites(menu, member):
+    queue = enable_write_behind(flush_interval=60)
+    try:
+        member.update_favorites_many([1, 2, 1])
+        member.update_favorites_many([1])
+        # Nothing is written until the queue flushes
+        assert Member.load_from_db(member.member_id).favorite_items == {}
+        queue.flush()
+    finally:
+        disable_write_behind()
+    assert Member.load_from_db(member.member_id).favorite_items == {1: 3, 2: 1}
@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from benchmarks.query_plans import check_query_plans, filtered_seq_scans
+
+def test_model_queries_use_indexes(postgres):
+    report = check_query_plans(members=3000, menu_items=100, orders=6000, sample=2, min_rows=1000)
+    assert {'members', 'favorite_items', 'orders', 'order_items'} <= report.large_tables
+    assert len(report.plans) > 20
+    assert report.failures == {}
+
+def test_only_filtered_scans_of_large_tables_fail():
+    plan = {
+        'Node Type': 'Hash Join',
+        'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'orders', 'Filter': "(customer_id = 'M0001')"},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'order_items'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'menu_items', 'Filter': '(price > 10)'},
+        ],
+    }
+    assert [node['Relation Name'] for node in filtered_seq_scans(plan, {'orders', 'order_items'})] == ['orders']
@@ -0,0 +1,94 @@
+from typing import Dict
+
+import numpy as np
+
+from customer import Member
+from menu_item import MenuItem
+from recommendation_system import RecommendationSystem
+
+FAVORITES = {
+    'M0001': {1: 3, 2: 2},
+    'M0002': {1: 1, 2: 4, 3: 1},
+    'M0003': {4: 2, 5: 1},
+}
+
+def diner(member_id: str, favorites: Dict[int, int]) -> Member:
+    member = Member("Ann", "0800000001", member_id)
+    member.favorite_items = dict(favorites)
+    return member
+
+def recommender(favorites=FAVORITES) -> RecommendationSystem:
+    system = RecommendationSystem()
+    system.set_menu_items(MenuItem(menu_id, f"Dish {menu_id}", 100.0, "Main") for menu_id in range(1, 7))
+    system.load_interactions((member_id, menu_id, count) for member_id, counts in favorites.items()
+                             for menu_id, count in counts.items())
+    return system
+
+def ids(items):
+    return [item.id for item in items]
+
+def test_recommends_dishes_ordered_alongside_the_members_favorites():
+    system = recommender()
+    assert ids(system.get_personal_recommendations(diner('M0009', {1: 1}), 2)) == [2, 3]
+    assert ids(system.get_personal_recommendations(diner('M0009', {5: 1}), 1)) == [4]
+
+def test_skips_dishes_already_ordered_and_off_the_menu():
+    system = recommender()
+    system.remove_menu_item(2)
+    assert ids(system.get_personal_recommendations(diner('M0009', {1: 1}), 1)) == [3]
+    # With nothing similar left, the member's own favorites come first
+    recommendations = ids(system.get_personal_recommendations(diner('M0009', {1: 1, 3: 2}), 3))
+    assert recommendations[:2] == [3, 1]
+    assert 2 not in recommendations
+
+def test_pads_short_lists_with_distinct_items():
+    system = recommender()
+    recommendations = ids(system.get_personal_recommendations(diner('M0009', {6: 1}), 4))
+    assert len(recommendations) == len(set(recommendations)) == 4
+    assert recommendations[0] == 6
+    assert len(system.get_random_recommendations(10)) == 6
+
+def test_incremental_updates_match_a_full_rebuild():
+    system = recommender()
+    system.MERGE_THRESHOLD = 0  # merge after every update as well
+    system.update_member(FAVORITES['M0003'], {4: 2, 5: 1, 1: 1}, 'M0003')
+    system.update_member({}, {6: 2, 2: 1}, 'M0004')
+    
+    rebuilt = recommender({**FAVORITES, 'M0003': {4: 2, 5: 1, 1: 1}, 'M0004': {6: 2, 2: 1}})
+    for favorites in ({1: 1}, {4: 3}, {2: 1, 6: 1}):
+        np.testing.assert_allclose(system.score_items(favorites), rebuilt.score_items(favorites))
+
+def test_batch_lists_match_on_demand_scoring():
+    system = recommender()
+    system.MERGE_THRESHOLD = 0
+    system.update_member({}, {3: 1, 6: 1}, 'M0004')
+    system.compute_batch_recommendations(num_recommendations=3, chunk_size=2)
+    assert system.batch_computed_at is not None
+    
+    for member_id, favorites in {**FAVORITES, 'M0004': {3: 1, 6: 1}}.items():
+        member = diner(member_id, favorites)
+        # Only the scored head is deterministic; the rest is padding
+        scored = [menu_id for menu_id in system._batch_ids[system._batch_rows[member_id]].tolist() if menu_id >= 0]
+        assert ids(system.get_recommendations(member, 3))[:len(scored)] == scored
+        assert ids(system.get_personal_recommendations(member, 3))[:len(scored)] == scored
+    assert ids(system.get_recommendations(diner('M0001', FAVORITES['M0001']), 1)) == [3]
+
+def test_batch_list_is_retired_when_the_member_orders():
+    system = recommender()
+    system.compute_batch_recommendations(num_recommendations=3)
+    member = diner('M0003', FAVORITES['M0003'])
+    assert 'M0003' in system._batch_rows
+    
+    member.favorite_items = {4: 2, 5: 1, 1: 1}
+    system.update_member(FAVORITES['M0003'], member.favorite_items, 'M0003')
+    assert 'M0003' not in system._batch_rows
+    assert ids(system.get_recommendations(member, 1)) == [2]
+    
+    system.compute_batch_recommendations(num_recommendations=3)
+    assert ids(system.get_recommendations(member, 1)) == [2]
+
+def test_batch_handles_menus_shorter_than_the_list():
+    system = recommender()
+    system.compute_batch_recommendations(num_recommendations=10)
+    recommendations = ids(system.get_recommendations(diner('M0001', FAVORITES['M0001']), 10))
+    assert sorted(recommendations) == [1, 2, 3, 4, 5, 6]
@@ -0,0 +1,216 @@
+"""
+Member points and favorite counts, written now or written behind.
+
+Both are stored as increments, so the same member can be updated from
+several sessions or processes without losing counts. By default every change
+is written before the call returns. With write-behind enabled
+(``enable_write_behind()`` or ``WRITE_BEHIND=1``), Member only queues the
+change and returns; a background thread coalesces the queued deltas per
+member and per (member, menu item) and flushes them in one transaction every
+``flush_interval`` seconds, or sooner once ``max_pending`` entries are waiting.
+Changes made inside a transaction() are queued only when it commits.
+
+Until a flush, the database lags behind the Member objects in memory, so a
+crash loses at most one interval of points and favorites. Pending changes are
+drained when the process exits normally or write-behind is disabled.
+"""
+import atexit
+import os
+import threading
+import time
+from itertools import islice
+from typing import Dict, Optional, Tuple
+from db_utils import execute_values, get_pool, pooled_connection, transaction
+
+# Members per UPDATE, keeping its parameters under SQLite's variable limit
+POINTS_BATCH_SIZE = 300
+
+def increment_points_in_db(deltas: Dict[str, int]):
+    """Add per-member point changes (negative to deduct) in as few statements as possible"""
+    deltas = {member_id: delta for member_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        
+        items = iter(deltas.items())
+        while True:
+            batch = list(islice(items, POINTS_BATCH_SIZE))
+            if not batch:
+                break
+            params = [value for member_id, delta in batch for value in (member_id, delta)]
+            cursor.execute(
+                "UPDATE members SET points = points + CASE member_id "
+                + " ".join(["WHEN %s THEN %s"] * len(batch))
+                + " ELSE 0 END WHERE member_id IN %s",
+                params + [tuple(member_id for member_id, _ in batch)]
+            )
+        
+        cursor.close()
+
+def increment_favorites_in_db(deltas: Dict[Tuple[str, int], int]):
+    """Add per-(member, menu item) order counts to favorite_items in one multi-row upsert"""
+    if not deltas:
+        return
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Increment rather than overwrite, so concurrent sessions of the
+        # same member never lose each other's counts
+        execute_values(
+            cursor,
+            "INSERT INTO favorite_items (member_id, menu_item_id, count) VALUES %s "
+            "ON CONFLICT (member_id, menu_item_id) DO UPDATE SET count = favorite_items.count + EXCLUDED.count",
+            [(member_id, menu_item_id, delta) for (member_id, menu_item_id), delta in deltas.items()]
+        )
+        
+        cursor.close()
+
+class WriteBehindQueue:
+    """Coalesces point and favorite deltas in memory and flushes them from a background thread"""
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.last_error: Optional[BaseException] = None
+        self._points: Dict[str, int] = {}
+        self._favorites: Dict[Tuple[str, int], int] = {}
+        self._condition = threading.Condition()
+        # Only one flush writes at a time, so deltas reach the database in order
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._stats = {'flushes': 0, 'points_written': 0, 'favorites_written': 0, 'failures': 0}
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+    
+    def add_points(self, member_id: str, delta: int):
+        with self._condition:
+            self._points[member_id] = self._points.get(member_id, 0) + delta
+            self._wake_if_full()
+    
+    def add_favorites(self, member_id: str, deltas: Dict[int, int]):
+        with self._condition:
+            for menu_item_id, delta in deltas.items():
+                key = (member_id, menu_item_id)
+                self._favorites[key] = self._favorites.get(key, 0) + delta
+            self._wake_if_full()
+    
+    def _wake_if_full(self):
+        if len(self._points) + len(self._favorites) >= self.max_pending:
+            self._condition.notify()
+    
+    @property
+    def pending(self) -> int:
+        """Number of coalesced entries waiting to be written"""
+        with self._condition:
+            return len(self._points) + len(self._favorites)
+    
+    def flush(self):
+        """
+        Write everything queued so far in one transaction.
+        
+        If the write fails, the deltas are put back to be retried by the next
+        flush and the error is re-raised.
+        """
+        with self._flush_lock:
+            with self._condition:
+                points, favorites = self._points, self._favorites
+                self._points, self._favorites = {}, {}
+            if not points and not favorites:
+                return
+            try:
+                with transaction():
+                    increment_points_in_db(points)
+                    increment_favorites_in_db(favorites)
+            except Exception as e:
+                with self._condition:
+                    self._merge(self._points, points)
+                    self._merge(self._favorites, favorites)
+                    self._stats['failures'] += 1
+                    self.last_error = e
+                raise
+            with self._condition:
+                self._stats['flushes'] += 1
+                self._stats['points_written'] += len(points)
+                self._stats['favorites_written'] += len(favorites)
+    
+    @staticmethod
+    def _merge(target: Dict, deltas: Dict):
+        for key, delta in deltas.items():
+            target[key] = target.get(key, 0) + delta
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._points) + len(self._favorites) < self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception:
+                # Kept for the next attempt; see last_error and stats()
+                if not stopping:
+                    time.sleep(self.flush_interval)
+            if stopping:
+                return
+    
+    def close(self, timeout: Optional[float] = None):
+        """Stop the background thread after a final flush; anything still unwritten is flushed here"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        self.flush()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {**self._stats, 'pending': len(self._points) + len(self._favorites)}
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_pid: Optional[int] = None
+_queue_lock = threading.Lock()
+_from_environment = os.environ.get('WRITE_BEHIND', '') not in ('', '0')
+
+def enable_write_behind(flush_interval: Optional[float] = None, max_pending: Optional[int] = None) -> WriteBehindQueue:
+    """Start writing points and favorites behind, replacing (and draining) any previous queue"""
+    global _queue, _queue_pid
+    queue = WriteBehindQueue(
+        flush_interval=flush_interval if flush_interval is not None
+        else float(os.environ.get('WRITE_BEHIND_INTERVAL', 1.0)),
+        max_pending=max_pending if max_pending is not None
+        else int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 1000)),
+    )
+    with _queue_lock:
+        previous = _queue if _queue_pid == os.getpid() else None
+        _queue, _queue_pid = queue, os.getpid()
+    # atexit runs handlers last-registered first: make sure the pool (and its
+    # close handler) exists already, so the final flush still has connections
+    get_pool()
+    atexit.register(queue.close)
+    if previous is not None:
+        previous.close()
+    return queue
+
+def disable_write_behind():
+    """Flush what is queued and go back to writing every change immediately"""
+    global _queue, _queue_pid, _from_environment
+    with _queue_lock:
+        queue = _queue if _queue_pid == os.getpid() else None
+        _queue, _queue_pid, _from_environment = None, None, False
+    if queue is not None:
+        queue.close()
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    """The active queue, or None when changes are written immediately"""
+    if _queue is not None and _queue_pid == os.getpid():
+        return _queue
+    # A forked child neither inherits the parent's thread nor its pending deltas
+    if _queue is not None or _from_environment:
+        with _queue_lock:
+            if _queue is not None and _queue_pid == os.getpid():
+                return _queue
+        return enable_write_behind()
+    return None